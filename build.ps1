@@ -31,7 +31,8 @@ $itemsToRemove = @(
     "$target_folder/apper/docs",
     "$target_folder/build.ps1",
     "$target_folder/build-to-fusion.ps1",
-    "$target_folder/copy-to-fusion.ps1"
+    "$target_folder/copy-to-fusion.ps1",
+    "$target_folder/tools"
 
 )
 
@@ -0,0 +1,262 @@
+"""
+Edits a snap that was made earlier, in place. Select the snap's occurrence,
+and the dialog is filled with the parameters it was built with. On OK, only
+the sketches, extrudes and joint origin offsets that the changed values
+affect are updated, see lib/snaplib/edit.py. A component used by several
+occurrences is only edited once the user confirms that all of them change.
+"""
+
+import adsk.core
+import adsk.fusion
+from adsk.core import SelectionCommandInput, DropDownStyles
+
+import traceback
+
+from ..apper import apper
+from ..lib.snaplib.control import value_input
+from ..lib.snaplib.geometry import Cantilever, Pin
+from ..lib.snaplib import edit
+from ..lib.snaplib import parametric
+from ..lib.snaplib import registry
+from ..lib.snaplib import timing
+
+from .CantileverCommand import CantileverCommand
+from .PinCommand import PinCommand
+
+app = adsk.core.Application.get()
+ui = app.userInterface
+handlers = []
+
+# Display text and units of each parameter, by snap type
+PARAMETER_INPUTS = {
+    Cantilever.component_name: CantileverCommand.GEOMETRY_PARAMETERS
+    + CantileverCommand.GAP_PARAMETERS,
+    Pin.component_name: PinCommand.GEOMETRY_PARAMETERS
+    + PinCommand.GAP_PARAMETERS,
+}
+LOCATIONS = ("top", "middle", "bottom")
+POSITION_PARAMETERS = ("x_location", "y_location")
+EDIT_ALL_ID = "edit_all_occurrences"
+
+
+def occurrence_count(component):
+    """:return: The number of occurrences of component in its design."""
+    root = component.parentDesign.rootComponent
+    return root.allOccurrencesByComponent(component).count
+
+
+def edit_confirmed(inputs):
+    """
+    False if the selected snap's component is shared by several occurrences
+    and the user has not confirmed that all of them change.
+    """
+    confirm = inputs.itemById(EDIT_ALL_ID)
+    return confirm is None or confirm.value
+
+
+def fill_parameters(inputs, entity):
+    """
+    Replaces the parameter inputs with those of the snap entity, filled with
+    the values it was built with.
+    :param inputs: The commandInputs of the command.
+    :param entity: The selected occurrence, or None.
+    :return: The snap component, or None.
+    """
+    group = adsk.core.GroupCommandInput.cast(inputs.itemById("parameters"))
+    for child in list(group.children):
+        child.deleteMe()
+    info = inputs.itemById("snap_info")
+
+    component = edit.snap_component(entity) if entity else None
+    if component is None:
+        info.formattedText = "Select a snap made by Snap Generator."
+        return None
+    snap_type, parameters = registry.stored_parameters(component)
+    info.formattedText = f"{snap_type}: {component.name}"
+    bindings = parametric.bindings_of(component) or {}
+
+    children = group.children
+    count = occurrence_count(component)
+    if count > 1:
+        # Reused components, see reuse_components in the settings
+        info.formattedText += f", used by {count} occurrences"
+        confirm = children.addBoolValueInput(
+            EDIT_ALL_ID, f"Edit all {count} occurrences", True, "", False)
+        confirm.tooltip = "The other occurrences of this component change " \
+                          "too. Check to edit them all."
+    for parameter in PARAMETER_INPUTS[snap_type]:
+        par_id = parameter["id"]
+        if par_id in parameters:
+            value = children.addValueInput(par_id, parameter["display_text"],
+                                           parameter["units"],
+                                           value_input(parameters[par_id]))
+            if par_id in bindings:
+                # Changed with Change Parameters, for every driven snap
+                value.isEnabled = False
+                value.tooltip = f"Driven by the user parameter " \
+                                f"{bindings[par_id]}."
+    for par_id in POSITION_PARAMETERS:
+        location = children.addDropDownCommandInput(
+            par_id, par_id.replace("_", " "),
+            DropDownStyles.TextListDropDownStyle)
+        for name in LOCATIONS:
+            location.listItems.add(name, name == parameters[par_id], "")
+    return component
+
+
+def edited_parameters(inputs, component):
+    """The stored parameters of component, with the values in the dialog."""
+    _, parameters = registry.stored_parameters(component)
+    for par_id in parameters:
+        command_input = inputs.itemById(par_id)
+        if command_input is None:
+            continue
+        if par_id in POSITION_PARAMETERS:
+            parameters[par_id] = command_input.selectedItem.name
+        else:
+            parameters[par_id] = command_input.value
+    return parameters
+
+
+def apply_edit(args):
+    inputs = args.command.commandInputs
+    selection = inputs.itemById("snap")
+    if selection.selectionCount != 1:
+        return
+    component = edit.snap_component(selection.selection(0).entity)
+    if component is None or not edit_confirmed(inputs):
+        return
+    try:
+        parametric.edit_snap(component, edited_parameters(inputs, component))
+    except edit.EditException as e:
+        ui.messageBox(str(e))
+
+
+class SnapSelectionHandler(adsk.core.InputChangedEventHandler):
+    """Refills the parameters when another snap is selected."""
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            if args.input.id != "snap":
+                return
+            selection = adsk.core.SelectionCommandInput.cast(args.input)
+            entity = None
+            if selection.selectionCount == 1:
+                entity = selection.selection(0).entity
+            fill_parameters(args.inputs, entity)
+        except:
+            ui.messageBox(traceback.format_exc())
+
+
+class InputLimiter(adsk.core.ValidateInputsEventHandler):
+    """Disables OK until an edit of a shared component is confirmed."""
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            args.areInputsValid = edit_confirmed(args.inputs)
+        except:
+            ui.messageBox(traceback.format_exc())
+
+
+class MyCommandExecutePreviewHandler(adsk.core.CommandEventHandler):
+    """
+    Applies the edit as preview. Fusion undoes it before the next preview.
+    """
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            with timing.trace_build("EditSnap", preview=True):
+                apply_edit(args)
+        except:
+            ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
+
+
+class MyCommandExecuteHandler(adsk.core.CommandEventHandler):
+    """
+    Triggered when user clicks OK in command interface.
+    """
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            with timing.trace_build("EditSnap", preview=False):
+                apply_edit(args)
+        except:
+            ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
+
+
+class EditSnapCommand(apper.Fusion360CommandBase):
+    def __init__(self, name: str, options: dict):
+        super().__init__(name, options)
+
+    def on_execute(self, command: adsk.core.Command,
+                   inputs: adsk.core.CommandInputs,
+                   args: adsk.core.CommandEventArgs, input_values: dict):
+        pass
+
+    def on_create(self, command, inputs):
+        self.command = command
+        # Makes it so the command is not automatically executed when another
+        # command gets activated.
+        self.command.isExecutedWhenPreEmpted = False
+        self.createGUI()
+        self.add_handlers()
+
+    def on_destroy(self, command: adsk.core.Command,
+                   inputs: adsk.core.CommandInputs,
+                   reason: adsk.core.CommandTerminationReason,
+                   input_values: dict):
+        pass
+
+    def on_preview(self, command: adsk.core.Command,
+                   inputs: adsk.core.CommandInputs,
+                   args: adsk.core.CommandEventArgs, input_values: dict):
+        pass
+
+    def createGUI(self):
+        inputs = self.command.commandInputs
+        snap_input = inputs.addSelectionInput("snap", "Snap", "Snap")
+        snap_input.addSelectionFilter(SelectionCommandInput.Occurrences)
+        snap_input.setSelectionLimits(1, 1)
+        snap_input.tooltip = "Select the occurrence of a cantilever or pin " \
+                             "to edit. Every occurrence of its component " \
+                             "changes, so a shared component must be " \
+                             "confirmed first."
+        inputs.addTextBoxCommandInput("snap_info", "", "", 1, True)
+        inputs.addGroupCommandInput("parameters", "Parameters")
+
+        # Start with the snap that was selected before the command, if any
+        entity = None
+        if ui.activeSelections.count == 1:
+            entity = ui.activeSelections.item(0).entity
+            if edit.snap_component(entity):
+                snap_input.addSelection(entity)
+            else:
+                entity = None
+        fill_parameters(inputs, entity)
+
+    def add_handlers(self):
+        cmd = self.command
+
+        onExecutePreview = MyCommandExecutePreviewHandler()
+        cmd.executePreview.add(onExecutePreview)
+        handlers.append(onExecutePreview)
+
+        onExecute = MyCommandExecuteHandler()
+        cmd.execute.add(onExecute)
+        handlers.append(onExecute)
+
+        input_limiter = InputLimiter()
+        cmd.validateInputs.add(input_limiter)
+        handlers.append(input_limiter)
+
+        selection_handler = SnapSelectionHandler()
+        cmd.inputChanged.add(selection_handler)
+        handlers.append(selection_handler)
@@ -0,0 +1,81 @@
+"""
+Commands that are imported when they are first used.
+
+Importing a command module pulls in geometry.py, control.py and the rest of
+snaplib, which Fusion used to pay on every start, also in sessions where no
+snap is made. snap_generator.py registers lazy(module_name) instead of the
+command classes. apper creates the buttons from the options alone, and the
+command module is imported, and its class instantiated, on the first
+on_create. From then on every apper event is passed on to that instance.
+
+tools/import_report.py lists which modules are imported at start and which
+only when a command is opened.
+"""
+
+import importlib
+import logging
+import time
+
+from ..apper import apper
+
+# The apper events of Fusion360CommandBase.
+HOOKS = ("on_create", "on_preview", "on_execute", "on_destroy",
+         "on_input_changed", "on_activate", "on_deactivate", "on_key_down")
+
+
+class LazyCommand(apper.Fusion360CommandBase):
+    """
+    Stands in for the command class module_name.class_name, see lazy().
+    """
+    module_name = None
+    class_name = None
+
+    def __init__(self, name: str, options: dict):
+        super().__init__(name, options)
+        self._lazy_name = name
+        self._lazy_options = options
+        self._lazy_command = None
+
+    def load(self):
+        """
+        Imports the command module and creates the command, the first time.
+        :return: The command instance.
+        """
+        if self._lazy_command is None:
+            start = time.perf_counter()
+            module = importlib.import_module(f".{self.module_name}",
+                                             __package__)
+            command_class = getattr(module, self.class_name)
+            command = command_class(self._lazy_name, self._lazy_options)
+            # What apper set on this object after __init__, such as
+            # command_definition
+            command.__dict__.update(
+                {key: value for key, value in self.__dict__.items()
+                 if not key.startswith("_lazy")})
+            self._lazy_command = command
+            logging.getLogger(type(self).__name__).debug(
+                f"Loaded {self.class_name} in "
+                f"{(time.perf_counter() - start) * 1000:.1f} ms.")
+        return self._lazy_command
+
+
+def _forward(hook):
+    def forward(self, *args, **kwargs):
+        return getattr(self.load(), hook)(*args, **kwargs)
+    forward.__name__ = hook
+    return forward
+
+
+for _hook in HOOKS:
+    setattr(LazyCommand, _hook, _forward(_hook))
+
+
+def lazy(module_name, class_name=None):
+    """
+    A LazyCommand class for my_addin.add_command().
+    :param module_name: Module in commands, e.g. "PinCommand".
+    :param class_name: The command class in it, by default module_name.
+    """
+    class_name = class_name or module_name
+    return type(f"Lazy{class_name}", (LazyCommand,),
+                {"module_name": module_name, "class_name": class_name})
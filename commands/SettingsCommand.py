@@ -44,6 +44,15 @@ class InputHandler(adsk.core.InputChangedEventHandler):
                     logging.exception(f"Unable to open config folder. Unsupported operating system. {platform.system()} (this should not happen).")
             except:
                 ui.messageBox(f"Error: {traceback.format_exc()}")
+        elif input_command.id in ("lightweight_preview", "reuse_components",
+                                  "brep_direct", "brep_parametric",
+                                  "user_parameters", "profile_library"):
+            try:
+                settings = configure.get_settings()
+                settings[input_command.id] = input_command.value
+                configure.dump_settings(settings)
+            except:
+                ui.messageBox(f"Error: {traceback.format_exc()}")
         elif input_command.id == "reset_all_profile_data":
             try:
                 configure.reset_all_profile_data()
@@ -123,6 +132,22 @@ class SettingsCommand(apper.Fusion360CommandBase):
 
         feature_tab.addBoolValueInput("open_config_folder", "Open config folder", False, "", False)
         feature_tab.addBoolValueInput("reset_all_profile_data", "Reset All Profile Data", False, "", False)
+        feature_tab.addBoolValueInput("lightweight_preview", "Lightweight preview", True, "",
+                                      configure.get_setting("lightweight_preview"))
+        feature_tab.addBoolValueInput("reuse_components", "Reuse identical snaps", True, "",
+                                      configure.get_setting("reuse_components"))
+        feature_tab.addBoolValueInput("brep_direct", "Fast bodies in direct designs", True, "",
+                                      configure.get_setting("brep_direct"))
+        feature_tab.addBoolValueInput("brep_parametric", "Fast bodies in parametric designs", True, "",
+                                      configure.get_setting("brep_parametric"))
+        user_parameters = feature_tab.addBoolValueInput("user_parameters", "Drive snaps by user parameters", True, "",
+                                                        configure.get_setting("user_parameters"))
+        user_parameters.tooltip = "New cantilevers and pins take their strain, thickness, extrusion distance and " \
+                                  "gaps from user parameters such as pin_width_gap, which are made the first time."
+        profile_library = feature_tab.addBoolValueInput("profile_library", "Profile library (SQLite)", True, "",
+                                                        configure.get_setting("profile_library"))
+        profile_library.tooltip = "Keep the profiles in config/ProfileData/profiles.sqlite3 instead of the JSON " \
+                                  "files. The JSON files are imported the first time."
 
     def add_handlers(self):
         cmd = self.command
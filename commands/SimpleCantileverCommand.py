@@ -3,18 +3,28 @@ import adsk.fusion
 from adsk.core import SelectionCommandInput, DropDownStyles
 
 import traceback
-import json
 from pathlib import Path
 # import logging
 # import logging.handlers
 
 from ..apper import apper
 from ..lib.snaplib.geometry import Cantilever
-from ..lib.snaplib.control import value_input, JsonUpdater
+from ..lib.snaplib.booleans import BooleanScheduler
+from ..lib.snaplib.brep import BRepCantilever, BRepBooleans, use_brep, \
+    is_parametric
+from ..lib.snaplib.control import value_input, JsonUpdater, \
+    LibraryUpdater
+from ..lib.snaplib.control import selected_entities, pair_selections, \
+    report_profile_errors, default_gap_profile, pair_cut_selections
 from ..lib.snaplib.control import GapProfileSettings
-from ..lib.snaplib.control import ProfileSwitcher, ProfileModifier
+from ..lib.snaplib.control import ProfileSwitcher, ProfileModifier, \
+    PreviewCoalescer, ProfileLists
+from ..lib.snaplib.schema import ProfileSchema
 from ..lib.snaplib.configure import CONFIG_PATH
+from ..lib.snaplib.store import profile_store
 from ..lib.snaplib import configure
+from ..lib.snaplib import timing
+from ..lib.snaplib import graphics
 
 from .CantileverCommand import size_parameters
 
@@ -31,6 +41,9 @@ DEFAULT_Y_POSITION = "top"
 
 def build(args, preview=False):
     try:
+        # Preview graphics are kept between previews, see graphics.py
+        if not preview:
+            graphics.clear()
         design = adsk.fusion.Design.cast(app.activeProduct)
         rootComp = design.rootComponent
         inputs = args.command.commandInputs
@@ -63,43 +76,65 @@ def build(args, preview=False):
         except:
             ui.messageBox('Failed:\n{}'.format(traceback.format_exc()) + f"\n{par_id=}")
 
-        joint_origin = None
-        joint_input = inputs.itemById("selected_origin")
-        if joint_input.selectionCount == 1:
-            joint_origin = joint_input.selection(0).entity
-
-        join_body = None
-        join_body_input = inputs.itemById("join_body")
-        if join_body_input.selectionCount == 1:
-            join_body = join_body_input.selection(0).entity
-
-        cut_body_input = inputs.itemById("cut_bodies")
-        cut_bodies = []
-        body_count = cut_body_input.selectionCount
-        for i in range(body_count):
-            body = cut_body_input.selection(i).entity
-            cut_bodies.append(body)
-
-            # Make cut bodies transparent in preview mode
-            if preview:
+        joint_origins = selected_entities(inputs.itemById("selected_origin"))
+        # One snap per selected joint origin, or one at the origin
+        count = max(1, len(joint_origins))
+        join_bodies = pair_selections(
+            selected_entities(inputs.itemById("join_body")), count,
+            "join_body")
+
+        cut_bodies = selected_entities(inputs.itemById("cut_bodies"))
+        # Make cut bodies transparent in preview mode
+        if preview:
+            for body in cut_bodies:
                 body.opacity = 0.5
+        cut_body_lists = pair_cut_selections(cut_bodies, count, "cut_bodies")
 
-        # Performing the actual operations
-        timeline_start = design.timeline.markerPosition
-
-        cant = Cantilever(rootComp, parameters,
-                   target_joint_org=joint_origin,
-                   join_body=join_body,
-                   cut_bodies=cut_bodies)
-
-        # Remove the component if a join-body operation was performed
-        if join_body:
-            rootComp.features.removeFeatures.add(cant.occurrence)
+        # Draw the preview as custom graphics instead of building the bodies
+        if preview and configure.get_setting("lightweight_preview"):
+            graphics.draw_cantilever(parameters, joint_origins)
+            return
 
-        timeline_end = design.timeline.markerPosition
-        timeline_group = design.timeline.timelineGroups.add(timeline_start,
-                                                            timeline_end-1)
-        timeline_group.name = "Cantilever"
+        # Performing the actual operations
+        # Direct designs have no timeline
+        has_timeline = is_parametric(design)
+        if has_timeline:
+            timeline_start = design.timeline.markerPosition
+        reuse_component = configure.get_setting("reuse_components")
+        # Temporary bodies instead of sketches and features, see brep.py
+        snap_class, scheduler_class = Cantilever, BooleanScheduler
+        if use_brep(design):
+            snap_class, scheduler_class = BRepCantilever, BRepBooleans
+        # A batch combines each target body once, with the tools of all snaps
+        booleans = scheduler_class() if count > 1 else None
+
+        for joint_origin, join_body, cut_bodies in zip(
+                joint_origins or [None], join_bodies, cut_body_lists):
+            cant = snap_class(rootComp, parameters,
+                              target_joint_org=joint_origin,
+                              join_body=join_body,
+                              cut_bodies=cut_bodies,
+                              reuse_component=reuse_component,
+                              booleans=booleans)
+
+            # Remove the component if a join-body operation was performed.
+            # BRepCantilever doesn't make one in that case.
+            if join_body and cant.occurrence and booleans:
+                booleans.remove(rootComp.features, cant.occurrence)
+            elif join_body and cant.occurrence:
+                rootComp.features.removeFeatures.add(cant.occurrence)
+
+        if booleans:
+            booleans.run(rootComp)
+
+        # All the snaps of a batch go in one timeline group
+        if has_timeline:
+            timeline_end = design.timeline.markerPosition
+            timeline_group = design.timeline.timelineGroups.add(
+                timeline_start, timeline_end-1)
+            timeline_group.name = "Cantilever"
+            if count > 1:
+                timeline_group.name = f"Cantilever x{count}"
 
     except:
         if ui:
@@ -118,23 +153,30 @@ class InputLimiter(adsk.core.ValidateInputsEventHandler):
     value is out of bounds, nothing happens, and any features that were
     previously generated by ExecutePreviewHandler will disappear.
     """
-    def __init__(self):
+    def __init__(self, coalescer):
         super().__init__()
+        self.coalescer = coalescer
         # self.logger = logging.getLogger("InputLimiter")
 
     def notify(self, args):
-        pass
+        # Inputs are not checked while PreviewCoalescer writes a profile.
+        if not self.coalescer.allow_validation():
+            return
 
 class MyCommandExecutePreviewHandler(adsk.core.CommandEventHandler):
     """
     Triggered when user makes any change to a parameter that is related to
     performing the feature operations.
     """
-    def __init__(self):
+    def __init__(self, coalescer):
         super().__init__()
+        self.coalescer = coalescer
 
     def notify(self, args):
-        build(args, preview=True)
+        if not self.coalescer.allow_preview():
+            return
+        with timing.trace_build("SimpleCantilever", preview=True):
+            build(args, preview=True)
 
 class MyCommandExecuteHandler(adsk.core.CommandEventHandler):
     """
@@ -147,7 +189,8 @@ class MyCommandExecuteHandler(adsk.core.CommandEventHandler):
         try:
             design = adsk.fusion.Design.cast(app.activeProduct)
             if design:
-                build(args, preview=False)
+                with timing.trace_build("SimpleCantilever", preview=False):
+                    build(args, preview=False)
         except:
             if ui:
                 ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
@@ -215,6 +258,8 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
         },
     ]
 
+    PROFILE_SCHEMA = ProfileSchema(GEOMETRY_PARAMETERS, GAP_PARAMETERS)
+
     def __init__(self, name: str, options: dict):
         super().__init__(name, options)
 
@@ -273,17 +318,32 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
 
         if not profile_path.is_file():
             # Profile does not exist, recreate it from default
-            configure.reset_single_profile_data("Cantilever")
+            configure.reset_single_profile_data("Cantilever",
+                                                reset_library=False)
 
         # Load profile data
-        with open(profile_path, "r") as f:
-            self.profile_data = json.load(f)
+        self.library = configure.get_library()
+        if self.library:
+            self.profile_data = configure.load_profile_data("Cantilever",
+                                                           self.library)
+        else:
+            self.profile_data = profile_store.get(profile_path)
+        errors = self.PROFILE_SCHEMA.validate(self.profile_data)
+        if errors:
+            report_profile_errors(errors, profile_path.name)
+        self.profile_lists = ProfileLists(self.profile_data,
+                                          self.resources_path)
         self.createGUI()
         self.add_handlers()
 
     def on_destroy(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs,
                    reason: adsk.core.CommandTerminationReason, input_values: dict):
-        pass
+        graphics.clear()
+        self.coalescer.log_counters()
+        self.profile_lists.log_counters()
+        # Profile changes are saved when the dialog closes
+        profile_store.flush()
+        profile_store.log_stats()
 
     def on_preview(self, command: adsk.core.Command,
                    inputs: adsk.core.CommandInputs,
@@ -308,7 +368,7 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
 
         # Gap section
         gap_group = feature_tab.addGroupCommandInput("gaps", "Gaps")
-        default_gap_profile_name = self.profile_data['default_gap_profile']
+        default_gap_profile_name = default_gap_profile(self.profile_data)
         gap_profile = self.profile_data["gap_profiles"][
             default_gap_profile_name]
 
@@ -316,14 +376,8 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
         gap_profiles = gap_list.addDropDownCommandInput("gap_profiles",
                         "Profile", DropDownStyles.LabeledIconDropDownStyle)
 
-        blank_icon_path = self.resources_path / "white"
         gap_profiles.maxVisibleItems = 10
-        items = gap_profiles.listItems
-        for key in self.profile_data['gap_profiles']:
-            if key == default_gap_profile_name:
-                items.add(key, True, str(blank_icon_path))
-            else:
-                items.add(key, False, str(blank_icon_path))
+        self.profile_lists.fill(gap_profiles, default_gap_profile_name)
 
         for gap_par in self.GAP_PARAMETERS:
             geo_id = gap_par["id"]
@@ -341,19 +395,23 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
                                                        'Joint origin')
         jointOrigins = SelectionCommandInput.JointOrigins
         joint_org_input.addSelectionFilter(jointOrigins)
-        joint_org_input.setSelectionLimits(0, 1)
+        # Zero means no upper limit. One snap is made per joint origin.
+        joint_org_input.setSelectionLimits(0, 0)
         joint_org_input.tooltip = "First create a joint origin feature at " \
                                   "a certain position and orientation. Then" \
-                                  " select it here to position the pin."
+                                  " select it here to position the pin." \
+                                  " Select several to make one at each."
 
         try:
             join_body_input = selections.addSelectionInput("join_body",
                                                           'Body to join',
                                                           'Body to join')
-            join_body_input.setSelectionLimits(0,1)
+            join_body_input.setSelectionLimits(0, 0)
             join_body_input.addSelectionFilter(SelectionCommandInput.Bodies)
             join_body_input.tooltip = "Select the single body you want the " \
-                                     "cantilever body to join."
+                                     "cantilever body to join. With several" \
+                                     " joint origins, select one body for " \
+                                     "all, or one per joint origin."
 
         except:
             ui.messageBox(traceback.format_exc())
@@ -364,7 +422,9 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
         cut_body_input.setSelectionLimits(0)
         cut_body_input.tooltip = "Select the bodies that you want the pin to" \
                                  " connect. A mating hole will be created for" \
-                                 " the pin."
+                                 " the pin. With several joint origins," \
+                                 " select one body for all, or one per" \
+                                 " joint origin."
 
         """
             Position section
@@ -414,14 +474,16 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
             The gui elements make changes on the profile_data dictionary, but
             does not perform IO.
             """
-        prof_settings = GapProfileSettings(self.profile_data)
+        prof_settings = GapProfileSettings(self.profile_data,
+                                           self.profile_lists)
         prof_settings.add_to_inputs(gap_tab)
 
     def add_handlers(self):
         cmd = self.command
 
         # Connect to the command related events.
-        onExecutePreview = MyCommandExecutePreviewHandler()
+        self.coalescer = PreviewCoalescer()
+        onExecutePreview = MyCommandExecutePreviewHandler(self.coalescer)
         cmd.executePreview.add(onExecutePreview)
         handlers.append(onExecutePreview)
 
@@ -429,18 +491,27 @@ class SimpleCantileverCommand(apper.Fusion360CommandBase):
         cmd.execute.add(onExecute)
         handlers.append(onExecute)
 
-        profile_switcher = ProfileSwitcher(self.profile_data)
+        profile_switcher = ProfileSwitcher(self.profile_data, self.coalescer)
         cmd.inputChanged.add(profile_switcher)
         handlers.append(profile_switcher)
 
-        profile_modifier = ProfileModifier(self.profile_data, self.resources_path)
+        profile_modifier = ProfileModifier(self.profile_data,
+                                           self.resources_path,
+                                           self.profile_lists)
         cmd.inputChanged.add(profile_modifier)
         handlers.append(profile_modifier)
 
-        j_updater = JsonUpdater(self.profile_data, self.profiles_path)
+        cmd.inputChanged.add(self.profile_lists)
+        handlers.append(self.profile_lists)
+
+        if self.library:
+            j_updater = LibraryUpdater(self.profile_data, self.library,
+                                       "Cantilever")
+        else:
+            j_updater = JsonUpdater(self.profile_data, self.profiles_path)
         cmd.inputChanged.add(j_updater)
         handlers.append(j_updater)
 
-        input_limiter = InputLimiter()
+        input_limiter = InputLimiter(self.coalescer)
         cmd.validateInputs.add(input_limiter)
         handlers.append(input_limiter)
@@ -9,18 +9,28 @@ import adsk.fusion
 from adsk.core import SelectionCommandInput, DropDownStyles
 
 import traceback
-import json
 from pathlib import Path
 # import logging
 # import logging.handlers
 
 from ..apper import apper
 from ..lib.snaplib.geometry import Pin
-from ..lib.snaplib.control import value_input, JsonUpdater
+from ..lib.snaplib.booleans import BooleanScheduler
+from ..lib.snaplib.brep import BRepPin, BRepBooleans, use_brep, is_parametric
+from ..lib.snaplib.control import value_input, JsonUpdater, \
+    LibraryUpdater
+from ..lib.snaplib.control import selected_entities, pair_selections, \
+    report_profile_errors, default_gap_profile
 from ..lib.snaplib.control import GapProfileSettings
-from ..lib.snaplib.control import ProfileSwitcher, ProfileModifier
+from ..lib.snaplib.control import ProfileSwitcher, ProfileModifier, \
+    PreviewCoalescer, ProfileLists
 from ..lib.snaplib.configure import CONFIG_PATH
+from ..lib.snaplib.store import profile_store
 from ..lib.snaplib import configure
+from ..lib.snaplib import timing
+from ..lib.snaplib import graphics
+
+from .PinCommand import PinCommand, size_parameters
 
 app = adsk.core.Application.get()
 ui = app.userInterface
@@ -29,8 +39,9 @@ first_timeline_object_index = [0]
 
 DEFAULT_SIZE = 0
 
-target_body1 = None
-target_body2 = None
+# Bodies selected in the last preview, see build()
+target_bodies1 = []
+target_bodies2 = []
 
 DEFAULT_SIZE = 1  # = 10mm
 DEFAULT_STRAIN = 0.012
@@ -46,6 +57,9 @@ def build(args, preview=False):
     Pin object.
     """
     try:
+        # Preview graphics are kept between previews, see graphics.py
+        if not preview:
+            graphics.clear()
         app = adsk.core.Application.get()
         design = adsk.fusion.Design.cast(app.activeProduct)
         rootComp = design.rootComponent
@@ -81,10 +95,9 @@ def build(args, preview=False):
         except:
             ui.messageBox('Failed:\n{}'.format(traceback.format_exc()) + f"\n{par_id=}")
 
-        joint_origin = None
-        joint_input = inputs.itemById("selected_origin")
-        if joint_input.selectionCount == 1:
-            joint_origin = joint_input.selection(0).entity
+        joint_origins = selected_entities(inputs.itemById("selected_origin"))
+        # One pin per selected joint origin, or one at the origin
+        count = max(1, len(joint_origins))
 
         """ At this point there should be one main body, one subtraction body, and two
         addition bodies. The following steps are for the boolean operations.
@@ -95,181 +108,172 @@ def build(args, preview=False):
         target2 = inputs.itemById("target2")
 
         # ui.messageBox(f"{body_count=}")
-        global target_body1
-        global target_body2
+        global target_bodies1
+        global target_bodies2
 
         # This is just to correct for the bug where it deselects your choice
         if preview:
-            if target1.selectionCount > 0:
-                target_body1 = target1.selection(0).entity
-            else:
-                target_body1 = None
-            if target2.selectionCount > 0:
-                target_body2 = target2.selection(0).entity
-            else:
-                target_body2 = None
+            target_bodies1 = selected_entities(target1)
+            target_bodies2 = selected_entities(target2)
+        target_bodies = zip(
+            pair_selections(target_bodies1, count, "target1"),
+            pair_selections(target_bodies2, count, "target2"))
+
+        # Draw the preview as custom graphics instead of building the bodies
+        if preview and configure.get_setting("lightweight_preview"):
+            graphics.draw_pin(parameters, joint_origins)
+            return
 
         # Performing the actual operations
-        timeline_start = design.timeline.markerPosition
-        pin = Pin(rootComp, parameters,
-            target_joint_org=joint_origin,
-            target_body1=target_body1,
-            target_body2=target_body2)
+        # Direct designs have no timeline
+        has_timeline = is_parametric(design)
+        if has_timeline:
+            timeline_start = design.timeline.markerPosition
+        reuse_component = configure.get_setting("reuse_components")
+        # Temporary bodies instead of sketches and features, see brep.py
+        snap_class, scheduler_class = Pin, BooleanScheduler
+        if use_brep(design):
+            snap_class, scheduler_class = BRepPin, BRepBooleans
+        # A batch combines each target body once, with the tools of all pins
+        booleans = scheduler_class() if count > 1 else None
+        for joint_origin, (target_body1, target_body2) in zip(
+                joint_origins or [None], target_bodies):
+            build_pin(rootComp, parameters, joint_origin, target_body1,
+                      target_body2, preview, reuse_component, booleans,
+                      snap_class)
+        if booleans:
+            booleans.run(rootComp)
+
+        # Folding all operations neatly into a timeline block, one for
+        # all the pins of a batch
+        if has_timeline:
+            timeline_end = design.timeline.markerPosition
+            timeline_group = design.timeline.timelineGroups.add(
+                timeline_start, timeline_end - 1)
+            timeline_group.name = "Cantilever pin"
+            if count > 1:
+                timeline_group.name = f"Cantilever pin x{count}"
 
-        # Draw lines only in preview
-        if preview:
-            # Yellow line
-            try:
-                # Get the root component of the active design
-                comp = pin.comp
-                graphicsGroup = comp.customGraphicsGroups.add()
-
-                # Define points along the X-axis
-                start_point = adsk.core.Point3D.create(0, parameters["width"]/2, 0)  # Origin point
-                end_point = adsk.core.Point3D.create(-parameters["length"]*4.5, parameters["width"]/2, 0)  # 100 units along the X-axis
-
-                # Create custom graphics coordinates
-                points = [
-                    start_point.x, start_point.y, start_point.z,
-                    end_point.x, end_point.y, end_point.z
-                ]
-
-                # Create the coordinates object
-                coordinates = adsk.fusion.CustomGraphicsCoordinates.create(points)
-
-                # Create the lines using the coordinates and indices
-                lines = graphicsGroup.addLines(coordinates, [0, 1], False)
-
-                # Optionally set the color of the line (red in this example)
-                color = adsk.core.Color.create(255, 255, 0, 255)  # RGBA format
-                colorEffect = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
-                lines.color = colorEffect
-                lines.weight = 5
-                lines.depthPriority = 1000
-                # Refresh the viewport to see the change
-                app.activeViewport.refresh()
-            except:
-                ui.messageBox(traceback.format_exc())
+    except:
+        if ui:
+            ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
-            # Draw blue line
-            try:
-                # Get the root component of the active design
-                comp = pin.comp
-                graphicsGroup = comp.customGraphicsGroups.add()
-
-                # Define points along the X-axis
-                start_point = adsk.core.Point3D.create(0, parameters["width"]/2, 0)  # Origin point
-                end_point = adsk.core.Point3D.create(parameters["length"]*4.5, parameters["width"]/2, 0)  # 100 units along the X-axis
-
-                # Create custom graphics coordinates
-                points = [
-                    start_point.x, start_point.y, start_point.z,
-                    end_point.x, end_point.y, end_point.z
-                ]
-
-                # Create the coordinates object
-                coordinates = adsk.fusion.CustomGraphicsCoordinates.create(points)
-
-                # Create the lines using the coordinates and indices
-                lines = graphicsGroup.addLines(coordinates, [0, 1], False)
-
-                # Optionally set the color of the line (red in this example)
-                color = adsk.core.Color.create(0, 0, 255, 255)  # RGBA format
-                colorEffect = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
-                lines.color = colorEffect
-                lines.weight = 5
-                lines.depthPriority = 1000
-                # Refresh the viewport to see the change
-                app.activeViewport.refresh()
-            except:
-                ui.messageBox(traceback.format_exc())
 
-        subtraction_body = pin.comp.bRepBodies.itemByName("Subtraction body")
+def build_pin(rootComp, parameters, joint_origin, target_body1, target_body2,
+              preview, reuse_component=False, booleans=None,
+              snap_class=Pin):
+    """
+    Builds one pin of a batch, with its boolean operations and, in preview,
+    the guide lines and transparency. With a booleans.BooleanScheduler, the
+    boolean operations and removals are queued in it instead.
+    :param snap_class: Pin, or brep.BRepPin with a brep.BRepBooleans.
+    """
+    pin = snap_class(rootComp, parameters,
+                     target_joint_org=joint_origin,
+                     target_body1=target_body1,
+                     target_body2=target_body2,
+                     reuse_component=reuse_component,
+                     booleans=booleans)
+
+    # Draw lines only in preview
+    if preview:
+        # Yellow line
+        try:
+            # Get the root component of the active design
+            comp = pin.comp
+            graphicsGroup = comp.customGraphicsGroups.add()
+
+            # Define points along the X-axis
+            start_point = adsk.core.Point3D.create(0, parameters["width"]/2, 0)  # Origin point
+            end_point = adsk.core.Point3D.create(-parameters["length"]*4.5, parameters["width"]/2, 0)  # 100 units along the X-axis
+
+            # Create custom graphics coordinates
+            points = [
+                start_point.x, start_point.y, start_point.z,
+                end_point.x, end_point.y, end_point.z
+            ]
+
+            # Create the coordinates object
+            coordinates = adsk.fusion.CustomGraphicsCoordinates.create(points)
+
+            # Create the lines using the coordinates and indices
+            lines = graphicsGroup.addLines(coordinates, [0, 1], False)
+
+            # Optionally set the color of the line (red in this example)
+            color = adsk.core.Color.create(255, 255, 0, 255)  # RGBA format
+            colorEffect = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
+            lines.color = colorEffect
+            lines.weight = 5
+            lines.depthPriority = 1000
+            # Refresh the viewport to see the change
+            app.activeViewport.refresh()
+        except:
+            ui.messageBox(traceback.format_exc())
 
-        # Make som bodies less opaque
-        if target_body1 and preview:
-            target_body1.opacity = 0.40
-            # Don't want to display subtraction body during preview
-            subtraction_body.isVisible = False
-            # Make som bodies less opaque
-        if target_body2 and preview:
-            target_body2.opacity = 0.40
-            # Don't want to display subtraction body during preview
-            subtraction_body.isVisible = False
+        # Draw blue line
+        try:
+            # Get the root component of the active design
+            comp = pin.comp
+            graphicsGroup = comp.customGraphicsGroups.add()
+
+            # Define points along the X-axis
+            start_point = adsk.core.Point3D.create(0, parameters["width"]/2, 0)  # Origin point
+            end_point = adsk.core.Point3D.create(parameters["length"]*4.5, parameters["width"]/2, 0)  # 100 units along the X-axis
+
+            # Create custom graphics coordinates
+            points = [
+                start_point.x, start_point.y, start_point.z,
+                end_point.x, end_point.y, end_point.z
+            ]
+
+            # Create the coordinates object
+            coordinates = adsk.fusion.CustomGraphicsCoordinates.create(points)
+
+            # Create the lines using the coordinates and indices
+            lines = graphicsGroup.addLines(coordinates, [0, 1], False)
+
+            # Optionally set the color of the line (red in this example)
+            color = adsk.core.Color.create(0, 0, 255, 255)  # RGBA format
+            colorEffect = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
+            lines.color = colorEffect
+            lines.weight = 5
+            lines.depthPriority = 1000
+            # Refresh the viewport to see the change
+            app.activeViewport.refresh()
+        except:
+            ui.messageBox(traceback.format_exc())
 
-        # Remove subtraction body in the case of both additions being applied
-        if target_body1 and target_body1:
-            pin.comp.features.removeFeatures.add(subtraction_body)
+    subtraction_body = pin.comp.bRepBodies.itemByName("Subtraction body")
 
-        # If there is still a subtraction body, make it opaque
+    # Make som bodies less opaque
+    if target_body1 and preview:
+        target_body1.opacity = 0.40
+        # Don't want to display subtraction body during preview
         if subtraction_body:
-            subtraction_body.opacity = 0.3
-
-        if pin.addition_body1:
-            pin.addition_body1.opacity = 0.5
-
-        if pin.addition_body2:
-            pin.addition_body2.opacity = 0.5
-
+            subtraction_body.isVisible = False
+        # Make som bodies less opaque
+    if target_body2 and preview:
+        target_body2.opacity = 0.40
+        # Don't want to display subtraction body during preview
+        if subtraction_body:
+            subtraction_body.isVisible = False
 
-        # Folding all operations neatly into a timeline block
-        timeline_end = design.timeline.markerPosition
-        timeline_group = design.timeline.timelineGroups.add(timeline_start,
-                                                            timeline_end - 1)
-        timeline_group.name = "Cantilever pin"
+    # Remove subtraction body in the case of both additions being applied
+    if target_body1 and subtraction_body and booleans:
+        booleans.remove(pin.comp.features, subtraction_body)
+    elif target_body1 and subtraction_body:
+        with timing.span("remove"):
+            pin.comp.features.removeFeatures.add(subtraction_body)
 
-    except:
-        if ui:
-            ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
+    # If there is still a subtraction body, make it opaque
+    if subtraction_body:
+        subtraction_body.opacity = 0.3
 
+    if pin.addition_body1:
+        pin.addition_body1.opacity = 0.5
 
-def size_parameters(size, length_width_ratio=1.6):
-    """
-    This function generates a set of parameter values as a function -of the
-    value of size. This is intended to make a sort of "standardized"
-    geometry, so that the different parameters scale well with the overall
-    size. For example, the size of the ledge should not be linear with the
-    overall with of the pin. That would make it uselessly small for small
-    pins, and pointlessly large for large pins. Radius on the other hand,
-    has an optimal value unrelated to the size of the pin: 1.5mm (to combat
-    fatigue). This can't achieved on small pins because then they wouldn't
-    have any thickness, so a compromise has to be made.
-
-    Parameters unaffected by size: strain, nose_angle and all gaps.
-    """
-    width = size
-    extrusion_distance = size
-    length = size * length_width_ratio
-    gap_buffer = 0
-    max_gap_buffer = 0.08
-    if 0 < size <= 0.3:
-        gap_buffer = size / 10
-    elif 0.3 < size <= 1:
-        gap_buffer = 0.030 + (size - 0.3) / 25
-    elif 1 < size <= 1.5:
-        gap_buffer = 0.050 + (max_gap_buffer-0.05)*(size - 1)/(1.5 - 1)
-    elif 1.5 <= size:
-        gap_buffer = max_gap_buffer
-
-
-    thickness = width/2 - gap_buffer
-    middle_padding = thickness
-    ledge = width / 12
-    gap_buffer = round(gap_buffer, 4)
-    thickness = round(thickness, 4)
-    ledge = round(ledge, 4)
-    wall_thickness = round(size / 4, 4)
-
-    advanced_params = {"width": width,
-                       "length": length,
-                       "extrusion_distance": extrusion_distance,
-                       "thickness": thickness,
-                       "middle_padding": middle_padding,
-                       "ledge": ledge,
-                       "gap_buffer": gap_buffer,
-                       "wall_thickness": wall_thickness
-                       }
-    return advanced_params
+    if pin.addition_body2:
+        pin.addition_body2.opacity = 0.5
 
 
 class SizeInputHandler(adsk.core.InputChangedEventHandler):
@@ -277,20 +281,19 @@ class SizeInputHandler(adsk.core.InputChangedEventHandler):
     Reacts when the 'size' field is changed, and changes a set of parameters
     by the "size_parameters" function. See its docstring for details.
     """
-    def __init__(self, profile_data):
+    def __init__(self, profile_data, coalescer):
         self.profile_data = profile_data
+        self.coalescer = coalescer
         super().__init__()
 
     def notify(self, args):
         input_command = args.input
-        all_inputs = args.inputs.command.commandInputs
         
         if input_command.id == "size":
             try:
                 size = input_command.value
                 parameters = size_parameters(size)
-                for key, value in parameters.items():
-                    all_inputs.itemById(key).value = value
+                self.coalescer.write_values(args.inputs.command, parameters)
             except:
                 ui.messageBox(f"Error: {traceback.format_exc()}")
 
@@ -300,11 +303,15 @@ class MyCommandExecutePreviewHandler(adsk.core.CommandEventHandler):
     Triggered when user makes any change to a parameter that is related to
     performing the feature operations.
     """
-    def __init__(self):
+    def __init__(self, coalescer):
         super().__init__()
+        self.coalescer = coalescer
 
     def notify(self, args):
-        build(args, preview=True)
+        if not self.coalescer.allow_preview():
+            return
+        with timing.trace_build("SimplePin", preview=True):
+            build(args, preview=True)
 
 
 class MyCommandExecuteHandler(adsk.core.CommandEventHandler):
@@ -319,7 +326,8 @@ class MyCommandExecuteHandler(adsk.core.CommandEventHandler):
         try:
             design = adsk.fusion.Design.cast(app.activeProduct)
             if design:
-                build(args, preview=False)
+                with timing.trace_build("SimplePin", preview=False):
+                    build(args, preview=False)
         except:
             if ui:
                 ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
@@ -361,6 +369,9 @@ class SimplePinCommand(apper.Fusion360CommandBase):
         },
     ]
 
+    # Same Pin.json as PinCommand
+    PROFILE_SCHEMA = PinCommand.PROFILE_SCHEMA
+
     def __init__(self, name: str, options: dict):
         super().__init__(name, options)
 
@@ -402,19 +413,38 @@ class SimplePinCommand(apper.Fusion360CommandBase):
 
                 if not profile_path.is_file():
                     # Profile does not exist, recreate it from default
-                    configure.reset_single_profile_data("Pin")
+                    configure.reset_single_profile_data("Pin",
+                                                        reset_library=False)
 
                 # Load profile data
-                with open(profile_path, "r") as f:
-                    self.profile_data = json.load(f)
+                self.library = configure.get_library()
+                if self.library:
+                    self.profile_data = configure.load_profile_data("Pin",
+                                                                   self.library)
+                else:
+                    self.profile_data = profile_store.get(profile_path)
+                errors = self.PROFILE_SCHEMA.validate(self.profile_data)
+                if errors:
+                    report_profile_errors(errors, profile_path.name)
             except:
                 ui.messageBox(traceback.format_exc())
 
             self.add_handlers()
+            self.profile_lists = ProfileLists(self.profile_data,
+                                              self.resources_path)
             self.createGUI()
         except:
             ui.messageBox(traceback.format_exc())
 
+    def on_destroy(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs,
+                   reason: adsk.core.CommandTerminationReason, input_values: dict):
+        graphics.clear()
+        self.coalescer.log_counters()
+        self.profile_lists.log_counters()
+        # Profile changes are saved when the dialog closes
+        profile_store.flush()
+        profile_store.log_stats()
+
     def on_preview(self, command: adsk.core.Command,
                    inputs: adsk.core.CommandInputs,
                    args: adsk.core.CommandEventArgs, input_values: dict):
@@ -438,7 +468,6 @@ class SimplePinCommand(apper.Fusion360CommandBase):
         geometry_group = feature_tab.addGroupCommandInput("geometry",
                                                           "Geometry")
         geo_list = geometry_group.children
-        blank_icon_path = self.resources_path / "white"
         # SIZE is not in the list of parameters, because it is not a real
         # parameter. It is just a way to change all of them in a fell swoop
         size_value = value_input(DEFAULT_SIZE)
@@ -448,27 +477,22 @@ class SimplePinCommand(apper.Fusion360CommandBase):
         gap_group = feature_tab.addGroupCommandInput("gaps", "Gaps")
         gap_list = gap_group.children
 
-        default_gap_profile_name = self.profile_data['default_gap_profile']
+        default_gap_profile_name = default_gap_profile(self.profile_data)
 
         gap_profile_list = gap_list.addDropDownCommandInput(
             "gap_profiles", "Gap profile",
             DropDownStyles.LabeledIconDropDownStyle)
 
-        items = gap_profile_list.listItems
-        for key in self.profile_data["gap_profiles"]:
-            if key == default_gap_profile_name:
-                items.add(key, True, str(blank_icon_path))
-            else:
-                items.add(key, False, str(blank_icon_path))
+        self.profile_lists.fill(gap_profile_list, default_gap_profile_name)
 
-        default_gap_profile = self.profile_data["gap_profiles"][
+        gap_profile = self.profile_data["gap_profiles"][
             default_gap_profile_name]
 
         for gap_par in self.GAP_PARAMETERS:
             geo_id = gap_par["id"]
             display_text = gap_par["display_text"]
             unit = gap_par["units"]
-            value = value_input(default_gap_profile[geo_id])
+            value = value_input(gap_profile[geo_id])
             gap_list.addValueInput(geo_id, display_text, unit, value)
 
         # Selection section
@@ -480,40 +504,48 @@ class SimplePinCommand(apper.Fusion360CommandBase):
                                                        'Joint origin')
         jointOrigins = SelectionCommandInput.JointOrigins
         joint_org_input.addSelectionFilter(jointOrigins)
-        joint_org_input.setSelectionLimits(0, 1)
+        # Zero means no upper limit. One snap is made per joint origin.
+        joint_org_input.setSelectionLimits(0, 0)
         joint_org_input.tooltip = "First create a joint origin feature at " \
                                   "a certain position and orientation. Then" \
-                                  " select it here to position the pin."
+                                  " select it here to position the pin." \
+                                  " Select several to make one at each."
 
         target1_input = selections.addSelectionInput("target2",
                                                         'Yellow body for slot',
                                                         'Select body in direction of yellow line')
 
         target1_input.addSelectionFilter(SelectionCommandInput.Bodies)
-        target1_input.setSelectionLimits(0, 1)
-        target1_input.tooltip = "First body to insert slot."
+        target1_input.setSelectionLimits(0, 0)
+        target1_input.tooltip = "First body to insert slot. With several" \
+                                " joint origins, select one for all or one" \
+                                " per joint origin."
 
         target2_input = selections.addSelectionInput("target1",
                                                       'Blue body for slot',
                                                       'Select body in direction of blue line')
 
         target2_input.addSelectionFilter(SelectionCommandInput.Bodies)
-        target2_input.setSelectionLimits(0, 1)
-        target2_input.tooltip = "Inward body to insert slot."
+        target2_input.setSelectionLimits(0, 0)
+        target2_input.tooltip = "Inward body to insert slot. With several" \
+                                " joint origins, select one for all or one" \
+                                " per joint origin."
 
         """
             Gap profile tab
             The gui elements make changes on the profile_data dictionary, but
             does not perform IO.
         """
-        prof_settings = GapProfileSettings(self.profile_data)
+        prof_settings = GapProfileSettings(self.profile_data,
+                                           self.profile_lists)
         prof_settings.add_to_inputs(gap_tab)
 
     def add_handlers(self):
         cmd = self.command
 
         # Connect to the command related events.
-        onExecutePreview = MyCommandExecutePreviewHandler()
+        self.coalescer = PreviewCoalescer()
+        onExecutePreview = MyCommandExecutePreviewHandler(self.coalescer)
         cmd.executePreview.add(onExecutePreview)
         handlers.append(onExecutePreview)
 
@@ -521,15 +553,23 @@ class SimplePinCommand(apper.Fusion360CommandBase):
         cmd.execute.add(onExecute)
         handlers.append(onExecute)
 
-        j_updater = JsonUpdater(self.profile_data, self.profiles_path)
+        if self.library:
+            j_updater = LibraryUpdater(self.profile_data, self.library,
+                                       "Pin")
+        else:
+            j_updater = JsonUpdater(self.profile_data, self.profiles_path)
         cmd.inputChanged.add(j_updater)
         handlers.append(j_updater)
 
-        profile_switcher = ProfileSwitcher(self.profile_data)
+        profile_switcher = ProfileSwitcher(self.profile_data, self.coalescer)
         cmd.inputChanged.add(profile_switcher)
         handlers.append(profile_switcher)
 
         profile_modifier = ProfileModifier(self.profile_data,
-                                           self.resources_path)
+                                           self.resources_path,
+                                           self.profile_lists)
         cmd.inputChanged.add(profile_modifier)
         handlers.append(profile_modifier)
+
+        cmd.inputChanged.add(self.profile_lists)
+        handlers.append(self.profile_lists)
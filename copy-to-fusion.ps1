@@ -32,7 +32,8 @@ $itemsToRemove = @(
     "$target_folder/apper/.git",
     "$target_folder/apper/docs",
     "$target_folder/build.ps1",
-    "$target_folder/copy-to-fusion.ps1"
+    "$target_folder/copy-to-fusion.ps1",
+    "$target_folder/tools"
 )
 
 foreach ($item in $itemsToRemove) {
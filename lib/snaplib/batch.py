@@ -0,0 +1,383 @@
+"""
+NumPy-vectorized versions of the profile functions in kernel.py.
+
+These are meant for generating catalogs and parameter sweeps outside of
+Fusion, where each parameter is given as a column (one value per row) instead
+of one parameter dictionary per snap. NumPy is not shipped with Fusion, so
+nothing in the add-in itself imports this module.
+
+Every profile function returns a dictionary with the keys
+"points_coordinates" (float array of shape (N, P, 2), a view onto
+coordinate-planar storage), "point_pair_indexes"
+(int array of shape (S, 2), shared by all rows) and "arc_lines", which holds
+the shared (A, 2) center/start index array under "indexes" and the per-row
+(N, A) sweep angles under "sweep_angles".
+
+pin_size_columns and cantilever_size_columns are the size_parameters
+formulas for an array of sizes, returning the same values as the kernel bit
+for bit, so whole families of standardized snaps can be swept at once.
+"""
+
+import numpy as np
+
+from . import kernel
+
+CANTILEVER_JOIN_POINTS = 12
+CANTILEVER_CUT_POINTS = 8
+PIN_JOIN_POINTS = 4 * kernel.PIN_JOIN_LEG_POINTS
+PIN_ADDITION_POINTS = 2 * kernel.PIN_ADDITION_LEG_POINTS
+PIN_CUT_POINTS = 4 * kernel.PIN_CUT_LEG_POINTS
+
+_CANTILEVER_JOIN_SEGMENTS = np.array(kernel.CANTILEVER_JOIN_SEGMENTS,
+                                     dtype=np.intp)
+_CANTILEVER_JOIN_ARCS = np.array(kernel.CANTILEVER_JOIN_ARCS, dtype=np.intp)
+_CANTILEVER_CUT_SEGMENTS = np.array(kernel.CANTILEVER_CUT_SEGMENTS,
+                                    dtype=np.intp)
+_PIN_JOIN_SEGMENTS = np.array(
+    kernel.repeat_pairs(kernel.PIN_JOIN_LEG_SEGMENTS,
+                        kernel.PIN_JOIN_LEG_POINTS, 3), dtype=np.intp)
+_PIN_ADDITION_SEGMENTS = np.array(
+    kernel.repeat_pairs(kernel.PIN_ADDITION_LEG_SEGMENTS,
+                        kernel.PIN_ADDITION_LEG_POINTS, 1), dtype=np.intp)
+_PIN_CUT_SEGMENTS = np.array(
+    kernel.repeat_pairs(kernel.PIN_CUT_LEG_SEGMENTS,
+                        kernel.PIN_CUT_LEG_POINTS, 3), dtype=np.intp)
+_NO_ARCS = np.empty((0, 2), dtype=np.intp)
+
+
+def as_columns(columns, names):
+    """
+    Converts the requested parameter columns into float arrays of a common
+    length. Scalars are broadcast, so a constant parameter does not need a
+    full column.
+    :param columns: Dictionary from parameter name to array-like or scalar.
+    :param names: The parameter names that are needed.
+    :return: Dictionary from parameter name to 1D float64 array.
+    """
+    arrays = [np.asarray(columns[name], dtype=np.float64) for name in names]
+    arrays = np.broadcast_arrays(*[np.atleast_1d(a) for a in arrays])
+    for name, array in zip(names, arrays):
+        if array.ndim != 1:
+            raise ValueError(f"Parameter '{name}' must be one dimensional, "
+                             f"got shape {array.shape}.")
+    return dict(zip(names, arrays))
+
+
+def columns_from_parameters(parameter_dicts):
+    """
+    Builds columns from a sequence of the parameter dictionaries the geometry
+    classes take. Mostly useful for comparing against the kernel.
+    """
+    names = list(parameter_dicts[0].keys())
+    return {name: [parameters[name] for parameters in parameter_dicts]
+            for name in names}
+
+
+def _planes(rows, point_count):
+    """
+    Allocates the coordinate storage for a batch of profiles. Coordinates are
+    stored as two (P, N) planes, so that each point column is written
+    contiguously. _points turns it into the (N, P, 2) view that is returned.
+    """
+    return np.empty((2, point_count, rows))
+
+
+def _points(planes):
+    return planes.transpose(2, 1, 0)
+
+
+def _fill(planes, leg):
+    """Writes a list of (x, y) columns into the first len(leg) points."""
+    for i, (x, y) in enumerate(leg):
+        planes[0, i] = x
+        planes[1, i] = y
+    return planes
+
+
+def _mirror(planes, count, axis):
+    """
+    Same as kernel.mirror_points, writing the mirror of the first count
+    points right after them.
+    """
+    planes[:, count:2 * count] = planes[:, :count]
+    if axis == "x":
+        np.negative(planes[0, :count], out=planes[0, count:2 * count])
+    elif axis == "y":
+        np.negative(planes[1, :count], out=planes[1, count:2 * count])
+    return planes
+
+
+def _profile(points_coordinates, point_pair_indexes, arc_indexes,
+             sweep_angles):
+    return {"points_coordinates": points_coordinates,
+            "point_pair_indexes": point_pair_indexes,
+            "arc_lines": {"indexes": arc_indexes,
+                          "sweep_angles": sweep_angles}}
+
+
+def cantilever_join_profiles(columns):
+    c = as_columns(columns, ["top_radius", "thickness", "length", "strain",
+                             "nose_angle"])
+    r_top = c["top_radius"]
+    th = c["thickness"]
+    l = c["length"]
+    zero = 0.0
+
+    bot_radius_sweep_angle = np.arctan(l / (th / 2))
+    nose_height = 1.09 * c["strain"] * l ** 2 / th
+    nose_x = nose_height / np.tan(np.radians(c["nose_angle"]))
+
+    # Same as the kernel with the bottom radius fixed at zero.
+    planes = _planes(len(l), CANTILEVER_JOIN_POINTS)
+    _fill(planes, [(zero, zero), (zero, zero),
+                     (zero, zero),
+                     (l * 1.20 + nose_x, 1 / 2 * th * 1.25),
+                     (l * 1.20 + nose_x, 3 / 4 * th),
+                     (l * 1.07 + nose_x, th + nose_height),
+                     (l + nose_x, th + nose_height),
+                     (l + nose_x, th + nose_height),
+                     (l, th),
+                     (r_top, th),
+                     (r_top, r_top + th),
+                     (zero, r_top + th)])
+
+    sweep_angles = np.stack((-bot_radius_sweep_angle,
+                             np.full_like(l, np.pi / 2)), axis=1)
+    return _profile(_points(planes), _CANTILEVER_JOIN_SEGMENTS,
+                    _CANTILEVER_JOIN_ARCS, sweep_angles)
+
+
+def cantilever_cut_profiles(columns):
+    c = as_columns(columns, ["top_radius", "thickness", "length", "strain",
+                             "nose_angle", "length_gap", "width_gap",
+                             "extra_length"])
+    r_top = c["top_radius"]
+    th = c["thickness"]
+    length = c["length"]
+    g_l = c["length_gap"]
+    g_h = c["width_gap"]
+    zero = 0.0
+
+    nose_height = 1.09 * c["strain"] * length ** 2 / th
+    nose_x = nose_height / np.tan(np.radians(c["nose_angle"]))
+    total_length = 1.20 * length + nose_x + c["extra_length"]
+
+    planes = _planes(len(length), CANTILEVER_CUT_POINTS)
+    _fill(planes, [(zero, -g_h),
+                     (zero, zero - g_h),
+                     (total_length, zero - g_h),
+                     (total_length, th + nose_height + g_h),
+                     (length + nose_x - g_l, th + nose_height + g_h),
+                     (length - g_l, th + g_h),
+                     (r_top, th + g_h),
+                     (zero, r_top + th + g_h)])
+
+    sweep_angles = np.empty((len(length), 0))
+    return _profile(_points(planes), _CANTILEVER_CUT_SEGMENTS, _NO_ARCS,
+                    sweep_angles)
+
+
+def pin_join_profiles(columns):
+    c = as_columns(columns, ["thickness", "length", "length_gap", "width",
+                             "width_gap", "middle_padding", "ledge", "strain",
+                             "pin_prestrain", "nose_angle"])
+    t = c["thickness"]
+    fl = c["length"]
+    lg = c["length_gap"]
+    w = c["width"]
+    wg = c["width_gap"]
+    mp = c["middle_padding"]
+    ldg = c["ledge"]
+    tan_nose = np.tan(np.radians(c["nose_angle"]))
+    zero = 0.0
+
+    P2y = w/2 - wg - t
+    P3x = mp + fl + lg
+    P3y = w/2 - wg - t/2
+    sl = (P3y - P2y)/(P3x - mp)  # Inner slope of leg
+
+    hl = 0.2*fl  # Head length
+    tl = 0.05*fl  # Top length
+
+    nh = 1.09 * (c["strain"] + c["pin_prestrain"]) * fl ** 2 / t
+    nh_hole = 1.09 * c["strain"] * fl ** 2 / t
+    nose_offset_x = (nh - nh_hole)/tan_nose
+    nose_x = nh / tan_nose
+
+    planes = _planes(len(fl), PIN_JOIN_POINTS)
+    _fill(planes, [
+        (zero, zero),  # 0
+        (mp, zero),  # 1
+        (mp, P2y),  # 2
+        (P3x, P3y),  # 3
+        (P3x + nose_x + hl, P3y + sl*(nose_x + hl)),  # 4
+        (P3x + nose_x + hl, P3y + sl*(nose_x + hl) + nh/2),  # 5
+        (P3x + nose_x + tl, w/2 - wg + nh),  # 6
+        (P3x + nose_x - nose_offset_x, w/2 - wg + nh),  # 7
+        (P3x - nose_offset_x, w/2 - wg),  # 8
+        (ldg, w/2 - wg),  # 9
+        (zero, w/2 - wg + ldg),  # 10
+    ])
+    _mirror(planes, kernel.PIN_JOIN_LEG_POINTS, "y")
+    _mirror(planes, 2 * kernel.PIN_JOIN_LEG_POINTS, "x")
+
+    sweep_angles = np.empty((len(fl), 0))
+    return _profile(_points(planes), _PIN_JOIN_SEGMENTS, _NO_ARCS,
+                    sweep_angles)
+
+
+def pin_addition_profiles(columns):
+    c = as_columns(columns, ["thickness", "wall_thickness", "length",
+                             "strain", "pin_prestrain", "width",
+                             "middle_padding", "extra_length", "nose_angle"])
+    th = c["thickness"]
+    wall_thickness = c["wall_thickness"]
+    fl = c["length"]
+    width = c["width"]
+    mp = c["middle_padding"]
+    extra_length = c["extra_length"]
+    zero = 0.0
+
+    # Note: pretension is intentionally omitted for nose height here
+    hole_nh = 1.09 * c["strain"] * fl ** 2 / th
+    nh = 1.09 * (c["strain"] + c["pin_prestrain"]) * fl ** 2 / th
+    nose_x = nh / np.tan(np.radians(c["nose_angle"]))
+    tl = 0.05*fl  # Top length
+
+    planes = _planes(len(fl), PIN_ADDITION_POINTS)
+    _fill(planes, [
+        (zero, zero),  # 0
+        (mp + fl + extra_length + nose_x + tl, zero),  # 1
+        (mp + fl + nose_x + tl + extra_length,
+         width / 2 + hole_nh + wall_thickness),  # 2
+        (mp + fl, width / 2 + hole_nh + wall_thickness),  # 3
+        (mp + fl - nh, width / 2 + wall_thickness),  # 4
+        (zero, width / 2 + wall_thickness)  # 5
+    ])
+    _mirror(planes, kernel.PIN_ADDITION_LEG_POINTS, "y")
+
+    sweep_angles = np.empty((len(fl), 0))
+    return _profile(_points(planes), _PIN_ADDITION_SEGMENTS, _NO_ARCS,
+                    sweep_angles)
+
+
+def pin_cut_profiles(columns):
+    c = as_columns(columns, ["thickness", "length", "strain", "pin_prestrain",
+                             "width", "ledge", "middle_padding",
+                             "extra_length", "nose_angle"])
+    th = c["thickness"]
+    fl = c["length"]
+    width = c["width"]
+    ledge = c["ledge"]
+    mp = c["middle_padding"]
+    extra_length = c["extra_length"]
+    tan_nose = np.tan(np.radians(c["nose_angle"]))
+    zero = 0.0
+
+    # Note: pretension is intentionally omitted for nose height here
+    hole_nh = 1.09 * c["strain"] * fl ** 2 / th
+    nh = 1.09 * (c["strain"] + c["pin_prestrain"]) * fl ** 2 / th
+    nose_x = nh / tan_nose
+    hole_nose_x = hole_nh / tan_nose
+    hl = 0.2*fl  # Head length
+
+    planes = _planes(len(fl), PIN_CUT_POINTS)
+    _fill(planes, [
+        (zero, zero),  # 0
+        (mp + fl + nose_x + hl + extra_length, zero),  # 1
+        (mp + fl + nose_x + hl + extra_length, width / 2 + hole_nh),  # 2
+        (mp + fl + hole_nose_x, width / 2 + hole_nh),  # 3
+        (mp + fl, width / 2),  # 4
+        (ledge, width / 2),  # 5
+        (zero, width / 2 + ledge)  # 6
+    ])
+    _mirror(planes, kernel.PIN_CUT_LEG_POINTS, "y")
+    _mirror(planes, 2 * kernel.PIN_CUT_LEG_POINTS, "x")
+
+    sweep_angles = np.empty((len(fl), 0))
+    return _profile(_points(planes), _PIN_CUT_SEGMENTS, _NO_ARCS,
+                    sweep_angles)
+
+
+def round_4(values):
+    """
+    Python's round(value, 4) of each value. np.round scales by 10**4 and
+    rounds that, which rounds values a hair from a half, like 0.10925,
+    differently than round(). Those few are rounded by round().
+    """
+    scaled = values * 1e4
+    rounded = np.rint(scaled) / 1e4
+    with np.errstate(invalid="ignore"):
+        # inf - inf is NaN, which is not near a half
+        near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(value, 4)
+                              for value in values[near_half].tolist()]
+    return rounded
+
+
+def _round_size_columns(columns, rounded):
+    for name in rounded:
+        columns[name] = round_4(columns[name])
+    return columns
+
+
+def pin_size_values(sizes, length_width_ratio=kernel.LENGTH_WIDTH_RATIO):
+    """
+    Same as kernel.pin_size_values, for an array of sizes.
+    :return: Dictionary from parameter name to 1D float64 array.
+    """
+    sizes = np.atleast_1d(np.asarray(sizes, dtype=np.float64))
+    max_gap_buffer = 0.08
+    # In the order of the scalar branches. NaN fails every comparison there,
+    # and gets no gap buffer.
+    gap_buffer = np.select(
+        [~(sizes > 0), sizes <= 0.3, sizes <= 1, sizes <= 1.5],
+        [0, sizes / 10, 0.030 + (sizes - 0.3) / 25,
+         0.050 + (max_gap_buffer-0.05)*(sizes - 1)/(1.5 - 1)],
+        default=max_gap_buffer)
+    thickness = sizes/2 - gap_buffer
+    return {"width": sizes,
+            "length": sizes * length_width_ratio,
+            "extrusion_distance": sizes,
+            "thickness": thickness,
+            "middle_padding": thickness,
+            "ledge": sizes / 12,
+            "gap_buffer": gap_buffer,
+            "wall_thickness": sizes / 4}
+
+
+def pin_size_columns(sizes, length_width_ratio=kernel.LENGTH_WIDTH_RATIO):
+    """
+    Same as kernel.pin_size_parameters, for an array of sizes. The columns
+    can be passed on to the pin profile functions.
+    """
+    return _round_size_columns(pin_size_values(sizes, length_width_ratio),
+                               kernel.PIN_ROUNDED)
+
+
+def cantilever_size_values(sizes,
+                           length_width_ratio=kernel.LENGTH_WIDTH_RATIO):
+    """
+    Same as kernel.cantilever_size_values, for an array of sizes.
+    """
+    sizes = np.clip(np.atleast_1d(np.asarray(sizes, dtype=np.float64)),
+                    kernel.CANTILEVER_MIN_SIZE, None)
+    top_radius = np.select(
+        [sizes <= 0.3, sizes <= 1],
+        [0.03, 0.03 + 0.12*(sizes - 0.3) / 0.7],
+        default=0.15)
+    return {"length": sizes * length_width_ratio,
+            "extrusion_distance": sizes,
+            "top_radius": top_radius,
+            "thickness": pin_size_values(sizes)["thickness"]}
+
+
+def cantilever_size_columns(sizes,
+                            length_width_ratio=kernel.LENGTH_WIDTH_RATIO):
+    """
+    Same as kernel.cantilever_size_parameters, for an array of sizes.
+    """
+    return _round_size_columns(
+        cantilever_size_values(sizes, length_width_ratio),
+        kernel.CANTILEVER_ROUNDED)
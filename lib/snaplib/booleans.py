@@ -0,0 +1,104 @@
+"""
+Batched boolean operations for placing many snaps at once.
+
+Each snap joins its body into, and cuts its opening out of, the selected
+target bodies. Done one snap at a time, that is one combine feature per snap
+and target, and Fusion recomputes the target once for each of them. When the
+geometry classes are given a BooleanScheduler, they queue their joins and
+cuts instead, and run() performs them with one combine feature per target
+body, using all the tool bodies of the batch at once.
+"""
+
+import logging
+
+import adsk.core
+import adsk.fusion
+
+from .timing import span
+
+
+class BooleanScheduler:
+    """
+    Collects the joins, cuts and removals of a batch of snaps. run() performs
+    all joins before all cuts, since the pins cut the bodies their addition
+    bodies were joined into, and removes bodies only after both.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(type(self).__name__)
+        # Lists of (target body, [tool bodies]), in the order first queued
+        self.joins = []
+        self.cuts = []
+        # (Features of the component owning the entity, entity)
+        self.removals = []
+        self.requested = 0
+        self.performed = 0
+
+    @property
+    def saved(self):
+        """The number of combine features saved by grouping the tools."""
+        return self.requested - self.performed
+
+    @staticmethod
+    def _queue(groups, target, tool):
+        for queued_target, tools in groups:
+            if queued_target == target:
+                tools.append(tool)
+                return
+        groups.append((target, [tool]))
+
+    def join(self, target, tool):
+        """
+        Queues joining tool into target.
+        :param target: The BRepBody that is kept.
+        :param tool: A BRepBody in the context of the component run() gets,
+            e.g. a proxy made with createForAssemblyContext().
+        """
+        self._queue(self.joins, target, tool)
+        self.requested += 1
+
+    def cut(self, target, tool):
+        """Queues cutting tool out of target. The tool body is kept."""
+        self._queue(self.cuts, target, tool)
+        self.requested += 1
+
+    def remove(self, features, entity):
+        """
+        Queues removing entity after the combines.
+        :param features: The Features of the component that owns entity.
+        """
+        self.removals.append((features, entity))
+
+    def _combine(self, combine_features, target, tools, operation,
+                 keep_tools):
+        tool_bodies = adsk.core.ObjectCollection.create()
+        for tool in tools:
+            tool_bodies.add(tool)
+        combine_input = combine_features.createInput(target, tool_bodies)
+        combine_input.operation = operation
+        combine_input.isKeepToolBodies = keep_tools
+        combine_features.add(combine_input)
+        self.performed += 1
+
+    def run(self, component):
+        """
+        Performs everything that was queued.
+        :param component: The component whose combine features are used,
+            normally the root component.
+        """
+        combine_features = component.features.combineFeatures
+        operations = adsk.fusion.FeatureOperations
+        with span("join", "batch"):
+            for target, tools in self.joins:
+                self._combine(combine_features, target, tools,
+                              operations.JoinFeatureOperation, False)
+        with span("cut", "batch"):
+            for target, tools in self.cuts:
+                self._combine(combine_features, target, tools,
+                              operations.CutFeatureOperation, True)
+        with span("remove", "batch"):
+            for features, entity in self.removals:
+                features.removeFeatures.add(entity)
+        self.logger.debug(f"{self.performed} combine features for "
+                          f"{self.requested} joins and cuts, "
+                          f"{self.saved} saved.")
+        self.joins, self.cuts, self.removals = [], [], []
@@ -0,0 +1,392 @@
+"""
+Snaps built as temporary bodies, for designs where features are not wanted.
+
+The geometry classes sketch every profile, extrude it and combine the bodies
+with features, which is slow and, in a direct modeling design, leaves
+nothing behind that could be edited later anyway. The classes here build
+the same bodies from the kernel profiles with the TemporaryBRepManager,
+perform the joins and cuts in memory, and add only the finished bodies to
+the design. Which path is used is chosen per design type, see use_brep().
+
+Extrusions are written as BRepBodyDefinitions: one planar face at each end
+of the extrusion, and one side face per line (planar) or arc (cylindrical)
+of the profile.
+"""
+
+import logging
+from array import array
+from contextlib import contextmanager
+
+import adsk.core
+import adsk.fusion
+
+from . import configure
+from . import kernel
+from . import mesh
+from .booleans import BooleanScheduler
+from .geometry import Cantilever, Pin, ParameterException, placement_matrix
+from .timing import set_parameters, span
+
+
+def use_brep(design):
+    """
+    :param design: The active adsk.fusion.Design.
+    :return: True if snaps in this design are built with the classes here.
+    """
+    if design.designType == adsk.fusion.DesignTypes.DirectDesignType:
+        return configure.get_setting("brep_direct")
+    return configure.get_setting("brep_parametric")
+
+
+def is_parametric(design):
+    return design.designType != adsk.fusion.DesignTypes.DirectDesignType
+
+
+def _point(x, y, e):
+    """Sketch point (x, y) extruded e, in component coordinates."""
+    return adsk.core.Point3D.create(x, e, -y)
+
+
+def _reversed(edges):
+    reverse = []
+    for start, end, arc in reversed(edges):
+        if arc is not None:
+            center, sweep_angle = arc
+            arc = (center, -sweep_angle)
+        reverse.append((end, start, arc))
+    return reverse
+
+
+def _polygon(edges):
+    polygon = []
+    for start, end, arc in edges:
+        polygon.append(start)
+        if arc is not None:
+            center, sweep_angle = arc
+            polygon.extend(mesh.arc_points(start, center, sweep_angle)[:-1])
+    return polygon
+
+
+def _curve(start, end, arc, e):
+    if arc is None:
+        return adsk.core.Line3D.create(_point(*start, e), _point(*end, e))
+    center, sweep_angle = arc
+    normal = adsk.core.Vector3D.create(0, 1 if sweep_angle > 0 else -1, 0)
+    center_point = _point(*center, e)
+    reference = center_point.vectorTo(_point(*start, e))
+    return adsk.core.Arc3D.createByCenter(center_point, normal, reference,
+                                          reference.length, 0,
+                                          abs(sweep_angle))
+
+
+def _side_surface(start, end, arc, e):
+    if arc is None:
+        # Outward normal of a counter-clockwise loop, turned into the
+        # component
+        nx, ny = end[1] - start[1], start[0] - end[0]
+        return adsk.core.Plane.create(_point(*start, e),
+                                      adsk.core.Vector3D.create(nx, 0, -ny)), \
+            False
+    center, sweep_angle = arc
+    center_point = _point(*center, e)
+    radius = center_point.distanceTo(_point(*start, e))
+    cylinder = adsk.core.Cylinder.create(
+        center_point, adsk.core.Vector3D.create(0, 1, 0), radius)
+    # A clockwise arc in a counter-clockwise loop is concave, so the
+    # material is on the outside of the cylinder
+    return cylinder, sweep_angle < 0
+
+
+def extrude_profile(profile, start, end):
+    """
+    Temporary body of a profile extruded along the sketch normal.
+    :param profile: kernel.SketchProfile
+    :param start: Start of the extrusion, as distance along the normal.
+    :param end: End of the extrusion.
+    :return: A temporary adsk.fusion.BRepBody in component coordinates.
+    """
+    definition = adsk.fusion.BRepBodyDefinition.create()
+    shell = definition.lumpDefinitions.add().shellDefinitions.add()
+    up = adsk.core.Vector3D.create(0, 1, 0)
+    down = adsk.core.Vector3D.create(0, -1, 0)
+    for edges in mesh.edge_loops(profile):
+        if mesh.signed_area(_polygon(edges)) < 0:
+            edges = _reversed(edges)
+
+        bottom_vertices = [shell.vertexDefinitions.add(_point(*p, start))
+                           for p, _, _ in edges]
+        top_vertices = [shell.vertexDefinitions.add(_point(*p, end))
+                        for p, _, _ in edges]
+        count = len(edges)
+        bottom_edges, top_edges, vertical_edges = [], [], []
+        for i, (p0, p1, arc) in enumerate(edges):
+            j = (i + 1) % count
+            bottom_edges.append(shell.edgeDefinitions.add(
+                bottom_vertices[i], bottom_vertices[j],
+                _curve(p0, p1, arc, start)))
+            top_edges.append(shell.edgeDefinitions.add(
+                top_vertices[i], top_vertices[j], _curve(p0, p1, arc, end)))
+            vertical_edges.append(shell.edgeDefinitions.add(
+                bottom_vertices[i], top_vertices[i],
+                adsk.core.Line3D.create(_point(*p0, start),
+                                        _point(*p0, end))))
+
+        top = shell.faceDefinitions.add(
+            adsk.core.Plane.create(_point(0, 0, end), up), False)
+        loop = top.loopDefinitions.add()
+        for edge in top_edges:
+            loop.bRepCoEdgeDefinitions.add(edge, False)
+
+        bottom = shell.faceDefinitions.add(
+            adsk.core.Plane.create(_point(0, 0, start), down), False)
+        loop = bottom.loopDefinitions.add()
+        for edge in reversed(bottom_edges):
+            loop.bRepCoEdgeDefinitions.add(edge, True)
+
+        for i, (p0, p1, arc) in enumerate(edges):
+            j = (i + 1) % count
+            surface, reverse = _side_surface(p0, p1, arc, start)
+            loop = shell.faceDefinitions.add(surface, reverse) \
+                .loopDefinitions.add()
+            loop.bRepCoEdgeDefinitions.add(bottom_edges[i], False)
+            loop.bRepCoEdgeDefinitions.add(vertical_edges[j], False)
+            loop.bRepCoEdgeDefinitions.add(top_edges[i], True)
+            loop.bRepCoEdgeDefinitions.add(vertical_edges[i], True)
+    return definition.createBody()
+
+
+def mirrored_profile(profile):
+    """profile mirrored across the sketch y axis, i.e. the yZ plane."""
+    return kernel.SketchProfile(
+        kernel.mirror_coordinates(profile.coordinates, "x"),
+        profile.segments, profile.arc_indexes,
+        array("d", [-sweep for sweep in profile.arc_sweeps]))
+
+
+def in_design(body, transform):
+    """A copy of a temporary body, moved by transform."""
+    manager = adsk.fusion.TemporaryBRepManager.get()
+    body = manager.copy(body)
+    manager.transform(body, transform)
+    return body
+
+
+@contextmanager
+def body_adder(component):
+    """
+    Context manager giving a function that adds temporary bodies to
+    component. In a parametric design the bodies go into one base feature.
+    """
+    base_feature = None
+    if is_parametric(component.parentDesign):
+        base_feature = component.features.baseFeatures.add()
+        base_feature.startEdit()
+
+    def add(body, name=None):
+        if base_feature is not None:
+            added = component.bRepBodies.add(body, base_feature)
+        else:
+            added = component.bRepBodies.add(body)
+        if name:
+            added.name = name
+        return added
+
+    try:
+        yield add
+    finally:
+        if base_feature is not None:
+            base_feature.finishEdit()
+
+
+def replace_body(target, body):
+    """
+    Replaces the body target in the design with a temporary body.
+    :param target: The BRepBody, or a proxy of it.
+    :param body: Temporary body in the coordinates of the design.
+    :return: The new BRepBody.
+    """
+    native = target
+    if target.assemblyContext:
+        native = target.nativeObject
+        to_component = target.assemblyContext.transform2.copy()
+        to_component.invert()
+        adsk.fusion.TemporaryBRepManager.get().transform(body, to_component)
+    component = native.parentComponent
+    with body_adder(component) as add:
+        added = add(body, native.name)
+    added.material = native.material
+    added.appearance = native.appearance
+    if is_parametric(component.parentDesign):
+        component.features.removeFeatures.add(native)
+    else:
+        native.deleteMe()
+    return added
+
+
+class BRepBooleans(BooleanScheduler):
+    """
+    BooleanScheduler for temporary tool bodies. run() combines the tools
+    into a temporary copy of each target and replaces the target with the
+    result, so each target body is written once, however many snaps
+    changed it.
+    """
+    def remove(self, features, entity):
+        # The tool bodies never enter the design.
+        pass
+
+    def run(self, component):
+        """
+        :param component: Unused, the new bodies go into the components
+            of their targets.
+        """
+        manager = adsk.fusion.TemporaryBRepManager.get()
+        union = adsk.fusion.BooleanTypes.UnionBooleanType
+        difference = adsk.fusion.BooleanTypes.DifferenceBooleanType
+        targets = [target for target, _ in self.joins]
+        targets += [target for target, _ in self.cuts
+                    if not any(target == other for other in targets)]
+        with span("combine", "brep"):
+            for target in targets:
+                result = manager.copy(target)
+                for operations, boolean_type in ((self.joins, union),
+                                                 (self.cuts, difference)):
+                    for queued_target, tools in operations:
+                        if queued_target != target:
+                            continue
+                        for tool in tools:
+                            manager.booleanOperation(result, tool,
+                                                     boolean_type)
+                replace_body(target, result)
+                self.performed += 1
+        self.logger.debug(f"{self.performed} bodies replaced for "
+                          f"{self.requested} joins and cuts.")
+        self.joins, self.cuts, self.removals = [], [], []
+
+
+class BRepSnap:
+    """
+    Mixin for the geometry classes, replacing their sketches and features
+    with temporary bodies. The component is placed where the joint puts it,
+    since the joins and cuts happen before the bodies are in the design.
+    """
+    def _start(self, parent_comp, parameters, target_joint_org, booleans):
+        try:
+            self.test_parameters(parameters)
+        except ParameterException as e:
+            logging.getLogger(str(type(self)) + str(e))
+        set_parameters(parameters)
+        self.saved_api_calls = 0
+        self.reused = False
+        self.key = None
+        self.occurrence = None
+        self.comp = None
+        self.offsets = self._get_offsets(parameters)
+        self.transform = placement_matrix(self.offsets, target_joint_org)
+        self.booleans = booleans
+        self._run_booleans = booleans is None
+        if booleans is None:
+            self.booleans = BRepBooleans()
+
+    def _finish(self):
+        if self._run_booleans:
+            self.booleans.run(None)
+
+    def _add_component(self, parent_comp, target_joint_org):
+        with span("component"):
+            self.occurrence = parent_comp.occurrences.addNewComponent(
+                self.transform)
+            self.comp = self.occurrence.component
+            self.comp.name = self.component_name
+        self.occurrence.isGroundToParent = False
+        joint_origin = self._create_joint_origin(*self.offsets)
+        if target_joint_org:
+            self.place(joint_origin, target_joint_org)
+
+    def _extrude(self, stage, profile, extent):
+        with span("extrude", stage):
+            return extrude_profile(profile, *extent)
+
+
+class BRepCantilever(BRepSnap, Cantilever):
+    def __init__(self, parent_comp, parameters, target_joint_org=None,
+                 join_body=None, cut_bodies=tuple(), reuse_component=False,
+                 booleans=None):
+        """
+        Same arguments as Cantilever. With a join_body, no component is
+        made, and occurrence is None. reuse_component is ignored.
+        :param booleans: A BRepBooleans, see Cantilever.
+        """
+        self._start(parent_comp, parameters, target_joint_org, booleans)
+        self.cut_bodies = cut_bodies
+
+        body = self._extrude("join", self._sketch_join_properties(parameters),
+                             kernel.join_extent(parameters,
+                                                self.gap_in_cut_body))
+        if join_body:
+            self.booleans.join(join_body, in_design(body, self.transform))
+        else:
+            self._add_component(parent_comp, target_joint_org)
+            with body_adder(self.comp) as add:
+                add(body)
+
+        if cut_bodies:
+            subtraction_body = in_design(
+                self._extrude("cut", self._sketch_cut_properties(parameters),
+                              kernel.cut_extent(parameters,
+                                                self.gap_in_cut_body)),
+                self.transform)
+            for body_to_cut in cut_bodies:
+                self.booleans.cut(body_to_cut, subtraction_body)
+        self._finish()
+
+
+class BRepPin(BRepSnap, Pin):
+    def __init__(self, parent_comp, parameters, target_joint_org=None,
+                 target_body1=None, target_body2=None, reuse_component=False,
+                 booleans=None):
+        """
+        Same arguments as Pin. The subtraction body is only added to the
+        component when there is no target_body1, since the command removes
+        it otherwise. reuse_component is ignored.
+        :param booleans: A BRepBooleans, see Pin.
+        """
+        self._start(parent_comp, parameters, target_joint_org, booleans)
+        self.subtraction_body = None
+        self.addition_body1 = None
+        self.addition_body2 = None
+        self._add_component(parent_comp, target_joint_org)
+        manager = adsk.fusion.TemporaryBRepManager.get()
+        difference = adsk.fusion.BooleanTypes.DifferenceBooleanType
+
+        pin_body = self._extrude("join",
+                                 self._sketch_join_properties(parameters),
+                                 kernel.join_extent(parameters,
+                                                    self.gap_in_cut_body))
+        subtraction_body = self._extrude(
+            "cut", self._sketch_cut_properties(parameters),
+            kernel.cut_extent(parameters, self.gap_in_cut_body))
+        addition_profile = self._sketch_addition_properties(parameters)
+        extent = kernel.addition_extent(parameters)
+        addition_bodies = [
+            self._extrude("addition", addition_profile, extent),
+            self._extrude("mirror", mirrored_profile(addition_profile),
+                          extent)]
+
+        with body_adder(self.comp) as add:
+            add(pin_body, "Pin body")
+            if not target_body1:
+                self.subtraction_body = add(subtraction_body,
+                                            "Subtraction body")
+            for i, (target, addition_body) in enumerate(
+                    zip((target_body1, target_body2), addition_bodies)):
+                if target:
+                    self.booleans.join(
+                        target, in_design(addition_body, self.transform))
+                    self.booleans.cut(
+                        target, in_design(subtraction_body, self.transform))
+                    continue
+                manager.booleanOperation(addition_body, subtraction_body,
+                                         difference)
+                setattr(self, f"addition_body{i + 1}",
+                        add(addition_body, f"Addition body {i + 1}"))
+        self._finish()
@@ -0,0 +1,108 @@
+"""
+A bounded cache for computed sketch profiles.
+
+The preview handlers rebuild the geometry on every input change, and the user
+often toggles back to values that were already computed. The geometry classes
+look their profiles up here first, keyed on a quantized copy of the parameters
+the profile is computed from, so repeated previews skip the profile math, also
+when only a parameter the profile does not read changed. There is one shared instance,
+profile_cache, which all commands use through the geometry classes.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+# Fusion works in centimeters internally, so this rounds lengths to 1 µm.
+LENGTH_QUANTUM = 1e-4
+# Parameters without a length unit need a finer resolution.
+UNITLESS_QUANTUM = 1e-9
+UNITLESS_PARAMETERS = ("strain", "pin_prestrain", "nose_angle")
+
+
+def parameter_key(parameters, quantum=LENGTH_QUANTUM,
+                  unitless_quantum=UNITLESS_QUANTUM):
+    """
+    Returns a canonical, hashable version of a parameter dictionary. Keys are
+    sorted and numbers are rounded to a whole number of quanta, so parameter
+    sets that only differ by floating point noise map to the same key.
+    :param parameters: Parameter dictionary, as given to the geometry classes.
+    :param quantum: Resolution of length parameters.
+    :param unitless_quantum: Resolution of UNITLESS_PARAMETERS.
+    :return: Tuple of (name, value) pairs.
+    """
+    items = []
+    for name in sorted(parameters):
+        value = parameters[name]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if name in UNITLESS_PARAMETERS:
+                value = round(value / unitless_quantum)
+            else:
+                value = round(value / quantum)
+        items.append((name, value))
+    return tuple(items)
+
+
+def parameter_hash(parameters):
+    """A short, stable hex digest of the quantized parameters."""
+    key = repr(parameter_key(parameters)).encode("utf-8")
+    return hashlib.sha1(key).hexdigest()[:16]
+
+
+class ProfileCache:
+    """
+    Least recently used cache of profile data. Entries are keyed on a profile
+    kind, e.g. ("Cantilever", "join"), and the quantized parameters the
+    profile depends on.
+
+    The cached profiles are shared between callers, so they must be treated
+    as read-only.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, kind, parameters, compute, names=None):
+        """
+        Returns the cached profile for kind and parameters, computing and
+        storing it with compute(parameters) when it is missing.
+        :param names: The parameters compute reads, e.g. from
+            kernel.PIN_STAGE_PARAMETERS. The others are left out of the key.
+            None for all of them.
+        """
+        if names is not None:
+            parameters_read = {name: parameters[name] for name in names}
+        else:
+            parameters_read = parameters
+        key = (kind, parameter_key(parameters_read))
+        try:
+            profile = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            profile = compute(parameters)
+            self._entries[key] = profile
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return profile
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return profile
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,410 @@
+"""
+Precomputed size catalog for the size_parameters() of the commands.
+
+The size input recomputes the standardized parameters of
+kernel.pin_size_parameters() or kernel.cantilever_size_parameters() on each
+edit. A catalog holds those parameters for every size on a fine grid (1 mm
+to 10 cm in 0.01 mm steps) in a binary file, which is mapped with mmap and
+read through a memoryview of doubles. Sizes typed in mm with up to two
+decimals are on the grid, and are looked up by their row index without any
+formula or rounding work. Other sizes, and other length to width ratios,
+are computed with the formulas: rounding an interpolated value takes longer
+than the formula in Python.
+
+The rows also hold the unrounded values, which size_values() interpolates
+between grid points. The formulas are piecewise linear with their breaks on
+the grid, so the interpolation gives the formula values, except in the grid
+cells where they jump (the pin's gap buffer just above 1 cm). The catalog
+lists those cells, and returns None for them.
+
+The file also holds the approved sizes of the snap type, the standardized
+sizes that are offered to users. They are checked against the formulas when
+the catalog is written. tools/build_size_catalog.py writes and validates
+catalogs. In the add-in, configure.get_size_catalog() writes them to the
+config folder the first time, and again when the formulas have changed.
+
+File layout, little-endian: HEADER, the metadata as UTF-8 JSON, padding to
+8 bytes, then the rows of doubles, see SizeCatalog.
+
+No adsk imports, so the catalog can be used outside Fusion.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from . import kernel
+
+MAGIC = b"SNAPSIZE"
+# Increased when the layout or the meaning of the values changes.
+CATALOG_VERSION = 1
+# magic, version, values per row, rows, metadata length, start, step and the
+# length / width ratio.
+HEADER = struct.Struct("<8sHHIIddd")
+CATALOG_SUFFIX = ".sizes"
+# The grid, in cm.
+MIN_SIZE = 0.1
+MAX_SIZE = 10.0
+STEP = 0.001
+# Positions closer than this to a grid point use the row as it is.
+GRID_TOLERANCE = 1e-6
+# Allowed difference of interpolated values from the formulas, in cm.
+VALUE_TOLERANCE = 1e-9
+
+# Snap type to (unrounded values, rounded names) of the formulas.
+FORMULAS = {
+    "Pin": (kernel.pin_size_values, kernel.PIN_ROUNDED),
+    "Cantilever": (kernel.cantilever_size_values,
+                   kernel.CANTILEVER_ROUNDED),
+}
+
+# SizeCatalog by file path, see open_catalog().
+_catalogs = {}
+
+
+class CatalogException(Exception):
+    pass
+
+
+def _formulas(snap_type):
+    if snap_type not in FORMULAS:
+        raise CatalogException(f"No size formulas for '{snap_type}', should "
+                               f"be one of {tuple(FORMULAS)}.")
+    return FORMULAS[snap_type]
+
+
+def grid_size(start, step, index):
+    """The size of a grid row, without the error of start + index*step."""
+    return round(start + index * step, 9)
+
+
+def row_count(start=MIN_SIZE, stop=MAX_SIZE, step=STEP):
+    return int(round((stop - start) / step)) + 1
+
+
+class SizeCatalog:
+    """
+    The size parameters of one snap type on a grid of sizes.
+
+    A row holds the parameters as size_parameters() returns them, in the
+    order of columns, followed by the unrounded values of the rounded ones,
+    in the order of raw_columns, and the size of the row. A size on a grid
+    point is returned as it is, other sizes are interpolated from the
+    unrounded values.
+    """
+    def __init__(self, snap_type, columns, raw_columns, values, start, step,
+                 rows, length_width_ratio=kernel.LENGTH_WIDTH_RATIO,
+                 approved=(), formula_cells=(), source=None):
+        """
+        :param columns: Parameter names.
+        :param raw_columns: Names of the parameters that are rounded.
+        :param values: Sequence of the doubles of the rows, row by row.
+        :param approved: The approved sizes.
+        :param formula_cells: Indexes of the rows that can't be interpolated
+            from, to the next row.
+        :param source: The mmap the values are read from, closed by close().
+        """
+        self.snap_type = snap_type
+        self.columns = tuple(columns)
+        self.raw_columns = tuple(raw_columns)
+        self.width = len(self.columns) + len(self.raw_columns) + 1
+        # Where the unrounded value of each column is in a row
+        self.raw_index = [
+            len(self.columns) + self.raw_columns.index(name)
+            if name in self.raw_columns else column
+            for column, name in enumerate(self.columns)]
+        self.values = values
+        self.start = start
+        self.step = step
+        self.rows = rows
+        self.length_width_ratio = length_width_ratio
+        self.approved = tuple(approved)
+        self.formula_cells = frozenset(formula_cells)
+        self.rounded = _formulas(snap_type)[1]
+        self.source = source
+        self.lookups = 0
+        self.fallbacks = 0
+
+    def close(self):
+        if self.source is not None:
+            self.values.release()
+            self.source.close()
+            self.source = None
+
+    def row(self, index):
+        """:return: The parameters of a grid row, by name."""
+        offset = index * self.width
+        return dict(zip(self.columns, self.values[
+            offset:offset + len(self.columns)].tolist()))
+
+    def raw_row(self, index):
+        """:return: The unrounded values of a grid row, as a list."""
+        offset = index * self.width
+        row = self.values[offset:offset + self.width].tolist()
+        return [row[column] for column in self.raw_index]
+
+    def _position(self, size, length_width_ratio):
+        """
+        :return: (row index, True if size is its grid size), or None if
+            size has to be computed with the formula.
+        """
+        if length_width_ratio != self.length_width_ratio:
+            return None
+        position = (size - self.start) / self.step
+        if not -GRID_TOLERANCE <= position <= self.rows - 1 + GRID_TOLERANCE:
+            return None
+        index = round(position)
+        if abs(position - index) <= GRID_TOLERANCE:
+            # A few bits off the grid size, e.g. 4.37 mm / 10, can round
+            # differently in the formula
+            if size != self.values[(index + 1) * self.width - 1]:
+                return None
+            return index, True
+        return int(position), False
+
+    def size_values(self, size, length_width_ratio=kernel.LENGTH_WIDTH_RATIO):
+        """
+        The unrounded values of size, interpolated between the grid rows.
+        :return: Dictionary by name, or None if size is not in the catalog.
+        """
+        position = self._position(size, length_width_ratio)
+        if position is None:
+            return None
+        index, on_grid = position
+        if on_grid:
+            return dict(zip(self.columns, self.raw_row(index)))
+        if index in self.formula_cells:
+            return None
+        fraction = (size - self.start) / self.step - index
+        width = self.width
+        # This row and the next one
+        rows = self.values[index * width:(index + 2) * width].tolist()
+        return dict(zip(self.columns, [
+            rows[column] + fraction * (rows[column + width] - rows[column])
+            for column in self.raw_index]))
+
+    def size_parameters(self, size,
+                        length_width_ratio=kernel.LENGTH_WIDTH_RATIO):
+        """
+        The same as the snap type's size_parameters() formula. Sizes on the
+        grid are read from the catalog, as the sizes typed in mm are.
+        """
+        self.lookups += 1
+        position = self._position(size, length_width_ratio)
+        if position is not None and position[1]:
+            return self.row(position[0])
+        # Interpolating and rounding takes longer than the formula
+        self.fallbacks += 1
+        return kernel.round_size_values(
+            _formulas(self.snap_type)[0](size, length_width_ratio),
+            self.rounded)
+
+    def is_approved(self, size):
+        return any(abs(size - approved) <= GRID_TOLERANCE * self.step
+                   for approved in self.approved)
+
+
+def build_catalog(snap_type, approved=(), start=MIN_SIZE, stop=MAX_SIZE,
+                  step=STEP, length_width_ratio=kernel.LENGTH_WIDTH_RATIO):
+    """
+    Computes a catalog with the formulas, in memory.
+    :return: SizeCatalog
+    """
+    formula, rounded = _formulas(snap_type)
+    rows = row_count(start, stop, step)
+    columns = list(formula(start, length_width_ratio))
+    values = array("d")
+    for index in range(rows):
+        row = formula(grid_size(start, step, index), length_width_ratio)
+        raw = [row[name] for name in rounded]
+        kernel.round_size_values(row, rounded)
+        values.extend(row[name] for name in columns)
+        values.extend(raw)
+        values.append(grid_size(start, step, index))
+    size_catalog = SizeCatalog(snap_type, columns, rounded, values, start,
+                               step, rows, length_width_ratio,
+                               sorted(approved))
+    # The cells where the interpolation misses the formula in the middle
+    formula_cells = []
+    for index in range(rows - 1):
+        size = start + (index + 0.5) * step
+        expected = formula(size, length_width_ratio)
+        values = size_catalog.size_values(size, length_width_ratio)
+        if any(abs(value - expected[name]) > VALUE_TOLERANCE
+               for name, value in values.items()):
+            formula_cells.append(index)
+    size_catalog.formula_cells = frozenset(formula_cells)
+    return size_catalog
+
+
+def validate_catalog(catalog, samples=1000):
+    """
+    Compares a catalog to the formulas: every approved size exactly, and
+    samples sizes spread over the grid, off the grid points, to
+    VALUE_TOLERANCE before rounding. Approved sizes must also be on the grid
+    and give positive parameters.
+    :return: List of error messages, empty if the catalog is valid.
+    """
+    formula = _formulas(catalog.snap_type)[0]
+    ratio = catalog.length_width_ratio
+    errors = []
+    for size in catalog.approved:
+        position = (size - catalog.start) / catalog.step
+        if abs(position - round(position)) > GRID_TOLERANCE \
+                or catalog.size_values(size, ratio) is None:
+            errors.append(f"Approved size {size} is not on the grid.")
+            continue
+        expected = kernel.round_size_values(formula(size, ratio),
+                                            catalog.rounded)
+        parameters = catalog.size_parameters(size, ratio)
+        if parameters != expected:
+            errors.append(f"Approved size {size}: {parameters} should be "
+                          f"{expected}.")
+        errors += [f"Approved size {size}: {name} is {value}."
+                   for name, value in parameters.items() if value <= 0]
+    last = catalog.rows - 1
+    for sample in range(samples):
+        # Spread over the grid, at varying distances from the grid points
+        position = last * (sample + 0.5) / samples
+        position = int(position) + (sample % 97 + 1) / 99
+        size = catalog.start + min(position, last) * catalog.step
+        values = catalog.size_values(size, ratio)
+        if values is None:
+            # A formula cell
+            continue
+        expected = formula(size, ratio)
+        for name, value in values.items():
+            if abs(value - expected[name]) > VALUE_TOLERANCE:
+                errors.append(f"Size {size}: {name} is {value}, the formula "
+                              f"gives {expected[name]}.")
+    return errors
+
+
+def write_catalog(catalog, path):
+    """Writes a catalog to path, through a temporary file."""
+    path = Path(path)
+    metadata = json.dumps({"snap_type": catalog.snap_type,
+                           "columns": catalog.columns,
+                           "raw_columns": catalog.raw_columns,
+                           "approved": catalog.approved,
+                           "formula_cells": sorted(catalog.formula_cells)}
+                          ).encode("utf-8")
+    header = HEADER.pack(MAGIC, CATALOG_VERSION, catalog.width,
+                         catalog.rows, len(metadata), catalog.start,
+                         catalog.step, catalog.length_width_ratio)
+    padding = -(len(header) + len(metadata)) % 8
+    values = array("d", catalog.values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as f:
+        f.write(header + metadata + bytes(padding))
+        values.tofile(f)
+    os.replace(temporary, path)
+
+
+def read_catalog(path):
+    """
+    Maps a catalog file.
+    :return: SizeCatalog
+    """
+    with open(path, "rb") as f:
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        (magic, version, width, rows, metadata_length, start, step,
+         ratio) = HEADER.unpack_from(source)
+        if magic != MAGIC or version != CATALOG_VERSION:
+            raise CatalogException(f"{Path(path).name} is not a version "
+                                   f"{CATALOG_VERSION} size catalog.")
+        offset = HEADER.size + metadata_length
+        metadata = json.loads(source[HEADER.size:offset].decode("utf-8"))
+        offset += -offset % 8
+        end = offset + rows * width * 8
+        if len(source) != end or width != len(metadata["columns"]) \
+                + len(metadata["raw_columns"]) + 1:
+            raise CatalogException(f"{Path(path).name} is truncated.")
+    except (struct.error, ValueError, KeyError):
+        source.close()
+        raise CatalogException(f"{Path(path).name} is not a size catalog.")
+    except CatalogException:
+        source.close()
+        raise
+    if sys.byteorder == "little":
+        values = memoryview(source)[offset:end].cast("d")
+    else:
+        values = array("d", source[offset:end])
+        values.byteswap()
+        source.close()
+        source = None
+    return SizeCatalog(metadata["snap_type"], metadata["columns"],
+                       metadata["raw_columns"], values, start, step, rows,
+                       ratio, metadata["approved"], metadata["formula_cells"],
+                       source)
+
+
+def _is_current(catalog, snap_type, approved):
+    """True if catalog was written by the current formulas and grid."""
+    if catalog.snap_type != snap_type \
+            or catalog.raw_columns != _formulas(snap_type)[1] \
+            or catalog.approved != tuple(sorted(approved)) \
+            or catalog.start != MIN_SIZE or catalog.step != STEP \
+            or catalog.rows != row_count() \
+            or catalog.length_width_ratio != kernel.LENGTH_WIDTH_RATIO:
+        return False
+    # A formula change shows up in some rows
+    formula = _formulas(snap_type)[0]
+    for index in (0, catalog.rows // 7, catalog.rows // 2, catalog.rows - 1):
+        expected = formula(grid_size(catalog.start, catalog.step, index))
+        if catalog.raw_row(index) != [expected.get(name)
+                                      for name in catalog.columns]:
+            return False
+    return True
+
+
+def open_catalog(path, snap_type, approved=()):
+    """
+    The shared catalog of a file, opened once. The file is written first if
+    it is missing, or was written by other formulas or approved sizes. If
+    it can't be written, the catalog is kept in memory.
+    :param approved: The approved sizes of snap_type.
+    :return: SizeCatalog
+    """
+    path = Path(path)
+    if path in _catalogs:
+        return _catalogs[path]
+    logger = logging.getLogger(__name__)
+    catalog = None
+    if path.exists():
+        try:
+            catalog = read_catalog(path)
+        except CatalogException as e:
+            logger.warning(f"{e} Writing it again.")
+        else:
+            if not _is_current(catalog, snap_type, approved):
+                logger.info(f"{path.name} is out of date. Writing it again.")
+                catalog.close()
+                catalog = None
+    if catalog is None:
+        catalog = build_catalog(snap_type, approved)
+        errors = validate_catalog(catalog, samples=0)
+        if errors:
+            raise CatalogException("\n".join(errors))
+        try:
+            os.makedirs(path.parent, exist_ok=True)
+            write_catalog(catalog, path)
+            catalog = read_catalog(path)
+        except OSError as e:
+            logger.warning(f"Could not write {path.name}: {e}")
+    _catalogs[path] = catalog
+    return catalog
+
+
+def close_all():
+    for catalog in _catalogs.values():
+        catalog.close()
+    _catalogs.clear()
@@ -3,10 +3,21 @@ import os
 import json
 import traceback
 import shutil
+import sys
 from pathlib import Path
 
+from . import timing
+from .store import profile_store
+
 # --- 1. Constants and Global Placeholders ---
 CONFIGURABLE_COMMANDS = ["Cantilever", "Pin"]
+# Used for settings that are missing from an older settings file.
+DEFAULT_SETTINGS = {"lightweight_preview": True,
+                    "reuse_components": True,
+                    "brep_direct": True,
+                    "brep_parametric": False,
+                    "user_parameters": False,
+                    "profile_library": False}
 app = adsk.core.Application.get()
 ui = app.userInterface
 
@@ -18,6 +29,8 @@ APPNAME = None
 CONFIG_PATH = None
 LOGS_PATH = None
 SETTINGS_PATH = None
+# SizeCatalog by snap type, see get_size_catalog()
+size_catalogs = {}
 
 def get_manifest():
     # Use the dynamic glob search we discussed
@@ -42,6 +55,7 @@ def initialize():
         # Ensure directories exist
         os.makedirs(LOGS_PATH, exist_ok=True)
         os.makedirs(CONFIG_PATH / "ProfileData", exist_ok=True)
+        timing.set_log_directory(LOGS_PATH)
         
     except Exception as e:
         ui.messageBox(f"Initialization Failed:\n{traceback.format_exc()}")
@@ -50,7 +64,13 @@ def set_config(c):
     global config
     config = c
 
-def reset_single_profile_data(command_name: str):
+def reset_single_profile_data(command_name: str, reset_library=True):
+    """
+    Copies the default profile file of a command to the config folder.
+    :param reset_library: Also replace the command's profiles in the
+        profile library with the file's, if the library is on. False when
+        only a missing file is recreated.
+    """
     try:
         if command_name not in CONFIGURABLE_COMMANDS:
             raise KeyError(f"\"{command_name}\" not in list of configurable commands")
@@ -58,6 +78,10 @@ def reset_single_profile_data(command_name: str):
         source = config.app_path / "default_config" / f"{command_name}.json"
         target = CONFIG_PATH / "ProfileData" / f"{command_name}.json"
         shutil.copy(source, target)
+        profile_store.invalidate(target)
+        profile_library = get_library() if reset_library else None
+        if profile_library:
+            profile_library.import_json(command_name, target, replace=True)
     except:
         ui.messageBox(traceback.format_exc())
 
@@ -68,12 +92,63 @@ def reset_all_profile_data():
 def get_settings():
     if not SETTINGS_PATH.exists():
         reset_settings()
-    with open(SETTINGS_PATH, "r") as f:
-        return json.load(f)
+    return profile_store.get(SETTINGS_PATH)
+
+def get_setting(name):
+    return get_settings().get(name, DEFAULT_SETTINGS[name])
 
 def dump_settings(settings_dict):
-    with open(SETTINGS_PATH, "w") as f:
-        json.dump(settings_dict, f, indent=4)
+    profile_store.put(SETTINGS_PATH, settings_dict, indent=4)
+
+def get_library():
+    """The profile library, or None if the "profile_library" setting is off."""
+    if not get_setting("profile_library"):
+        return None
+    # Imported here, so that sqlite3 is only loaded if the library is used
+    from . import library
+    return library.open_library(CONFIG_PATH / "ProfileData"
+                                / library.LIBRARY_NAME)
+
+def close_library():
+    """Closes the profile library, if it was opened."""
+    library = sys.modules.get(f"{__package__}.library")
+    if library:
+        library.close_all()
+
+def load_profile_data(command_name: str, profile_library):
+    """
+    The profile data of a command from the library, imported from its JSON
+    file the first time.
+    """
+    if not profile_library.has_snap_type(command_name):
+        profile_library.import_json(
+            command_name, CONFIG_PATH / "ProfileData" / f"{command_name}.json")
+    return profile_library.profile_data(command_name)
+
+def get_size_catalog(snap_type: str):
+    """
+    The size catalog of "Pin" or "Cantilever", with the approved sizes in
+    default_config/approved_sizes.json. Written to the config folder the
+    first time. Only the first call for a snap type touches the files.
+    """
+    if snap_type not in size_catalogs:
+        # Imported here, so that mmap and the catalog are only loaded when
+        # a size is looked up
+        from . import catalog
+        with open(app_path / "default_config" / "approved_sizes.json",
+                  "r") as f:
+            approved = json.load(f).get(snap_type, [])
+        size_catalogs[snap_type] = catalog.open_catalog(
+            CONFIG_PATH / "SizeCatalog"
+            / f"{snap_type}{catalog.CATALOG_SUFFIX}", snap_type, approved)
+    return size_catalogs[snap_type]
+
+def close_size_catalogs():
+    """Unmaps the size catalogs, if any were opened."""
+    size_catalogs.clear()
+    catalog = sys.modules.get(f"{__package__}.catalog")
+    if catalog:
+        catalog.close_all()
 
 def reset_settings():
     source = config.app_path / "default_config" / "settings.json"
@@ -7,20 +7,239 @@ by string id's, and the different geometry classes expect the same names.
 Because of that, it would be a good idea to define these names only once.
 """
 
-import json
 import traceback
 import logging
+from bisect import bisect_left
+from contextlib import contextmanager
 from pathlib import Path
 
 from adsk.core import CommandInputs
 import adsk.core
 
+from .schema import ProfileSchema
+from .store import profile_store
+
 PROJECT_DIRECTORY = Path(__file__).parent.parent.parent
 COMMON_RESOURCES_FOLDER = PROJECT_DIRECTORY / "commands" / "resources" / "common"
 
+# Items shown in a profile dropdown before MORE_ITEM.
+DROPDOWN_PAGE_SIZE = 50
+MORE_ITEM = "More..."
+# The dropdowns listing the names in profile_data["profiles"] and
+# profile_data["gap_profiles"].
+PROFILE_DROPDOWNS = {"profiles": ("profile_list", "profiles2"),
+                     "gap_profiles": ("gap_profiles", "gap_profiles2")}
+
 app = adsk.core.Application.get()
 ui = app.userInterface
 
+
+class PreviewCoalescer:
+    """
+    Collects writes to several inputs into one preview. Handlers like
+    ProfileSwitcher set many inputs one by one, and Fusion may fire
+    executePreview and validateInputs for each of them. While suspended,
+    the preview handler skips those, and a single preview is run when the
+    outermost suspend() ends. One instance is shared by the handlers of a
+    command.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.depth = 0
+        self.pending = False
+        self.counters = {"bulk_writes": 0,
+                         "values_written": 0,
+                         "previews": 0,
+                         "suppressed_previews": 0,
+                         "suppressed_validations": 0,
+                         "rebuilds": 0}
+
+    @property
+    def suspended(self):
+        return self.depth > 0
+
+    @contextmanager
+    def suspend(self, command):
+        """
+        Holds back previews inside the with block. Can be nested.
+        :param command: The adsk.core.Command to preview afterwards.
+        """
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0 and self.pending:
+                self.pending = False
+                self.counters["rebuilds"] += 1
+                command.doExecutePreview()
+
+    def write_values(self, command, values):
+        """
+        Sets the value of several inputs as one change.
+        :param command: The adsk.core.Command the inputs belong to.
+        :param values: Dictionary of input id to value.
+        """
+        all_inputs = command.commandInputs
+        with self.suspend(command):
+            for key, value in values.items():
+                all_inputs.itemById(key).value = value
+        self.counters["bulk_writes"] += 1
+        self.counters["values_written"] += len(values)
+
+    def allow_preview(self):
+        """
+        Called first by the preview handler.
+        :return: False if the preview should be skipped.
+        """
+        if self.suspended:
+            self.counters["suppressed_previews"] += 1
+            self.pending = True
+            return False
+        self.counters["previews"] += 1
+        return True
+
+    def allow_validation(self):
+        """Like allow_preview(), for the validateInputs handler."""
+        if self.suspended:
+            self.counters["suppressed_validations"] += 1
+            return False
+        return True
+
+    def log_counters(self):
+        self.logger.debug(f"Preview counters: {self.counters}")
+
+
+class ProfileLists(adsk.core.InputChangedEventHandler):
+    """
+    Keeps the profile dropdowns (PROFILE_DROPDOWNS) in step with
+    profile_data. After a profile is created or deleted, sync() only adds
+    and deletes the items whose names changed, instead of clearing the lists
+    and adding every profile again, so the selection stays.
+
+    Long lists show page_size items, and MORE_ITEM at the end. Selecting it
+    adds the next page, which is what this handler listens for. One instance
+    is shared by a command's dropdowns and handlers.
+    """
+    def __init__(self, profile_data, resource_folder,
+                 page_size=DROPDOWN_PAGE_SIZE):
+        super().__init__()
+        self.profile_data = profile_data
+        self.icon = str(resource_folder / "white")
+        self.page_size = page_size
+        self.logger = logging.getLogger(type(self).__name__)
+        # Dropdown id to the names of its items, without MORE_ITEM
+        self.shown = {}
+        self.counters = {"added": 0, "deleted": 0, "pages": 0}
+
+    @staticmethod
+    def kind_of(dropdown_id):
+        """:return: "profiles", "gap_profiles" or None."""
+        for kind, dropdown_ids in PROFILE_DROPDOWNS.items():
+            if dropdown_id in dropdown_ids:
+                return kind
+        return None
+
+    def _shown(self, dropdown):
+        shown = self.shown.get(dropdown.id)
+        if shown is None:
+            # Not filled by fill(), so read it
+            items = dropdown.listItems
+            shown = [items.item(i).name for i in range(items.count)]
+            if MORE_ITEM in shown:
+                shown.remove(MORE_ITEM)
+            self.shown[dropdown.id] = shown
+        return shown
+
+    def fill(self, dropdown, selected=None):
+        """
+        Adds the first page of items to a new dropdown, and the selected
+        item if it comes later.
+        """
+        names = list(self.profile_data[self.kind_of(dropdown.id)])
+        shown = names[:self.page_size]
+        if selected in names and selected not in shown:
+            shown.append(selected)
+        items = dropdown.listItems
+        for name in shown:
+            items.add(name, name == selected, self.icon)
+        self.shown[dropdown.id] = shown
+        self._update_more(dropdown, names)
+
+    def _insert(self, dropdown, positions, name):
+        """Adds an item for name where it is in profile_data."""
+        shown = self.shown[dropdown.id]
+        index = bisect_left([positions[shown_name] for shown_name in shown],
+                            positions[name])
+        items = dropdown.listItems
+        # MORE_ITEM stays last
+        before = index if index < items.count else -1
+        items.add(name, False, self.icon, before)
+        shown.insert(index, name)
+        self.counters["added"] += 1
+
+    def _update_more(self, dropdown, names):
+        items = dropdown.listItems
+        has_more = items.count > len(self.shown[dropdown.id])
+        needs_more = len(self.shown[dropdown.id]) < len(names)
+        if needs_more and not has_more:
+            items.add(MORE_ITEM, False, self.icon)
+        elif has_more and not needs_more:
+            items.item(items.count - 1).deleteMe()
+
+    def sync(self, all_inputs, kind, new_names=()):
+        """
+        Applies the changes made to profile_data[kind] to its dropdowns.
+        :param new_names: Names to show even if they come after the pages
+            shown, e.g. a profile that was just created.
+        """
+        names = list(self.profile_data[kind])
+        positions = {name: i for i, name in enumerate(names)}
+        for dropdown_id in PROFILE_DROPDOWNS[kind]:
+            dropdown = all_inputs.itemById(dropdown_id)
+            if dropdown is None:
+                continue
+            shown = self._shown(dropdown)
+            items = dropdown.listItems
+            # From the end, so the indexes of the others don't change
+            for index in reversed(range(len(shown))):
+                if shown[index] not in positions:
+                    items.item(index).deleteMe()
+                    del shown[index]
+                    self.counters["deleted"] += 1
+            for name in new_names:
+                if name in positions and name not in shown:
+                    self._insert(dropdown, positions, name)
+            self._update_more(dropdown, names)
+
+    def next_page(self, dropdown):
+        """Adds the next page_size names that are not shown yet."""
+        names = list(self.profile_data[self.kind_of(dropdown.id)])
+        positions = {name: i for i, name in enumerate(names)}
+        shown = set(self._shown(dropdown))
+        page = [name for name in names if name not in shown][:self.page_size]
+        for name in page:
+            self._insert(dropdown, positions, name)
+        self._update_more(dropdown, names)
+        self.counters["pages"] += 1
+
+    def notify(self, args):
+        try:
+            if self.kind_of(args.input.id) is None:
+                return
+            dropdown = adsk.core.DropDownCommandInput.cast(args.input)
+            selected = dropdown.selectedItem
+            if selected is None or selected.name != MORE_ITEM:
+                return
+            selected.isSelected = False
+            self.next_page(dropdown)
+        except:
+            ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
+
+    def log_counters(self):
+        self.logger.debug(f"Profile list counters: {self.counters}")
+
+
 class ValueCommandSynchronizer(adsk.core.InputChangedEventHandler):
     """
     This class links two interface fields so that when a value is set/changed
@@ -63,11 +282,18 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
     interface, and performs the appropriate changes to the profile_data
     dictionary. No IO.
     """
-    def __init__(self, profile_data, resource_folder):
+    def __init__(self, profile_data, resource_folder, profile_lists=None):
+        """
+        :param profile_lists: ProfileLists of the command, which filled the
+            profile dropdowns.
+        """
         super().__init__()
         self.profile_data = profile_data
         self.logger = logging.getLogger(type(self).__name__)
         self.resource_folder = resource_folder
+        if profile_lists is None:
+            profile_lists = ProfileLists(profile_data, resource_folder)
+        self.profile_lists = profile_lists
 
     def notify(self, args):
         """
@@ -84,23 +310,11 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
             if input.id == "selected_origin":
                 pass
 
-            # A a profile was selected, change to that profile.
-            if input.id == "profile_list":
-                try:
-                    profile_id = input.selectedItem.name
-                    profile = self.profile_data["profiles"][profile_id]
-                except AttributeError:
-                    # This happens when selected item is None
-                    return
-                try:
-                    for key, value in profile.items():
-                        value_in_float = float(value)
-                        all_inputs.itemById(key).value = value_in_float
-                except AttributeError as e:
-                    self.logger.error(f"Error on key:{key}")
+            # Selecting a profile in "profile_list" is handled by
+            # ProfileSwitcher, which writes the values as one change.
 
             # If save_profile was clicked
-            elif input.id == "create_new_profile":
+            if input.id == "create_new_profile":
                 """The user writes the new profile name in a textbox.
                 If the name already exists, give an error message."""
                 new_name_field = all_inputs.itemById("new_profile_name")
@@ -126,7 +340,8 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
                             self.profile_data["profiles"][
                                 new_name] = new_profile
                             error.isVisible = False
-                            self.reload_profile_lists(all_inputs)
+                        self.profile_lists.sync(all_inputs, "profiles",
+                                                [new_name])
                     except AttributeError as e:
                         logger = logging.getLogger(str(type(self)))
                         logger.error(f"AttributeError on key {key}")
@@ -162,7 +377,6 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
             elif input.id == "delete_profile":
                 # Step 1: Remove it from profile_data
                 name = all_inputs.itemById("profiles2").selectedItem.name
-                all_inputs.itemById("profiles2").selectedItem.deleteMe()
                 # It cannot be the default profile, if so, create error message.
                 if self.profile_data["default_profile"] == name:
                     self.logger.info("Tried to delete default profile."
@@ -170,7 +384,7 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
                     return
                 del (self.profile_data["profiles"][name])
 
-                self.reload_profile_lists(all_inputs)
+                self.profile_lists.sync(all_inputs, "profiles")
 
             # If save new gap profile was clicked
             elif input.id == "create_new_gap_profile":
@@ -203,7 +417,8 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
                         new_name] = new_gap_profile
                     error.isVisible = False
                     new_name_field.value = ""
-                    self.reload_gap_profile_lists(all_inputs)
+                    self.profile_lists.sync(all_inputs, "gap_profiles",
+                                            [new_name])
 
             # If overwrite gap profile was clicked
             elif input.id == "overwrite_gap_profile":
@@ -232,12 +447,18 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
             # If delete gap profile was clicked
             elif input.id == "delete_gap_profile":
                 name = all_inputs.itemById("gap_profiles2").selectedItem.name
+                gap_profiles = self.profile_data["gap_profiles"]
+                # New gap profiles are made from the keys of an existing one
+                if len(gap_profiles) == 1:
+                    self.logger.info("Tried to delete the last gap profile."
+                                     " Not allowed.")
+                    return
 
+                del (gap_profiles[name])
                 if self.profile_data["default_gap_profile"] == name:
-                    self.profile_data["default_gap_profile"] = None
-
-                del (self.profile_data["gap_profiles"][name])
-                self.reload_gap_profile_lists(all_inputs)
+                    self.profile_data["default_gap_profile"] = \
+                        next(iter(gap_profiles))
+                self.profile_lists.sync(all_inputs, "gap_profiles")
 
             # TODO: Make profile and gap profile list empty when custom values
             #       are entered.
@@ -245,38 +466,6 @@ class ProfileModifier(adsk.core.InputChangedEventHandler):
             if ui:
                 ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
-    def reload_profile_lists(self, all_inputs):
-        # Clear lists and add the items again without making any of
-        # them selected!
-        profile_list1 = all_inputs.itemById("profile_list")
-        item_list1 = profile_list1.listItems
-        item_list1.clear()
-        profile_list2 = all_inputs.itemById("profiles2")
-        item_list2 = profile_list2.listItems
-        item_list2.clear()
-
-        profile_names = self.profile_data["profiles"]
-        blank_icon_path = self.resource_folder / "white"
-        for prof_name in profile_names.keys():
-            item_list1.add(prof_name, True, str(blank_icon_path))
-            item_list2.add(prof_name, True, str(blank_icon_path))
-
-    def reload_gap_profile_lists(self, all_inputs):
-        # Clear lists and add the items again without making any of
-        # them selected!
-        gap_profile_list1 = all_inputs.itemById("gap_profiles")
-        item_list1 = gap_profile_list1.listItems
-        item_list1.clear()
-        gap_profile_list2 = all_inputs.itemById("gap_profiles2")
-        item_list2 = gap_profile_list2.listItems
-        item_list2.clear()
-
-        gap_profile_names = self.profile_data["gap_profiles"]
-        blank_icon_path = self.resource_folder / "white"
-        for prof_name in gap_profile_names.keys():
-            item_list1.add(prof_name, True, str(blank_icon_path))
-            item_list2.add(prof_name, True, str(blank_icon_path))
-
 
 class ProfileSwitcher(adsk.core.InputChangedEventHandler):
     """
@@ -286,9 +475,16 @@ class ProfileSwitcher(adsk.core.InputChangedEventHandler):
     profile. Note that the user can't reselect the currently active profile,
     because that doesn't trigger an InputChangedEvent.
     """
-    def __init__(self, profile_data):
+    def __init__(self, profile_data, coalescer=None):
+        """
+        :param coalescer: PreviewCoalescer of the command. If given, the
+            values of a profile are written as one change.
+        """
         super().__init__()
         self.profile_data = profile_data
+        if coalescer is None:
+            coalescer = PreviewCoalescer()
+        self.coalescer = coalescer
 
     def notify(self, args):
         """
@@ -297,17 +493,20 @@ class ProfileSwitcher(adsk.core.InputChangedEventHandler):
         """
         try:
             input = args.input  # The input obj that created event
-            all_inputs = args.inputs.command.commandInputs
+            command = args.inputs.command
 
             # If a profile or gap profile was selected, fill the values from
             # that profile into the corresponding fields.
             if input.id == "profile_list":
                 try:
                     profile_id = input.selectedItem.name
+                    if profile_id not in self.profile_data["profiles"]:
+                        # MORE_ITEM, see ProfileLists
+                        return
                     profile = self.profile_data["profiles"][profile_id]
-                    for key, value in profile.items():
-                        value_in_float = float(value)
-                        all_inputs.itemById(key).value = value_in_float
+                    values = {key: float(value)
+                              for key, value in profile.items()}
+                    self.coalescer.write_values(command, values)
                 except AttributeError:
                     # This happens when selected item is None,
                     # so, then there is no values to change to.
@@ -316,13 +515,14 @@ class ProfileSwitcher(adsk.core.InputChangedEventHandler):
             elif input.id == "gap_profiles":
                 try:
                     profile_id = input.selectedItem.name
+                    if profile_id not in self.profile_data["gap_profiles"]:
+                        return
                     profile = self.profile_data["gap_profiles"][profile_id]
                 except AttributeError:
                     # Happens when the selected item is None
                     return
-                for key, value in profile.items():
-                    value_in_float = float(value)
-                    all_inputs.itemById(key).value = value_in_float
+                values = {key: float(value) for key, value in profile.items()}
+                self.coalescer.write_values(command, values)
 
         except:
             if ui:
@@ -340,6 +540,9 @@ class JsonUpdater(adsk.core.InputChangedEventHandler):
         self.profile_data = profile_data
         self.json_filepath = json_filepath
 
+    def save(self):
+        profile_store.mark_dirty(self.json_filepath, self.profile_data)
+
     def notify(self, args):
         save_triggers = ["create_new_profile", "overwrite_profile",
                          "make_profile_default", "delete_profile",
@@ -348,13 +551,27 @@ class JsonUpdater(adsk.core.InputChangedEventHandler):
         input = args.input
         try:
             if input.id in save_triggers:
-                with open(self.json_filepath, "w") as f:
-                    json.dump(self.profile_data, f, indent=2)
+                self.save()
         except:
             if ui:
                 ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
 
+class LibraryUpdater(JsonUpdater):
+    """
+    JsonUpdater for the profile library: the changed profiles are written to
+    the database right away.
+    """
+
+    def __init__(self, profile_data, library, snap_type):
+        super().__init__(profile_data, None)
+        self.library = library
+        self.snap_type = snap_type
+
+    def save(self):
+        self.library.save_profile_data(self.snap_type, self.profile_data)
+
+
 class ProfileSettings:
     """
     This class creates the interface elements for creating new
@@ -362,8 +579,12 @@ class ProfileSettings:
     ones. It includes an initially invisible error message text field that can
     be made visible as a way to display errors.
     """
-    def __init__(self, profile_data):
+    def __init__(self, profile_data, profile_lists=None):
         self.profile_data = profile_data
+        if profile_lists is None:
+            profile_lists = ProfileLists(profile_data,
+                                         COMMON_RESOURCES_FOLDER)
+        self.profile_lists = profile_lists
 
     def add_to_inputs(self, inputs: CommandInputs):
         """Adds a standard tab for doing profile-manipulation."""
@@ -389,14 +610,8 @@ class ProfileSettings:
         profile_list = group2.addDropDownCommandInput('profiles2',
                                                       "Select profile:",
                                                       list_style)
-        items = profile_list.listItems
-        default_profile_name = self.profile_data["default_profile"]
-        blank_icon_path = COMMON_RESOURCES_FOLDER / "white"
-        for key in self.profile_data['profiles']:
-            if key == default_profile_name:
-                items.add(key, True, str(blank_icon_path))
-            else:
-                items.add(key, False, str(blank_icon_path))
+        self.profile_lists.fill(profile_list,
+                                self.profile_data["default_profile"])
 
         group2.addBoolValueInput("overwrite_profile", "Overwrite", False)
         group2.addBoolValueInput("make_profile_default", "Make default", False)
@@ -410,8 +625,12 @@ class GapProfileSettings:
     ones. It includes an initially invisible error message text field that can
     be made visible as a way to display errors.
     """
-    def __init__(self, profile_data):
+    def __init__(self, profile_data, profile_lists=None):
         self.profile_data = profile_data
+        if profile_lists is None:
+            profile_lists = ProfileLists(profile_data,
+                                         COMMON_RESOURCES_FOLDER)
+        self.profile_lists = profile_lists
 
     def add_to_inputs(self, inputs: CommandInputs):
         """Adds a standard tab for doing gap-profile-manipulation."""
@@ -435,14 +654,8 @@ class GapProfileSettings:
                                                           "Select gap profile:",
                                                           list_style)
         gap_profile_list.maxVisibleItems = 8
-        items = gap_profile_list.listItems
-        default_gap_profile_name = self.profile_data["default_gap_profile"]
-        blank_icon_path = COMMON_RESOURCES_FOLDER / "white"
-        for key in self.profile_data['gap_profiles']:
-            if key == default_gap_profile_name:
-                items.add(key, True, str(blank_icon_path))
-            else:
-                items.add(key, False, str(blank_icon_path))
+        self.profile_lists.fill(gap_profile_list,
+                                default_gap_profile(self.profile_data))
 
         group2.addBoolValueInput("overwrite_gap_profile", "Overwrite", False)
         group2.addBoolValueInput("make_gap_profile_default", "Make default",
@@ -458,6 +671,17 @@ class ProfileException(Exception):
     pass
 
 
+def default_gap_profile(profile_data):
+    """
+    The name of the default gap profile. Older versions set the default to
+    None when it was deleted, the first gap profile is used then.
+    """
+    name = profile_data["default_gap_profile"]
+    if name is None:
+        return next(iter(profile_data["gap_profiles"]))
+    return name
+
+
 def value_input(value):
     """
     Converts values into the format that Fusion expects for displaying values in
@@ -474,75 +698,77 @@ def value_input(value):
     return value_obj
 
 
+def selected_entities(selection_input):
+    """All entities selected in a SelectionCommandInput, in order."""
+    return [selection_input.selection(i).entity
+            for i in range(selection_input.selectionCount)]
+
+
+def pair_selections(entities, count, name):
+    """
+    Gives each snap of a batch its target body. A single selected body is
+    used for every snap, otherwise there must be one body per snap, paired
+    in the order they were selected.
+    :param entities: The selected bodies.
+    :param count: The number of snaps, one per selected joint origin.
+    :param name: Name of the selection input, for the error message.
+    :return: List of length count, with None where nothing was selected.
+    """
+    if not entities:
+        return [None] * count
+    if len(entities) == 1:
+        return list(entities) * count
+    if len(entities) == count:
+        return list(entities)
+    raise ValueError(f"Select one body in '{name}' for all joint origins, or "
+                     f"one per joint origin. Got {len(entities)} bodies for "
+                     f"{count} joint origins.")
+
+
+def pair_cut_selections(entities, count, name):
+    """
+    Gives each snap of a batch the bodies it cuts. A single snap cuts all the
+    selected bodies, a batch pairs them like pair_selections, so that no snap
+    cuts the bodies selected for another joint origin.
+    :param entities: The selected bodies.
+    :param count: The number of snaps, one per selected joint origin.
+    :param name: Name of the selection input, for the error message.
+    :return: List of length count, with a tuple of bodies for each snap.
+    """
+    if count == 1:
+        return [tuple(entities)]
+    return [(body,) if body else tuple()
+            for body in pair_selections(entities, count, name)]
+
+
 def validate_json(profile_data: dict, geometry_parameters: list,
                   gap_parameters: list):
     """
     Looks for errors in imported json data and raises a ProfileException
-    if something is wrong, and tries to provide some helpful feedback to
-    pinpoint what where in the json file the error lies.
+    listing all of them, each with its JSON path. Commands validate with
+    their compiled PROFILE_SCHEMA instead.
     :param gap_parameters:
     :param profile_data:
     :return:
     """
-    top_keys = list(profile_data.keys())
-    geometry_ids = [parameter["id"] for parameter in geometry_parameters]
-    gap_ids = [parameter["id"] for parameter in gap_parameters]
-
-    correct_keys = ["default_profile", "default_gap_profile",
-                    "profiles", "gap_profiles"]
-
-    if top_keys != correct_keys:
-        raise ProfileException(f"Error in top level JSON hierarchy of profile"
-                               f" data.{top_keys} not equal to {correct_keys}")
-
-    def_prof_name = profile_data.get("default_profile")
-    if def_prof_name is None:
-        raise ProfileException("No 'default_profile' key defined in profile data.")
-
-    profiles = profile_data.get("profiles")
-    if profiles is None:
-        raise ProfileException("No 'profiles' key defined in profile data.")
-
-    default_profile = profiles.get(def_prof_name)
-    if default_profile is None:
-        raise ProfileException(
-            f"Default profile '{def_prof_name}' not found in profiles."
-        )
-
-    def_gap_prof_name = profile_data.get("default_gap_profile")
-    if def_gap_prof_name is None:
-        raise ProfileException("No 'default_gap_profile' key defined in profile data.")
-
-    gap_profiles = profile_data.get("gap_profiles")
-    if gap_profiles is None:
-        raise ProfileException("No 'gap_profiles' key defined in profile data.")
-
-    default_profile = gap_profiles.get(def_gap_prof_name)
-    if default_profile is None:
-        raise ProfileException(
-            f"Default gap profile '{def_gap_prof_name}' not found in 'gap_profiles'."
-        )
-
-    allowed_types = (int, float)
-    for prof_name, profile in profile_data["profiles"].items():
-        if len(profile) != len(geometry_ids):
-            raise ProfileException(f"Profile '{prof_name}'."
-                                   f" has a wrong number of parameters.")
-        for key, value in profile.items():
-            if type(value) not in allowed_types:
-                raise ProfileException(f"In profile '{prof_name}'."
-                                       f" The parameter '{key}' has a wrong"
-                                       f" type. It should be among '{allowed_types}'"
-                                       f" but is instead of type '{type(value)}'")
-
-    for gap_prof_name, gap_profile in profile_data["gap_profiles"].items():
-        if len(gap_profile) != len(gap_ids):
-            raise ProfileException(f"Error in gap profile {gap_prof_name}."
-                                   f" wrong number of parameters.")
-        for key, value in gap_profile.items():
-            if type(value) not in allowed_types:
-                raise ProfileException(f"In profile '{gap_prof_name}'."
-                                       f" The parameter '{key}' has a wrong"
-                                       f" type. It should be among '{allowed_types}'"
-                                       f" but is instead of type '{type(value)}'")
+    errors = ProfileSchema(geometry_parameters,
+                           gap_parameters).validate(profile_data)
+    if errors:
+        raise ProfileException("\n".join(str(error) for error in errors))
     return True
+
+
+def report_profile_errors(errors, source, shown=20):
+    """
+    Shows the errors from ProfileSchema.validate() in a message box.
+    :param source: Name of the file the profiles were loaded from.
+    """
+    lines = [str(error) for error in errors[:shown]]
+    if len(errors) > shown:
+        lines.append(f"... and {len(errors) - shown} more.")
+    logging.getLogger("ProfileSchema").warning(
+        f"{len(errors)} errors in {source}.")
+    ui.messageBox(f"Errors in the profiles of {source}:\n"
+                  + "\n".join(lines)
+                  + "\n\nFix the file, or reset the profile data in "
+                    "Settings.")
@@ -0,0 +1,259 @@
+"""
+Changing an existing snap in place.
+
+The geometry classes store the parameters on the snap component and tag
+each sketch with its stage (see registry.py). edit_snap() works out which
+stages the new parameters change (kernel.dirty_stages), moves the points of
+those sketches, and sets the distances of their extrudes and the offsets of
+the joint origin. The joints and the combine features that use the bodies
+are left as they are, and Fusion recomputes them.
+
+Points are moved when the new profile has the same lines and arcs as the
+old one. Fusion can't change the sweep of a sketch arc, so the arcs are
+drawn again, and when the lines differ too, the whole sketch is. The
+extrude then gets the new profile of the sketch.
+"""
+
+import logging
+
+import adsk.core
+import adsk.fusion
+
+from . import kernel
+from . import registry
+from .cache import profile_cache
+from .geometry import Cantilever, Pin
+from .normalize import normalize_profile
+from .timing import span
+
+# The geometry classes by component_name.
+SNAP_CLASSES = {snap_class.component_name: snap_class
+                for snap_class in (Cantilever, Pin)}
+
+# Stage to profile function, for each snap type.
+PROFILES = {
+    Cantilever.component_name: {"join": kernel.cantilever_join_profile,
+                                "cut": kernel.cantilever_cut_profile},
+    Pin.component_name: {"join": kernel.pin_join_profile,
+                         "cut": kernel.pin_cut_profile,
+                         "addition": kernel.pin_addition_profile},
+}
+OFFSETS = {Cantilever.component_name: kernel.cantilever_offsets,
+           Pin.component_name: kernel.pin_offsets}
+STAGES = {Cantilever.component_name: kernel.CANTILEVER_STAGES,
+          Pin.component_name: kernel.PIN_STAGES}
+STAGE_PARAMETERS = {
+    Cantilever.component_name: kernel.CANTILEVER_STAGE_PARAMETERS,
+    Pin.component_name: kernel.PIN_STAGE_PARAMETERS}
+
+
+class EditException(Exception):
+    pass
+
+
+def snap_component(entity):
+    """
+    :param entity: An occurrence or component selected by the user.
+    :return: The snap component, or None if entity is not an editable snap.
+    """
+    occurrence = adsk.fusion.Occurrence.cast(entity)
+    component = occurrence.component if occurrence else \
+        adsk.fusion.Component.cast(entity)
+    if component and registry.stored_parameters(component):
+        return component
+    return None
+
+
+def _profile(snap_type, stage, parameters):
+    # Same cache keys as the geometry classes
+    return profile_cache.get((snap_type, stage), parameters,
+                             PROFILES[snap_type][stage],
+                             STAGE_PARAMETERS[snap_type][f"{stage}_profile"])
+
+
+def _extent(snap_class, stage, parameters):
+    if stage == "join":
+        return kernel.join_extent(parameters, snap_class.gap_in_cut_body)
+    if stage == "cut":
+        return kernel.cut_extent(parameters, snap_class.gap_in_cut_body)
+    return kernel.addition_extent(parameters)
+
+
+def _same_lines(old, new):
+    return old.point_count == new.point_count \
+           and old.segments == new.segments \
+           and old.arc_indexes == new.arc_indexes
+
+
+def _drawn_points(sketch, count):
+    """The sketch points drawn by _draw_sketch(), in drawing order."""
+    points = []
+    for point in sketch.sketchPoints:
+        if point == sketch.originPoint:
+            continue
+        points.append(point)
+        if len(points) == count:
+            break
+    return points
+
+
+def _draw(sketch, profile, points=None):
+    """
+    Draws the lines and arcs of profile, like BaseSnap._draw_sketch().
+    :param points: The sketch points to use, or None to add new ones.
+    """
+    if points is None:
+        points = [sketch.sketchPoints.add(adsk.core.Point3D.create(x, y, 0))
+                  for x, y in profile.points()]
+        for p0, p1 in profile.point_pairs():
+            sketch.sketchCurves.sketchLines.addByTwoPoints(points[p0],
+                                                           points[p1])
+    for center, start, sweep_angle in profile.arcs():
+        sketch.sketchCurves.sketchArcs.addByCenterStartSweep(
+            points[center], points[start], sweep_angle)
+
+
+def _update_sketch(sketch, old, new):
+    """
+    :param old: Normalized profile the sketch was drawn from.
+    :param new: Normalized profile to change it to.
+    :return: True if the sketch was drawn again, and so has a new profile.
+    """
+    if _same_lines(old, new):
+        points = _drawn_points(sketch, old.point_count)
+        moved = set()
+        for i, (point, (x0, y0), (x1, y1)) in enumerate(
+                zip(points, old.points(), new.points())):
+            if (x0, y0) != (x1, y1):
+                point.move(adsk.core.Vector3D.create(x1 - x0, y1 - y0, 0))
+                moved.add(i)
+        if old.arc_sweeps == new.arc_sweeps \
+                and not moved.intersection(new.arc_indexes):
+            return False
+        # Every arc is drawn again, so that they stay in drawing order
+        for arc in list(sketch.sketchCurves.sketchArcs):
+            arc.deleteMe()
+        _draw(sketch, new, points)
+        return True
+
+    for curve in list(sketch.sketchCurves):
+        curve.deleteMe()
+    for point in list(sketch.sketchPoints):
+        if not point == sketch.originPoint:
+            point.deleteMe()
+    _draw(sketch, new)
+    return True
+
+
+def _extrudes_by_sketch(component):
+    extrudes = {}
+    for extrude in component.features.extrudeFeatures:
+        profile = adsk.fusion.Profile.cast(extrude.profile)
+        if profile:
+            extrudes.setdefault(profile.parentSketch.name, []).append(extrude)
+    return extrudes
+
+
+def stage_extrudes(component):
+    """
+    :return: Dict from stage to the extrude features of the stage's sketch.
+    """
+    extrudes = _extrudes_by_sketch(component)
+    stages = {}
+    for sketch in component.sketches:
+        stage = registry.stage_of(sketch)
+        if stage:
+            stages.setdefault(stage, []).extend(
+                extrudes.get(sketch.name, []))
+    return stages
+
+
+def _set_profile(extrude, sketch):
+    """The extrude has to be rolled back to before it to change its
+    profile."""
+    timeline = extrude.parentComponent.parentDesign.timeline
+    marker = timeline.markerPosition
+    extrude.timelineObject.rollTo(True)
+    extrude.profile = sketch.profiles.item(0)
+    timeline.markerPosition = marker
+
+
+def _set_extent(extrude, extent):
+    start, end = extent
+    distance = adsk.fusion.DistanceExtentDefinition.cast(extrude.extentOne)
+    distance.distance.value = end - start
+    offset = adsk.fusion.OffsetStartDefinition.cast(extrude.startExtent)
+    if offset:
+        offset.offset.value = start
+
+
+def edit_snap(component, parameters, set_extents=True):
+    """
+    Changes a snap to new parameters.
+    :param component: Component from snap_component(). Every occurrence of
+        it changes.
+    :param parameters: The new parameters, with the same keys as the ones
+        the snap was built with.
+    :param set_extents: False for snaps whose extrudes are driven by user
+        parameters, see parametric.py.
+    :return: The set of stages that changed.
+    """
+    snap_type, old_parameters = registry.stored_parameters(component)
+    snap_class = SNAP_CLASSES[snap_type]
+    if component.parentDesign.designType \
+            == adsk.fusion.DesignTypes.DirectDesignType:
+        raise EditException("Snaps in direct modeling designs can't be "
+                            "edited.")
+    stages = kernel.dirty_stages(STAGES[snap_type], old_parameters,
+                                 parameters)
+    logging.debug(f"Editing {snap_type}, stages {sorted(stages)}.")
+
+    sketches = [sketch for sketch in component.sketches
+                if registry.stage_of(sketch)]
+    if not sketches:
+        raise EditException(f"This {snap_type.lower()} was not built with "
+                            f"sketches and features, so it can't be edited.")
+    extrudes = _extrudes_by_sketch(component)
+    # Everything that can fail is worked out before the component is
+    # changed, so that a failed edit leaves it as it was
+    offsets = None
+    if "offsets" in stages:
+        offsets = OFFSETS[snap_type](parameters)
+        joint_origin = component.jointOrigins.item(0)
+    changes = []
+    for sketch in sketches:
+        stage = registry.stage_of(sketch)
+        sketch_changed = f"{stage}_profile" in stages
+        extrude_changed = f"{stage}_extrude" in stages
+        if not sketch_changed and not extrude_changed:
+            continue
+        profiles = None
+        if sketch_changed:
+            old, _ = normalize_profile(
+                _profile(snap_type, stage, old_parameters))
+            new, _ = normalize_profile(
+                _profile(snap_type, stage, parameters))
+            profiles = old, new
+        extent = _extent(snap_class, stage, parameters) if set_extents \
+            else None
+        changes.append((sketch, stage, profiles, extent))
+
+    if offsets is not None:
+        x, y, z = offsets
+        joint_origin.offsetX.value = x
+        joint_origin.offsetY.value = y
+        joint_origin.offsetZ.value = z
+    for sketch, stage, profiles, extent in changes:
+        with span("edit", stage):
+            redrawn = profiles is not None \
+                and _update_sketch(sketch, *profiles)
+            for extrude in extrudes.get(sketch.name, []):
+                if redrawn:
+                    _set_profile(extrude, sketch)
+                if extent is not None:
+                    _set_extent(extrude, extent)
+
+    registry.store_parameters(component, snap_type, parameters)
+    registry.update_key(component,
+                        registry.snap_key(snap_type, parameters))
+    return stages
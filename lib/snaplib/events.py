@@ -0,0 +1,52 @@
+"""
+Application events the add-in listens to from the start.
+
+The handlers are connected when the add-in starts, and import the modules
+that do the work when the event first happens, so that starting Fusion does
+not import geometry.py and the rest (see commands/LazyCommand.py).
+"""
+
+import importlib
+import traceback
+
+import adsk.core
+import adsk.fusion
+
+# Fusion commands after which the snaps driven by user parameters are
+# updated.
+PARAMETER_COMMANDS = {"ChangeParameterCommand"}
+
+app = adsk.core.Application.get()
+ui = app.userInterface
+handlers = []
+
+
+class ParameterChangeHandler(adsk.core.ApplicationCommandEventHandler):
+    """Updates the driven snaps when the user parameters are changed."""
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            if args.commandId not in PARAMETER_COMMANDS:
+                return
+            design = adsk.fusion.Design.cast(app.activeProduct)
+            if design:
+                parametric = importlib.import_module(".parametric",
+                                                     __package__)
+                parametric.refresh(design)
+        except:
+            ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
+
+
+def start():
+    """Connects the handlers. Called when the add-in starts."""
+    handler = ParameterChangeHandler()
+    ui.commandTerminated.add(handler)
+    handlers.append(handler)
+
+
+def stop():
+    for handler in handlers:
+        ui.commandTerminated.remove(handler)
+    handlers.clear()
@@ -2,14 +2,43 @@
 
 import adsk.core
 import adsk.fusion
-import math
 import logging
 from adsk.core import ValueInput as valueInput
 from adsk.fusion import Component
 
+from . import kernel
+from . import mesh
+from . import registry
+from .normalize import normalize_profile
+from .cache import profile_cache
+from .timing import set_parameters, span, timed
+
 app = adsk.core.Application.get()
 ui = app.userInterface
 
+
+def placement_matrix(offsets, target_joint_origin):
+    """
+    Where the joint to target_joint_origin puts a snap component.
+    :param offsets: The offsets of the snap's own joint origin.
+    :param target_joint_origin: The selected joint origin, or None.
+    :return: Matrix3D from component coordinates to the design.
+    """
+    transform = adsk.core.Matrix3D.create()
+    if target_joint_origin is None:
+        # Without a joint, the component stays at the origin.
+        return transform
+    transform.setWithArray(mesh.joint_frame(offsets))
+    geometry = target_joint_origin.geometry
+    target = adsk.core.Matrix3D.create()
+    target.setWithCoordinateSystem(geometry.origin,
+                                   geometry.primaryAxisVector,
+                                   geometry.secondaryAxisVector,
+                                   geometry.thirdAxisVector)
+    transform.transformBy(target)
+    return transform
+
+
 class BaseSnap:
     component_name = "snap_mechanism"
     gap_in_cut_body = True
@@ -30,18 +59,11 @@ class BaseSnap:
         :param axis: "x" or "y"
         :return:
         """
-        newlist = []
-        for pair in pointlist:
-            (x, y) = pair
-            if axis == "x":
-                x *= -1
-            elif axis == "y":
-                y *= -1
-            newlist.append((x, y))
-        return newlist
+        return kernel.mirror_points(pointlist, axis)
 
     def __init__(self, parent_comp: Component, parameters: dict,
-                 target_joint_org=None, join_body=None, cut_bodies=tuple()):
+                 target_joint_org=None, join_body=None, cut_bodies=tuple(),
+                 reuse_component=False, booleans=None):
         """
         A new component is created which contains a body with a bendable shape.
         Additional operations are done depending on arguments.
@@ -52,6 +74,12 @@ class BaseSnap:
             to be combined with.
         :param cut_bodies: A list of bodies on which a cut operation will be
             performed to create a opening for the bendable shape.
+        :param reuse_component: If True, and there is neither a join_body nor
+            cut_bodies, an identical snap component already in the design is
+            reused instead of building a new one. See registry.py.
+        :param booleans: A booleans.BooleanScheduler. If given, the join, cut
+            and removal of the subtraction body are queued in it instead of
+            being performed.
         """
 
         """
@@ -63,12 +91,25 @@ class BaseSnap:
             self.test_parameters(parameters)
         except ParameterException as e:
             logging.getLogger(str(type(self)) + str(e))
-        # Create a new occurrence and reference its component
-        matrix = adsk.core.Matrix3D.create()
-        self.occurrence = parent_comp.occurrences.addNewComponent(matrix)
-        self.comp = self.occurrence.component
-        self.comp.name = self.component_name
+        set_parameters(parameters)
+        self.saved_api_calls = 0
         self.cut_bodies = cut_bodies
+        self.booleans = booleans
+
+        # Snaps that don't change other bodies can share their component
+        self.key = registry.snap_key(self.component_name, parameters)
+        reusable = reuse_component and not join_body and not cut_bodies
+        self.reused = reusable and self._add_existing_occurrence(
+            parent_comp, target_joint_org)
+        if self.reused:
+            return
+
+        # Create a new occurrence and reference its component
+        with span("component"):
+            matrix = adsk.core.Matrix3D.create()
+            self.occurrence = parent_comp.occurrences.addNewComponent(matrix)
+            self.comp = self.occurrence.component
+            self.comp.name = self.component_name
 
         """
         Step 2: Create joint between selected joint origin and component. 
@@ -86,21 +127,42 @@ class BaseSnap:
         """
         sketch_plane = self.comp.xZConstructionPlane
         cant_sketch = self.comp.sketches.add(sketch_plane)
+        registry.tag_stage(cant_sketch, "join")
         cant_sketch_data = self._sketch_join_properties(parameters)
         self._draw_sketch(cant_sketch, cant_sketch_data)
         cant_body = self._create_join_body(parameters, cant_sketch)
 
-        if join_body:
+        if join_body and booleans is not None:
+            booleans.join(join_body, self._in_parent(cant_body))
+        elif join_body:
             self._perform_join(join_body, cant_body)
 
         if cut_bodies:
             sub_sketch_data = self._sketch_cut_properties(parameters)
             sub_sketch = self.comp.sketches.add(sketch_plane)
+            registry.tag_stage(sub_sketch, "cut")
             self._draw_sketch(sub_sketch, sub_sketch_data)
             subtraction_body = self._create_cut_body(parameters, sub_sketch)
-            self._perform_cut(cut_bodies, subtraction_body)
-            # Remove the subtraction body
-            self.comp.features.removeFeatures.add(subtraction_body)
+            if booleans is not None:
+                for body_to_cut in cut_bodies:
+                    booleans.cut(body_to_cut,
+                                 self._in_parent(subtraction_body))
+                booleans.remove(self.comp.features, subtraction_body)
+            else:
+                self._perform_cut(cut_bodies, subtraction_body)
+                # Remove the subtraction body
+                with span("remove"):
+                    self.comp.features.removeFeatures.add(subtraction_body)
+
+        # Kept for editing the snap later, see edit.py
+        registry.store_parameters(self.comp, self.component_name,
+                                  parameters)
+
+        if reusable:
+            registry.register(self.comp, self.key)
+
+        logging.debug(f"{self.component_name}: sketch normalization saved "
+                      f"{self.saved_api_calls} API calls.")
 
     def test_parameters(self, parameters):
         """
@@ -129,33 +191,39 @@ class BaseSnap:
                     f"The type of {key} is not in the list of"
                     f"allowed types. type={type(value)}.")
 
+    @timed("sketch")
     def _draw_sketch(self, sketch, sketch_data):
-        points_coordinates = sketch_data['points_coordinates']
-        point_pair_indexes = sketch_data['point_pair_indexes']
-        arc_lines = sketch_data['arc_lines']
+        """
+        :param sketch: The sketch to draw in.
+        :param sketch_data: kernel.SketchProfile
+        """
+        # Coincident points and degenerate lines are removed first, since
+        # every entity is a separate call into Fusion.
+        sketch_data, report = normalize_profile(sketch_data)
+        self.saved_api_calls += report.saved_calls
 
         sketch_points = []
         # Create sketch points
-        for x, y in points_coordinates:
+        for x, y in sketch_data.points():
             sketch_points.append(
                 sketch.sketchPoints.add(adsk.core.Point3D.create(x, y, 0)))
 
         # Draw straight lines
-        for p0, p1 in point_pair_indexes:
+        for p0, p1 in sketch_data.point_pairs():
             start_point = sketch_points[p0]
             end_point = sketch_points[p1]
             sketch.sketchCurves.sketchLines.addByTwoPoints(start_point,
                                                            end_point)
 
         # Draw arcs if any. This somehow doesn't need an "if sweep_angle > 0"
-        for arc_data in arc_lines:
-            origin_point = sketch_points[arc_data[0]]
-            start_point = sketch_points[arc_data[1]]
-            sweep_angle = arc_data[2]
+        for center, start, sweep_angle in sketch_data.arcs():
+            origin_point = sketch_points[center]
+            start_point = sketch_points[start]
             sketch.sketchCurves.sketchArcs.addByCenterStartSweep(origin_point,
                                                                  start_point,
                                                                  sweep_angle)
 
+    @timed("extrude", "cut")
     def _create_cut_body(self, parameters, sketch):
         gap = parameters['extrusion_gap']
         if self.gap_in_cut_body:
@@ -183,6 +251,7 @@ class BaseSnap:
         body = extrusion.bodies.item(0)
         return body
 
+    @timed("extrude", "join")
     def _create_join_body(self, parameters, sketch):
         extrusion_distance = parameters['extrusion_distance']
         gap = parameters['extrusion_gap']
@@ -209,6 +278,7 @@ class BaseSnap:
 
         return body
 
+    @timed("joint_origin")
     def _create_joint_origin(self, x_offset=0, y_offset=0, z_offset=0):
         jointGeometry = adsk.fusion.JointGeometry
         jointOrigins = self.comp.jointOrigins
@@ -231,30 +301,49 @@ class BaseSnap:
         """
         Replace in subclass.
         :param geometry:
-        :return:
+        :return: kernel.SketchProfile
         """
-        points_coordinates = []
-        point_pair_indexes = []
-        arc_lines = []
-        data = {"points_coordinates": points_coordinates,
-                "point_pair_indexes": point_pair_indexes,
-                "arc_lines": arc_lines}
-        return data
+        return kernel.SketchProfile.from_lists([], [])
 
     def _sketch_cut_properties(self, geometry):
         """
         Replace in subclass.
         :param geometry:
-        :return:
+        :return: kernel.SketchProfile
+        """
+        return kernel.SketchProfile.from_lists([], [])
+
+    def _add_existing_occurrence(self, parent_comp, target_joint_org):
         """
-        points_coordinates = []
-        point_pair_indexes = []
-        data = {"points_coordinates": points_coordinates,
-                "point_pair_indexes": point_pair_indexes
-                }
-        return data
+        Adds a new occurrence of the registered component with the same key
+        as this snap, and places it at target_joint_org.
+        :return: False if there is no such component.
+        """
+        component = registry.find_component(parent_comp.parentDesign,
+                                            self.key)
+        if component is None:
+            return False
+        with span("component", "instance"):
+            matrix = adsk.core.Matrix3D.create()
+            self.occurrence = parent_comp.occurrences.addExistingComponent(
+                component, matrix)
+            self.comp = component
+        # Hotfix for releasing it from parent so that joint will work
+        self.occurrence.isGroundToParent = False
+        if target_joint_org:
+            # The component has several occurrences, so the joint needs the
+            # joint origin in the context of this one.
+            joint_origin = component.jointOrigins.item(0)
+            self.place(joint_origin.createForAssemblyContext(self.occurrence),
+                       target_joint_org)
+        return True
+
+    def _in_parent(self, body):
+        """The body of this snap in the context of the parent component."""
+        return body.createForAssemblyContext(self.occurrence)
 
     # Creates a joint to given joint origin
+    @timed("joint_origin", "place")
     def place(self, joint_origin, target_joint_origin):
         parent_comp = self.occurrence.sourceComponent
         joints = parent_comp.joints
@@ -263,6 +352,7 @@ class BaseSnap:
         joint = joints.add(joint_input)
         joint.isLightBulbOn = False
 
+    @timed("join")
     def _perform_join(self, body_to_join, addition_body):
         combineFeatures = self.comp.features.combineFeatures
         tool_bodies = adsk.core.ObjectCollection.create()
@@ -271,6 +361,7 @@ class BaseSnap:
         result = combineFeatures.add(combine_input)
         return result
 
+    @timed("cut")
     def _perform_cut(self, bodies_to_cut, subtraction_body):
         combineFeatures = self.comp.features.combineFeatures
         CutFeatureOperation = adsk.fusion.FeatureOperations.CutFeatureOperation
@@ -312,15 +403,7 @@ class ExperimentalBaseSnap:
         :param axis: "x" or "y"
         :return:
         """
-        newlist = []
-        for pair in pointlist:
-            (x, y) = pair
-            if axis == "x":
-                x *= -1
-            elif axis == "y":
-                y *= -1
-            newlist.append((x, y))
-        return newlist
+        return kernel.mirror_points(pointlist, axis)
 
     def __init__(self, parent_comp: Component, parameters: dict,
                  target_joint_org=None, join_body=None, cut_bodies=tuple()):
@@ -344,11 +427,14 @@ class ExperimentalBaseSnap:
             self.test_parameters(parameters)
         except ParameterException as e:
             logging.getLogger(str(type(self)) + str(e))
+        set_parameters(parameters)
         # Create a new occurrence and reference its component
-        matrix = adsk.core.Matrix3D.create()
-        self.occurrence = parent_comp.occurrences.addNewComponent(matrix)
-        self.comp = self.occurrence.component
-        self.comp.name = self.component_name
+        with span("component"):
+            matrix = adsk.core.Matrix3D.create()
+            self.occurrence = parent_comp.occurrences.addNewComponent(matrix)
+            self.comp = self.occurrence.component
+            self.comp.name = self.component_name
+        self.saved_api_calls = 0
         self.cut_bodies = cut_bodies
         self.subtraction_body = None
         self.addition_body = None
@@ -385,11 +471,15 @@ class ExperimentalBaseSnap:
         if cut_bodies:
             self._perform_cut(cut_bodies, subtraction_body)
             # Remove the subtraction body
-            self.comp.features.removeFeatures.add(subtraction_body)
+            with span("remove"):
+                self.comp.features.removeFeatures.add(subtraction_body)
         else:
             # If no cutting, keep subtraction body
             self.subtraction_body = subtraction_body
 
+        logging.debug(f"{self.component_name}: sketch normalization saved "
+                      f"{self.saved_api_calls} API calls.")
+
     def test_parameters(self, parameters):
         """
         This function is intended to catch errors in parameters early.
@@ -417,33 +507,39 @@ class ExperimentalBaseSnap:
                     f"The type of {key} is not in the list of"
                     f"allowed types. type={type(value)}.")
 
+    @timed("sketch")
     def _draw_sketch(self, sketch, sketch_data):
-        points_coordinates = sketch_data['points_coordinates']
-        point_pair_indexes = sketch_data['point_pair_indexes']
-        arc_lines = sketch_data['arc_lines']
+        """
+        :param sketch: The sketch to draw in.
+        :param sketch_data: kernel.SketchProfile
+        """
+        # Coincident points and degenerate lines are removed first, since
+        # every entity is a separate call into Fusion.
+        sketch_data, report = normalize_profile(sketch_data)
+        self.saved_api_calls += report.saved_calls
 
         sketch_points = []
         # Create sketch points
-        for x, y in points_coordinates:
+        for x, y in sketch_data.points():
             sketch_points.append(
                 sketch.sketchPoints.add(adsk.core.Point3D.create(x, y, 0)))
 
         # Draw straight lines
-        for p0, p1 in point_pair_indexes:
+        for p0, p1 in sketch_data.point_pairs():
             start_point = sketch_points[p0]
             end_point = sketch_points[p1]
             sketch.sketchCurves.sketchLines.addByTwoPoints(start_point,
                                                            end_point)
 
         # Draw arcs if any. This somehow doesn't need an "if sweep_angle > 0"
-        for arc_data in arc_lines:
-            origin_point = sketch_points[arc_data[0]]
-            start_point = sketch_points[arc_data[1]]
-            sweep_angle = arc_data[2]
+        for center, start, sweep_angle in sketch_data.arcs():
+            origin_point = sketch_points[center]
+            start_point = sketch_points[start]
             sketch.sketchCurves.sketchArcs.addByCenterStartSweep(origin_point,
                                                                  start_point,
                                                                  sweep_angle)
 
+    @timed("extrude", "cut")
     def _create_cut_body(self, parameters, sketch):
         gap = parameters['extrusion_gap']
         if self.gap_in_cut_body:
@@ -472,6 +568,7 @@ class ExperimentalBaseSnap:
 
         return body
 
+    @timed("extrude", "join")
     def _create_join_body(self, parameters, sketch):
         extrusion_distance = parameters['extrusion_distance']
         gap = parameters['extrusion_gap']
@@ -498,6 +595,7 @@ class ExperimentalBaseSnap:
 
         return body
 
+    @timed("joint_origin")
     def _create_joint_origin(self, x_offset=0, y_offset=0, z_offset=0):
         jointGeometry = adsk.fusion.JointGeometry
         jointOrigins = self.comp.jointOrigins
@@ -520,30 +618,49 @@ class ExperimentalBaseSnap:
         """
         Replace in subclass.
         :param geometry:
-        :return:
+        :return: kernel.SketchProfile
         """
-        points_coordinates = []
-        point_pair_indexes = []
-        arc_lines = []
-        data = {"points_coordinates": points_coordinates,
-                "point_pair_indexes": point_pair_indexes,
-                "arc_lines": arc_lines}
-        return data
+        return kernel.SketchProfile.from_lists([], [])
 
     def _sketch_cut_properties(self, geometry):
         """
         Replace in subclass.
         :param geometry:
-        :return:
+        :return: kernel.SketchProfile
         """
-        points_coordinates = []
-        point_pair_indexes = []
-        data = {"points_coordinates": points_coordinates,
-                "point_pair_indexes": point_pair_indexes
-                }
-        return data
+        return kernel.SketchProfile.from_lists([], [])
+
+    def _add_existing_occurrence(self, parent_comp, target_joint_org):
+        """
+        Adds a new occurrence of the registered component with the same key
+        as this snap, and places it at target_joint_org.
+        :return: False if there is no such component.
+        """
+        component = registry.find_component(parent_comp.parentDesign,
+                                            self.key)
+        if component is None:
+            return False
+        with span("component", "instance"):
+            matrix = adsk.core.Matrix3D.create()
+            self.occurrence = parent_comp.occurrences.addExistingComponent(
+                component, matrix)
+            self.comp = component
+        # Hotfix for releasing it from parent so that joint will work
+        self.occurrence.isGroundToParent = False
+        if target_joint_org:
+            # The component has several occurrences, so the joint needs the
+            # joint origin in the context of this one.
+            joint_origin = component.jointOrigins.item(0)
+            self.place(joint_origin.createForAssemblyContext(self.occurrence),
+                       target_joint_org)
+        return True
+
+    def _in_parent(self, body):
+        """The body of this snap in the context of the parent component."""
+        return body.createForAssemblyContext(self.occurrence)
 
     # Creates a joint to given joint origin
+    @timed("joint_origin", "place")
     def place(self, joint_origin, target_joint_origin):
         parent_comp = self.occurrence.sourceComponent
         joints = parent_comp.joints
@@ -552,6 +669,7 @@ class ExperimentalBaseSnap:
         joint = joints.add(joint_input)
         joint.isLightBulbOn = False
 
+    @timed("join")
     def _perform_join(self, body_to_join, addition_body):
         combineFeatures = self.comp.features.combineFeatures
         tool_bodies = adsk.core.ObjectCollection.create()
@@ -571,6 +689,7 @@ class ExperimentalBaseSnap:
     #         combineFeatures.add(combine_input)
 
 
+    @timed("cut")
     def _perform_cut(self, bodies_to_cut, subtraction_body):
         combineFeatures = self.comp.features.combineFeatures
         CutFeatureOperation = adsk.fusion.FeatureOperations.CutFeatureOperation
@@ -594,6 +713,7 @@ class ExperimentalBaseSnap:
 
 class Cantilever(BaseSnap):
     component_name = "Cantilever"
+    gap_in_cut_body = kernel.CANTILEVER_GAP_IN_CUT_BODY
 
     @staticmethod
     def get_parameter_dict():
@@ -616,136 +736,24 @@ class Cantilever(BaseSnap):
 
 
     def _sketch_join_properties(self, parameters):
-        # Parameters for drawing the profile
-        r_top = parameters['top_radius']
-        # todo: change geometry code to remove r_bot
-        r_bot = 0
-        th = parameters['thickness']
-        l = parameters['length']
-        strain = parameters['strain']
-        nose_angle = math.radians(parameters["nose_angle"])
-
-        bot_radius_sweep_angle = math.atan(l / (th / 2))
-        sin_th = math.sin(bot_radius_sweep_angle)
-        cos_th = math.cos(bot_radius_sweep_angle)
-
-        x_rad = (1 - cos_th) * r_bot  # The x-length of bot radius arc
-        y_rad = sin_th * r_bot  # The y-length of bot radius arc
-        arm_length = l - x_rad
-
-        nose_height = 1.09 * strain * arm_length ** 2 / th
-        nose_x = nose_height / math.tan(nose_angle)
-
-        # Define points_coordinates and arcs from parameters
-        p_c = [(0, 0), (r_bot, 0),
-               (x_rad, y_rad),
-               (l * 1.20 + nose_x, y_rad + 1 / 2 * th * 1.25),
-               (l * 1.20 + nose_x, y_rad + 3 / 4 * th),
-               (l * 1.07 + nose_x, y_rad + th + nose_height),
-               (l + nose_x, y_rad + th + nose_height),
-               (l + nose_x, y_rad + th + nose_height),
-               (l, y_rad + th),
-               (r_top, y_rad + th),
-               (r_top, sin_th * r_bot + r_top + th),
-               (0, sin_th * r_bot + r_top + th)]
-
-        # Define which point indexes should be connected by straight lines
-        point_pair_indexes = [(2, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8),
-                              (8, 9), (11, 0)]
-        # Defines two arcs by point indexes and sweep angle
-        arc_lines = [(1, 0, - bot_radius_sweep_angle), (10, 11, math.pi/2)]
-
-        data = {"points_coordinates": p_c,
-                "point_pair_indexes": point_pair_indexes,
-                "arc_lines": arc_lines}
-        return data
+        return profile_cache.get(
+            (self.component_name, "join"), parameters,
+            kernel.cantilever_join_profile,
+            kernel.CANTILEVER_STAGE_PARAMETERS["join_profile"])
 
     def _sketch_cut_properties(self, parameters):
-        # Parameters for drawing the profile
-        # todo: change geometry code to remove r_bot
-        r_bot = 0
-        r_top = parameters['top_radius']
-        th = parameters['thickness']
-        length = parameters['length']
-        strain = parameters['strain']
-        nose_angle = math.radians(parameters["nose_angle"])
-
-        g_l = parameters['length_gap']
-        g_h = parameters['width_gap']
-        x_l = parameters['extra_length']
-
-        # Determine how the profile should be drawn, depending on the value of
-        theta = math.atan(length / (th / 2))
-        sin_th = math.sin(theta)
-        cos_th = math.cos(theta)
-
-        x_rad_bot = (1 - cos_th) * r_bot  # The x-length of bot radius arc
-        y_rad_bot = sin_th * r_bot
-        x_rad_top = r_top
-        y_rad_top = r_top
-
-        arm_length = length - x_rad_bot
-
-        nose_height = 1.09 * strain * arm_length ** 2 / th
-        nose_x = nose_height / math.tan(nose_angle)
-
-        total_length = 1.20 * length + nose_x + x_l
-
-        p_c = [(0, -g_h),
-               (x_rad_bot, y_rad_bot - g_h),
-               (total_length, y_rad_bot - g_h),
-               (total_length, y_rad_bot + th + nose_height + g_h),
-               (length + nose_x - g_l, y_rad_bot + th + nose_height + g_h),
-               (length - g_l, y_rad_bot + th + g_h),
-               (x_rad_top, y_rad_bot + th + g_h),
-               (0, y_rad_bot + y_rad_top + th + g_h)]
-
-        point_pair_indexes = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6),
-                              (6, 7), (7, 0)]
-
-        # Since there are no arc lines in this profile
-        arc_lines = []
-
-        data = {"points_coordinates": p_c,
-                "point_pair_indexes": point_pair_indexes,
-                "arc_lines": arc_lines
-                }
-        return data
+        return profile_cache.get(
+            (self.component_name, "cut"), parameters,
+            kernel.cantilever_cut_profile,
+            kernel.CANTILEVER_STAGE_PARAMETERS["cut_profile"])
 
     def _get_offsets(self, parameters):
-        ex_dist = parameters['extrusion_distance']
-        # todo: Remmove bot_rad
-        bot_rad = 0
-        thickness = parameters['thickness']
-        theta = math.atan(parameters['length'] / (parameters['thickness'] / 2))
-        x_offset = 0
-        y_offset = 0
-        z_offset = 0
-
-        x_loc = parameters["x_location"]
-        y_loc = parameters["y_location"]
-        extrusion_distance = parameters["extrusion_distance"]
-
-        if x_loc == "top":
-            x_offset = extrusion_distance
-        elif x_loc == "middle":
-            x_offset = extrusion_distance / 2
-        elif x_loc == "bottom":
-            x_offset = 0
-
-        if y_loc == "top":
-            y_offset = - (bot_rad * math.sin(theta) + thickness)
-        elif y_loc == "middle":
-            y_offset = - (bot_rad * math.sin(theta) + thickness) / 2
-        elif y_loc == "bottom":
-            y_offset = 0
-
-        return (x_offset, y_offset, z_offset)
+        return kernel.cantilever_offsets(parameters)
 
 
 class Pin(ExperimentalBaseSnap):
     component_name = "Snap pin"
-    gap_in_cut_body = False
+    gap_in_cut_body = kernel.PIN_GAP_IN_CUT_BODY
 
     @staticmethod
     def get_parameter_dict():
@@ -771,7 +779,8 @@ class Pin(ExperimentalBaseSnap):
         return PARAMETERS
 
     def __init__(self, parent_comp: Component, parameters: dict,
-                 target_joint_org=None, target_body1=None, target_body2=None):
+                 target_joint_org=None, target_body1=None, target_body2=None,
+                 reuse_component=False, booleans=None):
         """
         A new component is created which contains a body with a bendable shape.
         Additional operations are done depending on arguments.
@@ -782,6 +791,12 @@ class Pin(ExperimentalBaseSnap):
             to be combined with.
         :param cut_bodies: A list of bodies on which a cut operation will be
             performed to create a opening for the bendable shape.
+        :param reuse_component: If True, and there are no target bodies, an
+            identical pin component already in the design is reused instead
+            of building a new one. See registry.py.
+        :param booleans: A booleans.BooleanScheduler. If given, the joins into
+            and cuts of the target bodies are queued in it instead of being
+            performed.
         """
 
         """
@@ -792,15 +807,32 @@ class Pin(ExperimentalBaseSnap):
             self.test_parameters(parameters)
         except ParameterException as e:
             logging.getLogger(str(type(self)) + str(e))
-        # Create a new occurrence and reference its component
-        matrix = adsk.core.Matrix3D.create()
-        self.occurrence = parent_comp.occurrences.addNewComponent(matrix)
-        self.comp = self.occurrence.component
-        self.comp.name = self.component_name
+        set_parameters(parameters)
+        self.saved_api_calls = 0
         # self.cut_bodies = cut_bodies
         self.subtraction_body = None
         self.addition_body1 = None
         self.addition_body2 = None
+        self.booleans = booleans
+
+        # Pins that don't join other bodies can share their component
+        self.key = registry.snap_key(self.component_name, parameters)
+        reusable = reuse_component and not target_body1 and not target_body2
+        self.reused = reusable and self._add_existing_occurrence(
+            parent_comp, target_joint_org)
+        if self.reused:
+            bodies = self.comp.bRepBodies
+            self.subtraction_body = bodies.itemByName("Subtraction body")
+            self.addition_body1 = bodies.itemByName("Addition body 1")
+            self.addition_body2 = bodies.itemByName("Addition body 2")
+            return
+
+        # Create a new occurrence and reference its component
+        with span("component"):
+            matrix = adsk.core.Matrix3D.create()
+            self.occurrence = parent_comp.occurrences.addNewComponent(matrix)
+            self.comp = self.occurrence.component
+            self.comp.name = self.component_name
 
 
         """
@@ -819,6 +851,7 @@ class Pin(ExperimentalBaseSnap):
         """
         sketch_plane = self.comp.xZConstructionPlane
         cant_sketch = self.comp.sketches.add(sketch_plane)
+        registry.tag_stage(cant_sketch, "join")
         cant_sketch_data = self._sketch_join_properties(parameters)
         self._draw_sketch(cant_sketch, cant_sketch_data)
         cant_body = self._create_join_body(parameters, cant_sketch)
@@ -830,6 +863,7 @@ class Pin(ExperimentalBaseSnap):
         # Create subtraction body
         sub_sketch_data = self._sketch_cut_properties(parameters)
         sub_sketch = self.comp.sketches.add(sketch_plane)
+        registry.tag_stage(sub_sketch, "cut")
         self._draw_sketch(sub_sketch, sub_sketch_data)
         subtraction_body = self._create_cut_body(parameters, sub_sketch)
         subtraction_body.name = "Subtraction body"
@@ -837,6 +871,7 @@ class Pin(ExperimentalBaseSnap):
         # Create addition bodies
         add_sketch_data = self._sketch_addition_properties(parameters)
         addition_sketch = self.comp.sketches.add(sketch_plane)
+        registry.tag_stage(addition_sketch, "addition")
         self._draw_sketch(addition_sketch, add_sketch_data)
         self.addition_body1 = self._create_addition_body(parameters, addition_sketch)
         self.addition_body1.name = "Addition body 1"
@@ -847,11 +882,16 @@ class Pin(ExperimentalBaseSnap):
         # Mirror addition_body1 over ZY plane to get number two
         mirror_input = self.comp.features.mirrorFeatures.createInput(collection,
                                                                      self.comp.yZConstructionPlane)
-        mirror_feature = self.comp.features.mirrorFeatures.add(mirror_input)
+        with span("extrude", "mirror"):
+            mirror_feature = self.comp.features.mirrorFeatures.add(mirror_input)
         self.addition_body2 = mirror_feature.bodies[0]
         self.addition_body2.name = "Addition body 2"
 
-        if target_body1:
+        if target_body1 and booleans is not None:
+            # Queued, the scheduler performs all joins before the cuts
+            booleans.join(target_body1, self._in_parent(self.addition_body1))
+            booleans.cut(target_body1, self._in_parent(subtraction_body))
+        elif target_body1:
             # First combine
             combined_features = self._perform_join(target_body1, self.addition_body1)
 
@@ -861,7 +901,10 @@ class Pin(ExperimentalBaseSnap):
         else:
             self._perform_cut([self.addition_body1], subtraction_body)
 
-        if target_body2:
+        if target_body2 and booleans is not None:
+            booleans.join(target_body2, self._in_parent(self.addition_body2))
+            booleans.cut(target_body2, self._in_parent(subtraction_body))
+        elif target_body2:
             # First combine
             combined_features = self._perform_join(target_body2, self.addition_body2)
 
@@ -871,6 +914,16 @@ class Pin(ExperimentalBaseSnap):
         else:
             self._perform_cut([self.addition_body2], subtraction_body)
 
+        # Kept for editing the snap later, see edit.py
+        registry.store_parameters(self.comp, self.component_name,
+                                  parameters)
+
+        if reusable:
+            registry.register(self.comp, self.key)
+
+        logging.debug(f"{self.component_name}: sketch normalization saved "
+                      f"{self.saved_api_calls} API calls.")
+
         #
         # if target_body2:
         #     self._perform_join(self.addition_body2, target_body2)
@@ -882,109 +935,12 @@ class Pin(ExperimentalBaseSnap):
         # addition_bodies = [self.addition_body1, self.addition_body2]
 
     def _sketch_join_properties(self, parameters):
-        t = parameters['thickness']
-        # wt = parameters["wall_thickness"]
-        fl = parameters['length']
-        lg = parameters["length_gap"]
-        w = parameters['width']
-        wg = parameters["width_gap"]
-        gb = parameters["gap_buffer"]
-        # e_len = parameters["extra_length"]
-        mp = parameters["middle_padding"]
-        ldg = parameters["ledge"]
-        strain = parameters['strain']
-        pin_prestrain = parameters['pin_prestrain']
-        n_angl = math.radians(parameters["nose_angle"])
-
-        app = adsk.core.Application.get()
-        ui = app.userInterface
-        # ui.messageBox(f"{t=}, {w=}, {gb=}, {wg=}\n{(w/2 - wg - t)=}, {(gb - wg)=}")
-
-        P2x = mp
-        P2y = w/2 - wg - t
-        # P2y = w/2 - wg - w/2 + gb
-        # P2y = gb - wg
-        P3x = mp + fl + lg
-        P3y = w/2 - wg - t/2
-
-        # Midpoint of radius
-        sl = (P3y - P2y)/(P3x - P2x)  # Inner slope of leg
-
-        theta = math.atan(1/sl)  # Want the opposite angle for radius calc
-
-        hl = 0.2*fl  # Head length
-        tl = 0.05*fl  # Top length
-
-        nh = 1.09 * (strain + pin_prestrain) * fl ** 2 / t  # nose height
-        nh_hole = 1.09 * (strain) * fl ** 2 / t  # Nose hole depth
-
-        # Offsets are adjusting for the different position of the nose
-        # because it's not entering the hole all the way in
-        # Only X-offset is used (y wouldn't make sense)
-        nose_offset_y = nh - nh_hole
-        nose_offset_x = nose_offset_y/math.tan(n_angl)
-
-        nose_x = nh / math.tan(n_angl)    # length in x dir resulting from angled nose
-
-
-        # ui.messageBox(f"{nose_offset_x=}")
-
-        first_cantilever_points = [
-            (0, 0),  # 0
-            (mp, 0),  # 1
-            (P2x, P2y),  # 2
-            (mp + fl + lg, w/2 - wg - t/2),  # 3
-            (P3x + nose_x + hl, P3y + sl*(nose_x + hl)),  # 4
-            (mp + fl + lg + nose_x + hl, (w/2 - wg - t/2) + sl*(nose_x + hl) + nh/2),  # 5
-            ((mp + fl + lg) + nose_x + tl, w/2 - wg + nh),  # 6
-            ((mp + fl + lg) + nose_x - nose_offset_x, w/2 - wg + nh),  # 7
-            (mp + fl + lg - nose_offset_x, w/2 - wg),  # 8
-            (ldg, w/2 - wg),  # 9
-            (0, w/2 - wg + ldg),   # 10
-            # (mp + fl + lg, w/2 - wg - t/2 - 1) # Test point
-        ]  #
-
-        # Apply a change because of the gap input
-        y_mirrored_cantilever = self.mirror_points(first_cantilever_points, "y")
-
-        # Define which point indexes should be connected by straight lines
-
-        # Something is incredibly strange about this list, it somehow gets
-        # An extra last element = 9, but it disappears when list function is
-        # cast over ???
-        point_pair_indexes = [(1, 2), (2, 4), (4,5), (5, 6), (6, 7), (7, 8),
-                              (8, 9), (9, 10)]
-
-        all_points = first_cantilever_points + y_mirrored_cantilever
-        num_lines = len(first_cantilever_points)
-
-
-        all_points.extend(self.mirror_points(all_points, "x"))
-        # all_points = first_cantilever_points
-
-        # WARNING: Do not remove this list casting, or Fusion will crash.
-        # Why? Why, indeed.
-        for pair in list(point_pair_indexes):
-            for i in range(1, 4):
-                # ui.messageBox(f"type is {type(pair)}, and it's value is {str(pair)}")
-                x, nose_height = pair
-                x += num_lines * i
-                nose_height += num_lines * i
-                point_pair_indexes.append((x, nose_height))
-
-        # Defines two arcs by point indexes and sweep angle
-        # threepoint_arcs = [[1, 14, 4]]
-        arcs = [(5, 2, - theta), (5 + num_lines, 2 + num_lines, theta),
-                     (5 + 2 * num_lines,2 + 2 * num_lines, theta),
-                     (5 + 3 * num_lines, 2+ 3 * num_lines, - theta)]
-
-        arcs = []
-
-        data = {"points_coordinates": all_points,
-                "point_pair_indexes": point_pair_indexes,
-                "arc_lines": arcs}
-        return data
+        return profile_cache.get(
+            (self.component_name, "join"), parameters,
+            kernel.pin_join_profile,
+            kernel.PIN_STAGE_PARAMETERS["join_profile"])
 
+    @timed("extrude", "addition")
     def _create_addition_body(self, parameters, sketch):
         total_distance = parameters['extrusion_distance'] + 2*parameters["wall_thickness"]
 
@@ -1014,190 +970,16 @@ class Pin(ExperimentalBaseSnap):
     def _sketch_addition_properties(self, parameters):
         """ Specifies a volume around the pin cutout, so that the pin gains the necessary support.
             Defines only one half. The body must be copied and mirrored elsewhere in the code. """
-
-        th = parameters['thickness']
-        wall_thickness = parameters["wall_thickness"]
-        fl = parameters['length']
-        strain = parameters['strain']
-        pin_prestrain = parameters['pin_prestrain']
-        width = parameters['width']
-        ledge = parameters["ledge"]
-        mp = parameters["middle_padding"]
-        extra_length = parameters["extra_length"]
-        nose_angle = math.radians(parameters["nose_angle"])
-
-        theta = math.atan(fl / (th / 2))
-        sin_th = math.sin(theta)
-        cos_th = math.cos(theta)
-
-        # Note: pretension is intentionally omitted for nose height here
-        hole_nh = 1.09 * strain * fl ** 2 / th
-        nh = 1.09 * (strain + pin_prestrain) * fl ** 2 / th
-
-        nose_x = nh / math.tan(nose_angle)
-        hole_nose_x = hole_nh / math.tan(nose_angle)
-        hl = 0.2*fl # Head length
-        tl = 0.05*fl # Top length
-        total_length = mp + fl + nose_x + hl + extra_length
-
-        # The thickness of the material around the Pin
-
-        first_hole_points = [
-            (0, 0),  # 0
-            # (mp + fl + extra_length + nose_x + tl, 0),  # 1
-            (mp + fl + extra_length + nose_x  + tl, 0),  # 1
-            (mp + fl + nose_x + tl + extra_length, width / 2 + hole_nh + wall_thickness),  # 2
-            (mp + fl, width / 2 + hole_nh + wall_thickness),  # 3
-            (mp + fl - nh, width / 2 + wall_thickness),  # 4
-            (0, width / 2 + wall_thickness)  # 5
-        ]
-
-        # Apply a change because of the gap input
-        y_mirrored_cantilever = self.mirror_points(first_hole_points, "y")
-
-        # Define which point indexes should be connected by straight lines
-
-        # Something is incredibly strange about this list, it somehow gets
-        # An extra last element = 9, but it disappears when list function is
-        # cast over ???
-        point_pair_indexes = [(1, 2), (2, 3), (3, 4), (4, 5), (5, 0)]
-
-        all_points = first_hole_points + y_mirrored_cantilever
-        num_lines = len(first_hole_points)
-
-        app = adsk.core.Application.get()
-        ui = app.userInterface
-
-        # all_points.extend(self.mirror_points(all_points, "x"))
-
-        # WARNING: Do not remove this list casting, or Fusion will crash.
-        # Why? Why, indeed.
-        for pair in list(point_pair_indexes):
-            for i in range(1, 2):
-                # ui.messageBox(f"type is {type(pair)}, and it's value is {str(pair)}")
-                x, nose_height = pair
-                x += num_lines * i
-                nose_height += num_lines * i
-                point_pair_indexes.append((x, nose_height))
-
-        # Defines two arcs by point indexes and sweep angle
-        arc_lines = []
-        data = {"points_coordinates": all_points,
-                "point_pair_indexes": point_pair_indexes,
-                "arc_lines": arc_lines}
-        return data
+        return profile_cache.get(
+            (self.component_name, "addition"), parameters,
+            kernel.pin_addition_profile,
+            kernel.PIN_STAGE_PARAMETERS["addition_profile"])
 
     def _sketch_cut_properties(self, parameters):
-        th = parameters['thickness']
-        fl = parameters['length']
-        strain = parameters['strain']
-        pin_prestrain = parameters['pin_prestrain']
-        width = parameters['width']
-        ledge = parameters["ledge"]
-        mp = parameters["middle_padding"]
-        extra_length = parameters["extra_length"]
-        nose_angle = math.radians(parameters["nose_angle"])
-
-        theta = math.atan(fl / (th / 2))
-
-        # Note: pretension is intentionally omitted for nose height here
-        hole_nh = 1.09 * strain * fl ** 2 / th
-        nh = 1.09 * (strain + pin_prestrain) * fl ** 2 / th
-
-        nose_x = nh / math.tan(nose_angle)
-        hole_nose_x = hole_nh / math.tan(nose_angle)
-        hl = 0.2*fl # Head length
-        tl = 0.05*fl # Top length
-        total_length = mp + fl + nose_x + hl + extra_length
-
-        # Adjustment because of pretension
-
-
-        first_hole_points = [
-            (0, 0),  # 0
-            (mp + fl + nose_x + hl + extra_length, 0),  # 1
-            (mp + fl + nose_x + hl + extra_length, width / 2 + hole_nh),  # 2
-            (mp + fl + hole_nose_x, width / 2 + hole_nh),  # 3
-            (mp + fl, width / 2),  # 4
-            (ledge, width / 2),  # 5
-            (0, width / 2 + ledge)  # 6
-        ]
-
-        # Apply a change because of the gap input
-        y_mirrored_cantilever = self.mirror_points(first_hole_points, "y")
-
-        # Define which point indexes should be connected by straight lines
-
-        # Something is incredibly strange about this list, it somehow gets
-        # An extra last element = 9, but it disappears when list function is
-        # cast over ???
-        point_pair_indexes = [(1, 2), (2, 3), (3, 4), (4, 5), (5, 6)]
-
-        all_points = first_hole_points + y_mirrored_cantilever
-        num_lines = len(first_hole_points)
-
-        app = adsk.core.Application.get()
-        ui = app.userInterface
-
-        all_points.extend(self.mirror_points(all_points, "x"))
-
-        # WARNING: Do not remove this list casting, or Fusion will crash.
-        # Why? Why, indeed.
-        for pair in list(point_pair_indexes):
-            for i in range(1, 4):
-                # ui.messageBox(f"type is {type(pair)}, and it's value is {str(pair)}")
-                x, nose_height = pair
-                x += num_lines * i
-                nose_height += num_lines * i
-                point_pair_indexes.append((x, nose_height))
-
-        # Defines two arcs by point indexes and sweep angle
-        arc_lines = []
-        data = {"points_coordinates": all_points,
-                "point_pair_indexes": point_pair_indexes,
-                "arc_lines": arc_lines}
-        return data
-
-    def _draw_sketch(self, sketch, sketch_data):
-        points_coordinates = sketch_data['points_coordinates']
-        point_pair_indexes = sketch_data['point_pair_indexes']
-        arc_lines = sketch_data['arc_lines']
-
-        sketch_points_3D = []
-        points_3D = []
-        # Create sketch points
-        for x, y in points_coordinates:
-            sketch_points_3D.append(sketch.sketchPoints.add(adsk.core.Point3D.create(x, y, 0)))
-            # points_3D.append((adsk.core.Point3D.create(x, y, 0)))
-
-        # Draw straight lines
-        for p0, p1 in point_pair_indexes:
-            start_point = sketch_points_3D[p0]
-            end_point = sketch_points_3D[p1]
-            sketch.sketchCurves.sketchLines.addByTwoPoints(start_point,
-                                                           end_point)
-
-        # Draw arcs if any. This somehow doesn't need an "if sweep_angle > 0"
-        for arc_data in arc_lines:
-            origin_point = sketch_points_3D[arc_data[0]]
-            mid_point = sketch_points_3D[arc_data[1]]
-            theta = arc_data[2]
-            # end_point2 = sketch_points_3D[arc_data[2]]
-            app = adsk.core.Application.get()
-            ui = app.userInterface
-            # ui.messageBox(f"Type of last point: {end_point=}")
-
-            # startPoint = adsk.core.Point3D.create(0, 0, 0)
-            # mid_point = adsk.core.Point3D.create(5, 0, 0)
-            # endPoint = adsk.core.Point3D.create(8, 7, 0)
-            #
-            sketch.sketchCurves.sketchArcs.addByCenterStartSweep(origin_point,
-                                                                 mid_point,
-                                                                 theta)
-            # sketch.sketchCurves.sketchArcs.addByThreePoints(startPoint,
-            #                                                      alongPoint,
-            #                                                      endPoint)
-
+        return profile_cache.get(
+            (self.component_name, "cut"), parameters,
+            kernel.pin_cut_profile,
+            kernel.PIN_STAGE_PARAMETERS["cut_profile"])
 
     def _get_offsets(self, parameters):
         """
@@ -1206,31 +988,8 @@ class Pin(ExperimentalBaseSnap):
         :param parameters:
         :return:
         """
-        x_loc = parameters["x_location"]
-        y_loc = parameters["y_location"]
-        extrusion_distance = parameters["extrusion_distance"]
-        width = parameters["width"]
-        extrusion_gap = parameters["extrusion_gap"]
-        x_offset = 0
-        y_offset = 0
-        z_offset = 0
-
-        if x_loc == "top":
-            x_offset = extrusion_distance - extrusion_gap
-        elif x_loc == "middle":
-            x_offset = extrusion_distance / 2 - extrusion_gap
-        elif x_loc == "bottom":
-            x_offset = 0 - extrusion_gap
-
-        if y_loc == "top":
-            y_offset = -width / 2
-        elif y_loc == "middle":
-            y_offset = 0
-        elif y_loc == "bottom":
-            y_offset = width / 2
-
+        x_offset, y_offset, z_offset = kernel.pin_offsets(parameters)
         logging.debug(f"Offsets x:{x_offset}, y:{y_offset}, z:{z_offset}")
-
         return x_offset, y_offset, z_offset
 
 
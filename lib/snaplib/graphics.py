@@ -0,0 +1,226 @@
+"""
+Lightweight previews, drawn as custom graphics.
+
+A full preview builds the component, sketches, extrusions and combines, only
+for Fusion to roll all of it back. These functions instead draw the meshes
+from mesh.py at the place the snap would be placed. The graphics are not
+part of the timeline, so they stay between previews: only the stages whose
+parameters changed are drawn again (see kernel.dirty_stages). clear() must
+be called before the real build and when the command ends.
+"""
+
+import adsk.core
+import adsk.fusion
+
+from . import kernel
+from . import mesh
+from .cache import profile_cache
+from .geometry import Cantilever, Pin, placement_matrix
+
+app = adsk.core.Application.get()
+
+# (red, green, blue, opacity)
+BODY_COLOR = (120, 160, 220, 1.0)
+CUT_COLOR = (230, 80, 60, 0.35)
+ADDITION_COLOR = (90, 200, 110, 0.5)
+GUIDE_LINE_COLORS = ((255, 255, 0, 255), (0, 0, 255, 255))
+
+_preview = None
+
+
+def clear():
+    """Removes the graphics of the previous preview, if any."""
+    global _preview
+    if _preview is not None:
+        _preview.delete()
+    _preview = None
+
+
+def _mesh(kind, parameters, names, profile_function, extent):
+    """
+    Meshes are cached like the profiles, with kind e.g. "join mesh".
+    :param names: The parameters of the profile and the extent, the stage's
+        in kernel.CANTILEVER_STAGE_PARAMETERS or PIN_STAGE_PARAMETERS.
+    """
+    def compute(parameters):
+        start, end = extent
+        return mesh.extrude_profile(profile_function(parameters), start, end)
+    return profile_cache.get(kind, parameters, compute, names)
+
+
+def _color_effect(color):
+    red, green, blue, opacity = color
+    diffuse = adsk.core.Color.create(red, green, blue, 255)
+    return adsk.fusion.CustomGraphicsBasicMaterialColorEffect.create(
+        diffuse, diffuse, adsk.core.Color.create(40, 40, 40, 255),
+        adsk.core.Color.create(0, 0, 0, 255), 5, opacity)
+
+
+def _add_mesh(group, body_mesh, color):
+    coordinates = adsk.fusion.CustomGraphicsCoordinates.create(
+        list(body_mesh.coordinates))
+    triangles = list(body_mesh.triangles)
+    entity = group.addMesh(coordinates, triangles, list(body_mesh.normals),
+                           triangles)
+    entity.color = _color_effect(color)
+    return entity
+
+
+def _add_line(group, start, end, rgba):
+    coordinates = adsk.fusion.CustomGraphicsCoordinates.create(
+        list(start) + list(end))
+    entity = group.addLines(coordinates, [0, 1], False)
+    entity.color = adsk.fusion.CustomGraphicsSolidColorEffect.create(
+        adsk.core.Color.create(*rgba))
+    entity.weight = 5
+    entity.depthPriority = 1000
+    return entity
+
+
+class IncrementalPreview:
+    """
+    The graphics of one snap preview, drawn once for every selected joint
+    origin. Each drawn stage keeps its own entities, which are only replaced
+    when the stage is dirty. When only the placement changes, the existing
+    entities are moved.
+    """
+    def __init__(self, stages):
+        """
+        :param stages: kernel.CANTILEVER_STAGES or kernel.PIN_STAGES
+        """
+        self.stages = stages
+        self.group = None
+        self.parameters = None
+        self.joint_origins = None
+        self.transforms = []
+        # Stage name to a list with the entities of each placement
+        self.entities = {}
+        # Stages that were drawn again in the last update
+        self.redrawn = set()
+
+    def update(self, parameters, joint_origins, offsets, drawers):
+        """
+        :param parameters: The parameters of the snap.
+        :param joint_origins: The selected joint origins. If empty, the snap
+            is drawn once, at the origin.
+        :param offsets: Function giving the joint origin offsets from the
+            parameters.
+        :param drawers: Dictionary of stage name to a function that adds the
+            graphics of the stage to a group and returns the entities.
+        """
+        joint_origins = list(joint_origins) or [None]
+        if self.group is None or not self.group.isValid:
+            design = adsk.fusion.Design.cast(app.activeProduct)
+            self.group = design.rootComponent.customGraphicsGroups.add()
+            self.parameters = None
+            self.entities = {}
+
+        dirty = kernel.dirty_stages(self.stages, self.parameters, parameters)
+        if self.parameters is not None and joint_origins != self.joint_origins:
+            dirty.add("offsets")
+            if len(joint_origins) != len(self.joint_origins):
+                dirty.update(drawers)
+        if "offsets" in dirty:
+            snap_offsets = offsets(parameters)
+            self.transforms = [placement_matrix(snap_offsets, joint_origin)
+                               for joint_origin in joint_origins]
+
+        self.redrawn = set()
+        for stage, drawer in drawers.items():
+            if stage in dirty:
+                for entities in self.entities.get(stage, ()):
+                    for entity in entities:
+                        entity.deleteMe()
+                self.entities[stage] = [drawer(self.group)
+                                        for _ in joint_origins]
+                self.redrawn.add(stage)
+            elif "offsets" not in dirty:
+                continue
+            for entities, transform in zip(self.entities[stage],
+                                           self.transforms):
+                for entity in entities:
+                    entity.transform = transform
+
+        self.parameters = dict(parameters)
+        self.joint_origins = joint_origins
+        app.activeViewport.refresh()
+
+    def delete(self):
+        if self.group is not None and self.group.isValid:
+            self.group.deleteMe()
+        self.group = None
+
+
+def _preview_for(stages):
+    """The current preview, or a new one if it was for another snap."""
+    global _preview
+    if _preview is None or _preview.stages is not stages:
+        clear()
+        _preview = IncrementalPreview(stages)
+    return _preview
+
+
+def draw_cantilever(parameters, joint_origins=()):
+    """Draws the cantilever and its cut body at each joint origin, as
+    Cantilever would build them."""
+    name = Cantilever.component_name
+    gap_in_cut_body = Cantilever.gap_in_cut_body
+    names = kernel.CANTILEVER_STAGE_PARAMETERS
+
+    def join(group):
+        body = _mesh((name, "join mesh"), parameters,
+                     names["join_extrude"], kernel.cantilever_join_profile,
+                     kernel.join_extent(parameters, gap_in_cut_body))
+        return [_add_mesh(group, body, BODY_COLOR)]
+
+    def cut(group):
+        body = _mesh((name, "cut mesh"), parameters,
+                     names["cut_extrude"], kernel.cantilever_cut_profile,
+                     kernel.cut_extent(parameters, gap_in_cut_body))
+        return [_add_mesh(group, body, CUT_COLOR)]
+
+    preview = _preview_for(kernel.CANTILEVER_STAGES)
+    preview.update(parameters, joint_origins, kernel.cantilever_offsets,
+                   {"join_extrude": join, "cut_extrude": cut})
+
+
+def draw_pin(parameters, joint_origins=()):
+    """Draws the pin, its cut body and both addition bodies at each joint
+    origin, as Pin would build them, along with the guide lines of the pin
+    commands."""
+    name = Pin.component_name
+    gap_in_cut_body = Pin.gap_in_cut_body
+    names = kernel.PIN_STAGE_PARAMETERS
+
+    def join(group):
+        body = _mesh((name, "join mesh"), parameters,
+                     names["join_extrude"], kernel.pin_join_profile,
+                     kernel.join_extent(parameters, gap_in_cut_body))
+        return [_add_mesh(group, body, BODY_COLOR)]
+
+    def cut(group):
+        body = _mesh((name, "cut mesh"), parameters,
+                     names["cut_extrude"], kernel.pin_cut_profile,
+                     kernel.cut_extent(parameters, gap_in_cut_body))
+        return [_add_mesh(group, body, CUT_COLOR)]
+
+    def addition(group):
+        body = _mesh((name, "addition mesh"), parameters,
+                     names["addition_extrude"], kernel.pin_addition_profile,
+                     kernel.addition_extent(parameters))
+        return [_add_mesh(group, body, ADDITION_COLOR),
+                _add_mesh(group, body.mirrored_x(), ADDITION_COLOR)]
+
+    def guide_lines(group):
+        y = parameters["width"] / 2
+        length = parameters["length"] * 4.5
+        return [_add_line(group, (0, y, 0), (-length, y, 0),
+                          GUIDE_LINE_COLORS[0]),
+                _add_line(group, (0, y, 0), (length, y, 0),
+                          GUIDE_LINE_COLORS[1])]
+
+    preview = _preview_for(kernel.PIN_STAGES)
+    preview.update(parameters, joint_origins, kernel.pin_offsets,
+                   {"join_extrude": join, "cut_extrude": cut,
+                    "addition_extrude": addition,
+                    "guide_lines": guide_lines})
@@ -0,0 +1,722 @@
+"""
+Pure-Python profile math for the snap geometries.
+
+Nothing in this module imports adsk, so the profiles can be computed,
+profiled and benchmarked outside of Fusion. The classes in geometry.py only
+turn the data returned from here into sketches and features.
+
+Every profile function returns a SketchProfile.
+"""
+
+import math
+from array import array
+from itertools import chain
+
+from .cache import parameter_key
+
+# Topology of the profiles. It does not depend on the parameters, only the
+# point coordinates (and arc sweeps) do.
+CANTILEVER_JOIN_SEGMENTS = [(2, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8),
+                            (8, 9), (11, 0)]
+CANTILEVER_JOIN_ARCS = [(1, 0), (10, 11)]
+CANTILEVER_CUT_SEGMENTS = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6),
+                           (6, 7), (7, 0)]
+
+# The pin profiles define one leg, which is mirrored into the other ones.
+PIN_JOIN_LEG_POINTS = 11
+PIN_JOIN_LEG_SEGMENTS = [(1, 2), (2, 4), (4, 5), (5, 6), (6, 7), (7, 8),
+                         (8, 9), (9, 10)]
+PIN_ADDITION_LEG_POINTS = 6
+PIN_ADDITION_LEG_SEGMENTS = [(1, 2), (2, 3), (3, 4), (4, 5), (5, 0)]
+PIN_CUT_LEG_POINTS = 7
+PIN_CUT_LEG_SEGMENTS = [(1, 2), (2, 3), (3, 4), (4, 5), (5, 6)]
+
+
+class SketchProfile:
+    """
+    The points, straight lines and arcs of a single sketch profile.
+
+    Coordinates are stored flat (x0, y0, x1, y1, ...) in one array('d'),
+    lines as flat index pairs in an array('i'), and arcs as flat
+    (center, start) index pairs in an array('i') with their sweep angles in
+    a separate array('d'). The accessors return memoryviews onto these
+    arrays, so nothing is copied when reading them.
+
+    Profiles are shared between callers (see cache.py), and the index arrays
+    are shared between all profiles of the same kind, so a profile must not
+    be modified after it is created.
+    """
+    __slots__ = ("_coordinates", "_segments", "_arc_indexes", "_arc_sweeps")
+
+    def __init__(self, coordinates, segments, arc_indexes=None,
+                 arc_sweeps=None):
+        """
+        :param coordinates: array('d') of flat x, y coordinates.
+        :param segments: array('i') of flat line point index pairs.
+        :param arc_indexes: array('i') of flat (center, start) index pairs.
+        :param arc_sweeps: array('d') with the sweep angle of each arc.
+        """
+        self._coordinates = coordinates
+        self._segments = segments
+        self._arc_indexes = _NO_INDEXES if arc_indexes is None else arc_indexes
+        self._arc_sweeps = _NO_SWEEPS if arc_sweeps is None else arc_sweeps
+
+    @classmethod
+    def from_lists(cls, points_coordinates, point_pair_indexes,
+                   arc_lines=()):
+        """
+        Creates a profile from the list based format, i.e. a list of (x, y)
+        tuples, a list of index pairs and a list of
+        (center index, start index, sweep angle) tuples.
+        """
+        return cls(array("d", chain.from_iterable(points_coordinates)),
+                   index_array(point_pair_indexes),
+                   index_array(arc[:2] for arc in arc_lines),
+                   array("d", (arc[2] for arc in arc_lines)))
+
+    @property
+    def coordinates(self):
+        """Flat x, y coordinates of all points."""
+        return memoryview(self._coordinates)
+
+    @property
+    def segments(self):
+        """Flat point index pairs of all straight lines."""
+        return memoryview(self._segments)
+
+    @property
+    def arc_indexes(self):
+        """Flat (center, start) point index pairs of all arcs."""
+        return memoryview(self._arc_indexes)
+
+    @property
+    def arc_sweeps(self):
+        """Sweep angle of each arc, in radians."""
+        return memoryview(self._arc_sweeps)
+
+    @property
+    def point_count(self):
+        return len(self._coordinates) // 2
+
+    @property
+    def segment_count(self):
+        return len(self._segments) // 2
+
+    @property
+    def arc_count(self):
+        return len(self._arc_sweeps)
+
+    def point(self, index):
+        return self._coordinates[2 * index], self._coordinates[2 * index + 1]
+
+    def points(self):
+        """Iterates over the points as (x, y) tuples."""
+        coordinates = self.coordinates
+        return zip(coordinates[0::2], coordinates[1::2])
+
+    def point_pairs(self):
+        """Iterates over the straight lines as (index, index) tuples."""
+        segments = self.segments
+        return zip(segments[0::2], segments[1::2])
+
+    def arcs(self):
+        """Iterates over the arcs as (center, start, sweep angle) tuples."""
+        indexes = self.arc_indexes
+        return zip(indexes[0::2], indexes[1::2], self.arc_sweeps)
+
+    def to_dict(self):
+        """The list based format, which is easy to serialize."""
+        return {"points_coordinates": list(self.points()),
+                "point_pair_indexes": list(self.point_pairs()),
+                "arc_lines": list(self.arcs())}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls.from_lists(data["points_coordinates"],
+                              data["point_pair_indexes"],
+                              data.get("arc_lines", ()))
+
+    def __eq__(self, other):
+        if not isinstance(other, SketchProfile):
+            return NotImplemented
+        return (self._coordinates == other._coordinates
+                and self._segments == other._segments
+                and self._arc_indexes == other._arc_indexes
+                and self._arc_sweeps == other._arc_sweeps)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"{type(self).__name__}(points={self.point_count}, "
+                f"segments={self.segment_count}, arcs={self.arc_count})")
+
+
+def index_array(pairs):
+    """Flattens a sequence of index pairs into an array('i')."""
+    return array("i", chain.from_iterable(pairs))
+
+
+_NO_INDEXES = array("i")
+_NO_SWEEPS = array("d")
+
+
+def mirror_points(pointlist, axis):
+    """
+    Mirrors the list of points across either the x or y axis.
+    :param pointlist:
+    :param axis: "x" or "y"
+    :return:
+    """
+    newlist = []
+    for pair in pointlist:
+        (x, y) = pair
+        if axis == "x":
+            x *= -1
+        elif axis == "y":
+            y *= -1
+        newlist.append((x, y))
+    return newlist
+
+
+def mirror_coordinates(coordinates, axis):
+    """
+    Same as mirror_points, for flat coordinates in an array('d').
+    :param coordinates:
+    :param axis: "x" or "y"
+    :return: A new array('d').
+    """
+    mirrored = array("d", coordinates)
+    start = 0 if axis == "x" else 1
+    mirrored[start::2] = array("d", [-value for value
+                                     in coordinates[start::2]])
+    return mirrored
+
+
+def repeat_pairs(point_pair_indexes, stride, copies):
+    """
+    Extends a list of index pairs with copies shifted by multiples of
+    stride, in the same order the mirrored points are appended.
+    """
+    repeated = list(point_pair_indexes)
+    for p0, p1 in point_pair_indexes:
+        for i in range(1, copies + 1):
+            repeated.append((p0 + stride * i, p1 + stride * i))
+    return repeated
+
+
+# Index arrays shared by every profile of the same kind.
+_CANTILEVER_JOIN_SEGMENTS = index_array(CANTILEVER_JOIN_SEGMENTS)
+_CANTILEVER_JOIN_ARCS = index_array(CANTILEVER_JOIN_ARCS)
+_CANTILEVER_CUT_SEGMENTS = index_array(CANTILEVER_CUT_SEGMENTS)
+_PIN_JOIN_SEGMENTS = index_array(
+    repeat_pairs(PIN_JOIN_LEG_SEGMENTS, PIN_JOIN_LEG_POINTS, 3))
+_PIN_ADDITION_SEGMENTS = index_array(
+    repeat_pairs(PIN_ADDITION_LEG_SEGMENTS, PIN_ADDITION_LEG_POINTS, 1))
+_PIN_CUT_SEGMENTS = index_array(
+    repeat_pairs(PIN_CUT_LEG_SEGMENTS, PIN_CUT_LEG_POINTS, 3))
+
+
+def cantilever_join_profile(parameters):
+    # Parameters for drawing the profile
+    r_top = parameters['top_radius']
+    # todo: change geometry code to remove r_bot
+    r_bot = 0
+    th = parameters['thickness']
+    l = parameters['length']
+    strain = parameters['strain']
+    nose_angle = math.radians(parameters["nose_angle"])
+
+    bot_radius_sweep_angle = math.atan(l / (th / 2))
+    sin_th = math.sin(bot_radius_sweep_angle)
+    cos_th = math.cos(bot_radius_sweep_angle)
+
+    x_rad = (1 - cos_th) * r_bot  # The x-length of bot radius arc
+    y_rad = sin_th * r_bot  # The y-length of bot radius arc
+    arm_length = l - x_rad
+
+    nose_height = 1.09 * strain * arm_length ** 2 / th
+    nose_x = nose_height / math.tan(nose_angle)
+
+    # Define points_coordinates and arcs from parameters
+    coordinates = array("d", (
+        0, 0,  # 0
+        r_bot, 0,  # 1
+        x_rad, y_rad,  # 2
+        l * 1.20 + nose_x, y_rad + 1 / 2 * th * 1.25,  # 3
+        l * 1.20 + nose_x, y_rad + 3 / 4 * th,  # 4
+        l * 1.07 + nose_x, y_rad + th + nose_height,  # 5
+        l + nose_x, y_rad + th + nose_height,  # 6
+        l + nose_x, y_rad + th + nose_height,  # 7
+        l, y_rad + th,  # 8
+        r_top, y_rad + th,  # 9
+        r_top, sin_th * r_bot + r_top + th,  # 10
+        0, sin_th * r_bot + r_top + th))  # 11
+
+    # Defines two arcs by point indexes (CANTILEVER_JOIN_ARCS) and sweep angle
+    arc_sweeps = array("d", (- bot_radius_sweep_angle, math.pi/2))
+
+    return SketchProfile(coordinates, _CANTILEVER_JOIN_SEGMENTS,
+                         _CANTILEVER_JOIN_ARCS, arc_sweeps)
+
+
+def cantilever_cut_profile(parameters):
+    # Parameters for drawing the profile
+    # todo: change geometry code to remove r_bot
+    r_bot = 0
+    r_top = parameters['top_radius']
+    th = parameters['thickness']
+    length = parameters['length']
+    strain = parameters['strain']
+    nose_angle = math.radians(parameters["nose_angle"])
+
+    g_l = parameters['length_gap']
+    g_h = parameters['width_gap']
+    x_l = parameters['extra_length']
+
+    # Determine how the profile should be drawn, depending on the value of
+    theta = math.atan(length / (th / 2))
+    sin_th = math.sin(theta)
+    cos_th = math.cos(theta)
+
+    x_rad_bot = (1 - cos_th) * r_bot  # The x-length of bot radius arc
+    y_rad_bot = sin_th * r_bot
+    x_rad_top = r_top
+    y_rad_top = r_top
+
+    arm_length = length - x_rad_bot
+
+    nose_height = 1.09 * strain * arm_length ** 2 / th
+    nose_x = nose_height / math.tan(nose_angle)
+
+    total_length = 1.20 * length + nose_x + x_l
+
+    coordinates = array("d", (
+        0, -g_h,  # 0
+        x_rad_bot, y_rad_bot - g_h,  # 1
+        total_length, y_rad_bot - g_h,  # 2
+        total_length, y_rad_bot + th + nose_height + g_h,  # 3
+        length + nose_x - g_l, y_rad_bot + th + nose_height + g_h,  # 4
+        length - g_l, y_rad_bot + th + g_h,  # 5
+        x_rad_top, y_rad_bot + th + g_h,  # 6
+        0, y_rad_bot + y_rad_top + th + g_h))  # 7
+
+    # There are no arc lines in this profile
+    return SketchProfile(coordinates, _CANTILEVER_CUT_SEGMENTS)
+
+
+def cantilever_offsets(parameters):
+    """
+    Offsets of the cantilever joint origin, given the chosen x and y
+    location.
+    :param parameters:
+    :return: (x_offset, y_offset, z_offset)
+    """
+    # todo: Remmove bot_rad
+    bot_rad = 0
+    thickness = parameters['thickness']
+    theta = math.atan(parameters['length'] / (parameters['thickness'] / 2))
+    x_offset = 0
+    y_offset = 0
+    z_offset = 0
+
+    x_loc = parameters["x_location"]
+    y_loc = parameters["y_location"]
+    extrusion_distance = parameters["extrusion_distance"]
+
+    if x_loc == "top":
+        x_offset = extrusion_distance
+    elif x_loc == "middle":
+        x_offset = extrusion_distance / 2
+    elif x_loc == "bottom":
+        x_offset = 0
+
+    if y_loc == "top":
+        y_offset = - (bot_rad * math.sin(theta) + thickness)
+    elif y_loc == "middle":
+        y_offset = - (bot_rad * math.sin(theta) + thickness) / 2
+    elif y_loc == "bottom":
+        y_offset = 0
+
+    return (x_offset, y_offset, z_offset)
+
+
+def pin_join_profile(parameters):
+    t = parameters['thickness']
+    fl = parameters['length']
+    lg = parameters["length_gap"]
+    w = parameters['width']
+    wg = parameters["width_gap"]
+    mp = parameters["middle_padding"]
+    ldg = parameters["ledge"]
+    strain = parameters['strain']
+    pin_prestrain = parameters['pin_prestrain']
+    n_angl = math.radians(parameters["nose_angle"])
+
+    P2x = mp
+    P2y = w/2 - wg - t
+    P3x = mp + fl + lg
+    P3y = w/2 - wg - t/2
+
+    sl = (P3y - P2y)/(P3x - P2x)  # Inner slope of leg
+
+    hl = 0.2*fl  # Head length
+    tl = 0.05*fl  # Top length
+
+    nh = 1.09 * (strain + pin_prestrain) * fl ** 2 / t  # nose height
+    nh_hole = 1.09 * (strain) * fl ** 2 / t  # Nose hole depth
+
+    # Offsets are adjusting for the different position of the nose
+    # because it's not entering the hole all the way in
+    # Only X-offset is used (y wouldn't make sense)
+    nose_offset_y = nh - nh_hole
+    nose_offset_x = nose_offset_y/math.tan(n_angl)
+
+    nose_x = nh / math.tan(n_angl)    # length in x dir resulting from angled nose
+
+    coordinates = array("d", (
+        0, 0,  # 0
+        mp, 0,  # 1
+        P2x, P2y,  # 2
+        mp + fl + lg, w/2 - wg - t/2,  # 3
+        P3x + nose_x + hl, P3y + sl*(nose_x + hl),  # 4
+        mp + fl + lg + nose_x + hl, (w/2 - wg - t/2) + sl*(nose_x + hl) + nh/2,  # 5
+        (mp + fl + lg) + nose_x + tl, w/2 - wg + nh,  # 6
+        (mp + fl + lg) + nose_x - nose_offset_x, w/2 - wg + nh,  # 7
+        mp + fl + lg - nose_offset_x, w/2 - wg,  # 8
+        ldg, w/2 - wg,  # 9
+        0, w/2 - wg + ldg))  # 10
+
+    # Mirror the leg into the three other ones. The lines are repeated for
+    # each of them in _PIN_JOIN_SEGMENTS.
+    coordinates.extend(mirror_coordinates(coordinates, "y"))
+    coordinates.extend(mirror_coordinates(coordinates, "x"))
+
+    return SketchProfile(coordinates, _PIN_JOIN_SEGMENTS)
+
+
+def pin_addition_profile(parameters):
+    """ Specifies a volume around the pin cutout, so that the pin gains the necessary support.
+        Defines only one half. The body must be copied and mirrored elsewhere in the code. """
+
+    th = parameters['thickness']
+    wall_thickness = parameters["wall_thickness"]
+    fl = parameters['length']
+    strain = parameters['strain']
+    pin_prestrain = parameters['pin_prestrain']
+    width = parameters['width']
+    mp = parameters["middle_padding"]
+    extra_length = parameters["extra_length"]
+    nose_angle = math.radians(parameters["nose_angle"])
+
+    # Note: pretension is intentionally omitted for nose height here
+    hole_nh = 1.09 * strain * fl ** 2 / th
+    nh = 1.09 * (strain + pin_prestrain) * fl ** 2 / th
+
+    nose_x = nh / math.tan(nose_angle)
+    tl = 0.05*fl # Top length
+
+    coordinates = array("d", (
+        0, 0,  # 0
+        mp + fl + extra_length + nose_x  + tl, 0,  # 1
+        mp + fl + nose_x + tl + extra_length, width / 2 + hole_nh + wall_thickness,  # 2
+        mp + fl, width / 2 + hole_nh + wall_thickness,  # 3
+        mp + fl - nh, width / 2 + wall_thickness,  # 4
+        0, width / 2 + wall_thickness))  # 5
+
+    coordinates.extend(mirror_coordinates(coordinates, "y"))
+
+    return SketchProfile(coordinates, _PIN_ADDITION_SEGMENTS)
+
+
+def pin_cut_profile(parameters):
+    th = parameters['thickness']
+    fl = parameters['length']
+    strain = parameters['strain']
+    pin_prestrain = parameters['pin_prestrain']
+    width = parameters['width']
+    ledge = parameters["ledge"]
+    mp = parameters["middle_padding"]
+    extra_length = parameters["extra_length"]
+    nose_angle = math.radians(parameters["nose_angle"])
+
+    # Note: pretension is intentionally omitted for nose height here
+    hole_nh = 1.09 * strain * fl ** 2 / th
+    nh = 1.09 * (strain + pin_prestrain) * fl ** 2 / th
+
+    nose_x = nh / math.tan(nose_angle)
+    hole_nose_x = hole_nh / math.tan(nose_angle)
+    hl = 0.2*fl # Head length
+
+    coordinates = array("d", (
+        0, 0,  # 0
+        mp + fl + nose_x + hl + extra_length, 0,  # 1
+        mp + fl + nose_x + hl + extra_length, width / 2 + hole_nh,  # 2
+        mp + fl + hole_nose_x, width / 2 + hole_nh,  # 3
+        mp + fl, width / 2,  # 4
+        ledge, width / 2,  # 5
+        0, width / 2 + ledge))  # 6
+
+    coordinates.extend(mirror_coordinates(coordinates, "y"))
+    coordinates.extend(mirror_coordinates(coordinates, "x"))
+
+    return SketchProfile(coordinates, _PIN_CUT_SEGMENTS)
+
+
+def pin_offsets(parameters):
+    """
+    Defines offsets that will be used when creating joint origin,
+    so that one can adjust the position of the cantilever.
+    :param parameters:
+    :return: (x_offset, y_offset, z_offset)
+    """
+    x_loc = parameters["x_location"]
+    y_loc = parameters["y_location"]
+    extrusion_distance = parameters["extrusion_distance"]
+    width = parameters["width"]
+    extrusion_gap = parameters["extrusion_gap"]
+    x_offset = 0
+    y_offset = 0
+    z_offset = 0
+
+    if x_loc == "top":
+        x_offset = extrusion_distance - extrusion_gap
+    elif x_loc == "middle":
+        x_offset = extrusion_distance / 2 - extrusion_gap
+    elif x_loc == "bottom":
+        x_offset = 0 - extrusion_gap
+
+    if y_loc == "top":
+        y_offset = -width / 2
+    elif y_loc == "middle":
+        y_offset = 0
+    elif y_loc == "bottom":
+        y_offset = width / 2
+
+    return x_offset, y_offset, z_offset
+
+
+# Whether the extrusion gap widens the cut body, or narrows the join body.
+# Cantilever.gap_in_cut_body and Pin.gap_in_cut_body in geometry.py.
+CANTILEVER_GAP_IN_CUT_BODY = True
+PIN_GAP_IN_CUT_BODY = False
+
+
+def join_extent_parameters(gap_in_cut_body=True):
+    """The parameters join_extent() reads."""
+    if gap_in_cut_body:
+        return ("extrusion_distance",)
+    return ("extrusion_distance", "extrusion_gap")
+
+
+def join_extent(parameters, gap_in_cut_body=True):
+    """
+    Start and end of the join body extrusion along the sketch normal, as
+    extruded by the geometry classes.
+    :return: (start, end)
+    """
+    if gap_in_cut_body:
+        return 0, parameters['extrusion_distance']
+    return 0, parameters['extrusion_distance'] - 2 * parameters['extrusion_gap']
+
+
+def cut_extent(parameters, gap_in_cut_body=True):
+    """
+    Start and end of the cut body extrusion along the sketch normal.
+    :return: (start, end)
+    """
+    gap = parameters['extrusion_gap']
+    if gap_in_cut_body:
+        return -gap, parameters['extrusion_distance'] + gap
+    return -gap, parameters['extrusion_distance'] - gap
+
+
+def addition_extent(parameters):
+    """
+    Start and end of the pin addition body extrusion along the sketch normal.
+    :return: (start, end)
+    """
+    wall_thickness = parameters["wall_thickness"]
+    return -wall_thickness, parameters['extrusion_distance'] + wall_thickness
+
+
+# Default length / width of the standardized sizes.
+LENGTH_WIDTH_RATIO = 1.6
+# The size_parameters() values that are rounded to 4 decimals. The others
+# are linear in size and left as they are.
+PIN_ROUNDED = ("thickness", "ledge", "gap_buffer", "wall_thickness")
+CANTILEVER_ROUNDED = ("top_radius", "thickness")
+# Cantilevers smaller than this get the parameters of this size.
+CANTILEVER_MIN_SIZE = 0.3
+
+
+def pin_size_values(size, length_width_ratio=LENGTH_WIDTH_RATIO):
+    """
+    pin_size_parameters() before the rounding. Piecewise linear in size,
+    with the breaks at 0.3, 1 and 1.5 cm.
+    """
+    gap_buffer = 0
+    max_gap_buffer = 0.08
+    if 0 < size <= 0.3:
+        gap_buffer = size / 10
+    elif 0.3 < size <= 1:
+        gap_buffer = 0.030 + (size - 0.3) / 25
+    elif 1 < size <= 1.5:
+        gap_buffer = 0.050 + (max_gap_buffer-0.05)*(size - 1)/(1.5 - 1)
+    elif 1.5 <= size:
+        gap_buffer = max_gap_buffer
+
+    thickness = size/2 - gap_buffer
+    return {"width": size,
+            "length": size * length_width_ratio,
+            "extrusion_distance": size,
+            "thickness": thickness,
+            "middle_padding": thickness,
+            "ledge": size / 12,
+            "gap_buffer": gap_buffer,
+            "wall_thickness": size / 4}
+
+
+def pin_size_parameters(size, length_width_ratio=LENGTH_WIDTH_RATIO):
+    """
+    This function generates a set of parameter values as a function of the
+    value of size. This is intended to make a sort of "standardized"
+    geometry, so that the different parameters scale well with the overall
+    size. For example, the size of the ledge should not be linear with the
+    overall with of the pin. That would make it uselessly small for small
+    pins, and pointlessly large for large pins. Radius on the other hand,
+    has an optimal value unrelated to the size of the pin: 1.5mm (to combat
+    fatigue). This can't achieved on small pins because then they wouldn't
+    have any thickness, so a compromise has to be made.
+
+    Parameters unaffected by size: strain, nose_angle and all gaps.
+    """
+    return round_size_values(pin_size_values(size, length_width_ratio),
+                             PIN_ROUNDED)
+
+
+def cantilever_size_values(size, length_width_ratio=LENGTH_WIDTH_RATIO):
+    """
+    cantilever_size_parameters() before the rounding.
+    """
+    # Don't allow size to go below 3 mm. Kind of a dirty hack, but avoids
+    # trouble.
+    size = max(size, CANTILEVER_MIN_SIZE)
+    if size <= 0.3:
+        top_radius = 0.03
+    elif size <= 1:
+        top_radius = 0.03 + 0.12*(size - 0.3) / 0.7
+    else:
+        top_radius = 0.15
+
+    return {"length": size * length_width_ratio,
+            "extrusion_distance": size,
+            "top_radius": top_radius,
+            # The thickness of a pin of the same size
+            "thickness": pin_size_values(size)["thickness"]}
+
+
+def cantilever_size_parameters(size, length_width_ratio=LENGTH_WIDTH_RATIO):
+    """
+    The cantilever version of pin_size_parameters(). The top radius grows
+    from 0.3 mm to 1.5 mm between sizes 3 mm and 10 mm, and the thickness is
+    that of a pin of the same size.
+    """
+    return round_size_values(
+        cantilever_size_values(size, length_width_ratio), CANTILEVER_ROUNDED)
+
+
+def round_size_values(values, rounded):
+    """values, with the names in rounded rounded to 4 decimals."""
+    for name in rounded:
+        values[name] = round(values[name], 4)
+    return values
+
+
+# The stages of building a snap, with the parameters each stage reads and
+# the stages it builds on. Stages are listed after the stages they depend
+# on. Used by dirty_stages to find what a parameter change affects.
+CANTILEVER_STAGES = {
+    "offsets": (("thickness", "length", "extrusion_distance", "x_location",
+                 "y_location"), ()),
+    "join_profile": (("top_radius", "thickness", "length", "strain",
+                      "nose_angle"), ()),
+    "cut_profile": (("top_radius", "thickness", "length", "strain",
+                     "nose_angle", "length_gap", "width_gap",
+                     "extra_length"), ()),
+    "join_extrude": (join_extent_parameters(CANTILEVER_GAP_IN_CUT_BODY),
+                     ("join_profile",)),
+    "cut_extrude": (("extrusion_distance", "extrusion_gap"),
+                    ("cut_profile",)),
+}
+
+PIN_STAGES = {
+    "offsets": (("extrusion_distance", "extrusion_gap", "width",
+                 "x_location", "y_location"), ()),
+    "join_profile": (("thickness", "length", "length_gap", "width",
+                      "width_gap", "middle_padding", "ledge", "strain",
+                      "pin_prestrain", "nose_angle"), ()),
+    "cut_profile": (("thickness", "length", "strain", "pin_prestrain",
+                     "width", "ledge", "middle_padding", "extra_length",
+                     "nose_angle"), ()),
+    "addition_profile": (("thickness", "wall_thickness", "length", "strain",
+                          "pin_prestrain", "width", "middle_padding",
+                          "extra_length", "nose_angle"), ()),
+    "join_extrude": (join_extent_parameters(PIN_GAP_IN_CUT_BODY),
+                     ("join_profile",)),
+    "cut_extrude": (("extrusion_distance", "extrusion_gap"),
+                    ("cut_profile",)),
+    "addition_extrude": (("extrusion_distance", "wall_thickness"),
+                         ("addition_profile",)),
+    "guide_lines": (("width", "length"), ()),
+}
+
+
+def stage_parameters(stages):
+    """
+    The parameters each stage reads, also through the stages it builds on.
+    The profile cache keys a stage's results on only these.
+    :param stages: CANTILEVER_STAGES or PIN_STAGES.
+    :return: Dict from stage name to a tuple of parameter names.
+    """
+    result = {}
+    for stage, (parameters, inputs) in stages.items():
+        names = set(parameters)
+        for input_stage in inputs:
+            names.update(result[input_stage])
+        result[stage] = tuple(sorted(names))
+    return result
+
+
+CANTILEVER_STAGE_PARAMETERS = stage_parameters(CANTILEVER_STAGES)
+PIN_STAGE_PARAMETERS = stage_parameters(PIN_STAGES)
+
+
+def changed_parameters(previous, current):
+    """
+    Names of the parameters that differ between two parameter sets, after
+    the same rounding the profile cache uses.
+    """
+    previous = dict(parameter_key(previous))
+    current = dict(parameter_key(current))
+    return {name for name in previous.keys() | current.keys()
+            if previous.get(name) != current.get(name)}
+
+
+def dirty_stages(stages, previous, current):
+    """
+    The stages that have to be run again when the parameters change from
+    previous to current.
+    :param stages: CANTILEVER_STAGES or PIN_STAGES.
+    :param previous: The parameters of the last run, or None if there was
+        none, in which case every stage is dirty.
+    :param current: The new parameters.
+    :return: Set of stage names.
+    """
+    if previous is None:
+        return set(stages)
+    changed = changed_parameters(previous, current)
+    dirty = set()
+    for stage, (parameters, inputs) in stages.items():
+        if changed.intersection(parameters) or dirty.intersection(inputs):
+            dirty.add(stage)
+    return dirty
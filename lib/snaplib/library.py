@@ -0,0 +1,317 @@
+"""
+SQLite profile library, for when the profile JSON files get too big.
+
+Cantilever.json and Pin.json are parsed in full each time they are loaded.
+With hundreds of printer and material specific profiles, the library keeps
+them in an SQLite database instead (stdlib sqlite3), one row per profile or
+gap profile, indexed by name, tag, material and printer. search() does
+prefix searches on the name and pages through the results with a keyset
+(after=the last name of the previous page), so a page costs the same no
+matter how many profiles there are.
+
+profile_data() and save_profile_data() convert to and from the dictionary
+the commands use, so the dialogs work the same with either backend. Turned
+on by the "profile_library" setting. tools/migrate_profiles.py imports
+existing JSON files.
+
+No adsk imports, so the library can be used outside Fusion.
+"""
+
+import json
+import logging
+import sqlite3
+import sys
+from pathlib import Path
+
+LIBRARY_NAME = "profiles.sqlite3"
+# The two kinds of profiles, which are also the table names.
+KINDS = ("profiles", "gap_profiles")
+PAGE_SIZE = 50
+SCHEMA_VERSION = 2
+# Metadata columns that can be filtered on.
+METADATA = ("tag", "material", "printer")
+
+_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    snap_type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    tag TEXT,
+    material TEXT,
+    printer TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snap_type, name)
+);
+CREATE INDEX IF NOT EXISTS {table}_tag ON {table} (snap_type, tag, name);
+CREATE INDEX IF NOT EXISTS {table}_material
+    ON {table} (snap_type, material, name);
+CREATE INDEX IF NOT EXISTS {table}_printer
+    ON {table} (snap_type, printer, name);
+"""
+SCHEMA = "".join(_TABLE.format(table=table) for table in KINDS) + """
+CREATE TABLE IF NOT EXISTS defaults (
+    snap_type TEXT PRIMARY KEY,
+    default_profile TEXT NOT NULL,
+    default_gap_profile TEXT
+);
+"""
+# Schema 1 had default_gap_profile NOT NULL, but it is None after the
+# default gap profile is deleted. SQLite can't drop the constraint in place.
+MIGRATE_1 = """
+ALTER TABLE defaults RENAME TO defaults_1;
+CREATE TABLE defaults (
+    snap_type TEXT PRIMARY KEY,
+    default_profile TEXT NOT NULL,
+    default_gap_profile TEXT
+);
+INSERT INTO defaults SELECT * FROM defaults_1;
+DROP TABLE defaults_1;
+"""
+
+# Library by database path, see open_library().
+_libraries = {}
+
+
+class LibraryException(Exception):
+    pass
+
+
+def _table(kind):
+    # Table names can't be query parameters
+    if kind not in KINDS:
+        raise LibraryException(f"Unknown profile kind '{kind}', should be "
+                               f"one of {KINDS}.")
+    return kind
+
+
+def _prefix_end(prefix):
+    """
+    The first string after every string that starts with prefix, or None
+    if there is none.
+    """
+    # Trailing U+10FFFF can't be incremented, the character before it is
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _dumps(values):
+    return json.dumps(values, sort_keys=True, separators=(",", ":"))
+
+
+class ProfileLibrary:
+    """
+    Profiles and gap profiles of every snap type in one database file.
+    """
+    def __init__(self, path):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.path = Path(path)
+        self.connection = sqlite3.connect(str(self.path))
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise LibraryException(f"{self.path.name} was made by a newer "
+                                   f"version (schema {version}).")
+        with self.connection:
+            if version == 1:
+                self.connection.executescript(MIGRATE_1)
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    def has_snap_type(self, snap_type):
+        """True if profiles of snap_type were imported or saved."""
+        row = self.connection.execute(
+            "SELECT 1 FROM defaults WHERE snap_type = ?",
+            (snap_type,)).fetchone()
+        return row is not None
+
+    def get(self, snap_type, name, kind="profiles"):
+        """:return: The values of a profile, or None."""
+        row = self.connection.execute(
+            f"SELECT data FROM {_table(kind)} "
+            f"WHERE snap_type = ? AND name = ?", (snap_type, name)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _where(self, snap_type, prefix, filters):
+        clauses = ["snap_type = ?"]
+        arguments = [snap_type]
+        for column, value in filters.items():
+            if column not in METADATA:
+                raise LibraryException(f"Can't filter on '{column}'.")
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                arguments.append(value)
+        if prefix:
+            # A range, so that the name index is used
+            clauses.append("name >= ?")
+            arguments.append(prefix)
+            end = _prefix_end(prefix)
+            if end is not None:
+                clauses.append("name < ?")
+                arguments.append(end)
+        return " AND ".join(clauses), arguments
+
+    def search(self, snap_type, prefix="", kind="profiles", after=None,
+               limit=PAGE_SIZE, **filters):
+        """
+        One page of profile names, in name order.
+        :param prefix: Only names that start with prefix.
+        :param after: The last name of the previous page, or None for the
+            first page.
+        :param filters: tag, material or printer values to match.
+        :return: List of names, shorter than limit on the last page.
+        """
+        where, arguments = self._where(snap_type, prefix, filters)
+        if after is not None:
+            where += " AND name > ?"
+            arguments.append(after)
+        rows = self.connection.execute(
+            f"SELECT name FROM {_table(kind)} WHERE {where} "
+            f"ORDER BY name LIMIT ?", arguments + [limit])
+        return [name for name, in rows]
+
+    def count(self, snap_type, prefix="", kind="profiles", **filters):
+        where, arguments = self._where(snap_type, prefix, filters)
+        return self.connection.execute(
+            f"SELECT COUNT(*) FROM {_table(kind)} WHERE {where}",
+            arguments).fetchone()[0]
+
+    def put(self, snap_type, name, values, kind="profiles", tag=None,
+            material=None, printer=None):
+        """Adds or replaces a profile."""
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {_table(kind)} "
+                f"(snap_type, name, tag, material, printer, data) "
+                f"VALUES (?, ?, ?, ?, ?, ?)",
+                (snap_type, name, tag, material, printer, _dumps(values)))
+
+    def delete(self, snap_type, name, kind="profiles"):
+        with self.connection:
+            self.connection.execute(
+                f"DELETE FROM {_table(kind)} WHERE snap_type = ? AND name = ?",
+                (snap_type, name))
+
+    def profile_data(self, snap_type):
+        """
+        The profiles of snap_type in the layout of the JSON files.
+        :return: Dictionary with default_profile, default_gap_profile,
+            profiles and gap_profiles.
+        """
+        row = self.connection.execute(
+            "SELECT default_profile, default_gap_profile FROM defaults "
+            "WHERE snap_type = ?", (snap_type,)).fetchone()
+        if row is None:
+            raise LibraryException(f"No {snap_type} profiles in "
+                                   f"{self.path.name}.")
+        profile_data = {"default_profile": row[0],
+                        "default_gap_profile": row[1]}
+        for kind in KINDS:
+            rows = self.connection.execute(
+                f"SELECT name, data FROM {kind} WHERE snap_type = ? "
+                f"ORDER BY name", (snap_type,))
+            profile_data[kind] = {name: json.loads(data)
+                                  for name, data in rows}
+        return profile_data
+
+    def save_profile_data(self, snap_type, profile_data, **metadata):
+        """
+        Writes the profiles in profile_data that differ from the library, and
+        deletes the ones that are not in it, in one transaction.
+        :param metadata: tag, material and printer of new profiles.
+        :return: The number of profiles written or deleted.
+        """
+        changes = 0
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO defaults "
+                "(snap_type, default_profile, default_gap_profile) "
+                "VALUES (?, ?, ?)",
+                (snap_type, profile_data["default_profile"],
+                 profile_data["default_gap_profile"]))
+            for kind in KINDS:
+                stored = dict(self.connection.execute(
+                    f"SELECT name, data FROM {kind} WHERE snap_type = ?",
+                    (snap_type,)))
+                profiles = profile_data[kind]
+                for name, values in profiles.items():
+                    data = _dumps(values)
+                    if stored.get(name) == data:
+                        continue
+                    if name in stored:
+                        self.connection.execute(
+                            f"UPDATE {kind} SET data = ? "
+                            f"WHERE snap_type = ? AND name = ?",
+                            (data, snap_type, name))
+                    else:
+                        self.connection.execute(
+                            f"INSERT INTO {kind} (snap_type, name, tag, "
+                            f"material, printer, data) "
+                            f"VALUES (?, ?, ?, ?, ?, ?)",
+                            (snap_type, name, metadata.get("tag"),
+                             metadata.get("material"),
+                             metadata.get("printer"), data))
+                    changes += 1
+                removed = [(snap_type, name) for name in stored
+                           if name not in profiles]
+                self.connection.executemany(
+                    f"DELETE FROM {kind} WHERE snap_type = ? AND name = ?",
+                    removed)
+                changes += len(removed)
+        self.logger.debug(f"Saved {changes} {snap_type} profile changes.")
+        return changes
+
+    def import_json(self, snap_type, path, replace=False, **metadata):
+        """
+        Imports a profile JSON file.
+        :param replace: True to delete the snap type's profiles that are not
+            in the file. Otherwise they are kept, and the file's profiles
+            replace those with the same name.
+        :param metadata: tag, material and printer of the imported profiles.
+        :return: The number of profiles written or deleted.
+        """
+        with open(path, "r") as f:
+            profile_data = json.load(f)
+        missing = [key for key in ("default_profile", "default_gap_profile")
+                   + KINDS if key not in profile_data]
+        if missing:
+            raise LibraryException(f"{Path(path).name} has no {missing}.")
+        names = {kind: list(profile_data[kind]) for kind in KINDS}
+        if not replace and self.has_snap_type(snap_type):
+            current = self.profile_data(snap_type)
+            for kind in KINDS:
+                current[kind].update(profile_data[kind])
+            current["default_profile"] = profile_data["default_profile"]
+            current["default_gap_profile"] = \
+                profile_data["default_gap_profile"]
+            profile_data = current
+        changes = self.save_profile_data(snap_type, profile_data, **metadata)
+        metadata = {column: value for column, value in metadata.items()
+                    if value is not None}
+        if metadata:
+            # Also for the profiles whose values were already there
+            assignments = ", ".join(f"{column} = ?" for column in metadata)
+            with self.connection:
+                for kind in KINDS:
+                    self.connection.executemany(
+                        f"UPDATE {kind} SET {assignments} "
+                        f"WHERE snap_type = ? AND name = ?",
+                        [list(metadata.values()) + [snap_type, name]
+                         for name in names[kind]])
+        return changes
+
+
+def open_library(path):
+    """The shared ProfileLibrary of a database file, opened once."""
+    path = Path(path)
+    if path not in _libraries:
+        _libraries[path] = ProfileLibrary(path)
+    return _libraries[path]
+
+
+def close_all():
+    for library in _libraries.values():
+        library.close()
+    _libraries.clear()
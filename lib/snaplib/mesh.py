@@ -0,0 +1,277 @@
+"""
+Triangle meshes of the extruded profiles, for drawing previews as custom
+graphics instead of building the bodies.
+
+The profiles are sketched on the xZ construction plane of the snap
+component, so a sketch point (x, y) extruded a distance e along the sketch
+normal ends up at (x, e, -y) in the component. Meshes are given in component
+coordinates. Like kernel.py, this module does not import adsk.
+"""
+
+import math
+from array import array
+
+from .normalize import normalize_profile
+
+# Number of straight pieces used for a quarter circle.
+ARC_SEGMENTS_PER_QUARTER = 6
+
+
+class Mesh:
+    """
+    Flat arrays in the layout custom graphics meshes use: x, y, z
+    coordinates, one normal vector per coordinate, and three coordinate
+    indexes per triangle.
+    """
+    __slots__ = ("coordinates", "normals", "triangles")
+
+    def __init__(self):
+        self.coordinates = array("d")
+        self.normals = array("d")
+        self.triangles = array("i")
+
+    @property
+    def vertex_count(self):
+        return len(self.coordinates) // 3
+
+    @property
+    def triangle_count(self):
+        return len(self.triangles) // 3
+
+    def add_face(self, points, normal, triangles):
+        """
+        Adds a flat face.
+        :param points: (x, y, z) tuples.
+        :param normal: Normal vector of the face.
+        :param triangles: Index triples into points.
+        """
+        offset = self.vertex_count
+        for point in points:
+            self.coordinates.extend(point)
+            self.normals.extend(normal)
+        for triangle in triangles:
+            self.triangles.extend(index + offset for index in triangle)
+
+    def mirrored_x(self):
+        """A copy mirrored across the yZ plane."""
+        mirrored = Mesh()
+        mirrored.coordinates = array("d", self.coordinates)
+        mirrored.coordinates[0::3] = array(
+            "d", [-x for x in self.coordinates[0::3]])
+        mirrored.normals = array("d", self.normals)
+        mirrored.normals[0::3] = array("d", [-x for x in self.normals[0::3]])
+        # Mirroring flips the orientation of every triangle.
+        mirrored.triangles = array("i", self.triangles)
+        mirrored.triangles[1::3] = self.triangles[2::3]
+        mirrored.triangles[2::3] = self.triangles[1::3]
+        return mirrored
+
+    def __repr__(self):
+        return (f"{type(self).__name__}(vertices={self.vertex_count}, "
+                f"triangles={self.triangle_count})")
+
+
+def arc_points(start, center, sweep_angle):
+    """
+    Points along an arc, excluding the start point.
+    :param start: (x, y) start of the arc.
+    :param center: (x, y) center of the arc.
+    :param sweep_angle: Radians, counter-clockwise if positive.
+    """
+    cx, cy = center
+    sx, sy = start
+    radius = math.hypot(sx - cx, sy - cy)
+    angle = math.atan2(sy - cy, sx - cx)
+    count = max(1, math.ceil(abs(sweep_angle) / (math.pi / 2)
+                             * ARC_SEGMENTS_PER_QUARTER))
+    return [(cx + radius * math.cos(angle + sweep_angle * i / count),
+             cy + radius * math.sin(angle + sweep_angle * i / count))
+            for i in range(1, count + 1)]
+
+
+def _closest_point(profile, x, y):
+    distances = [math.hypot(x - px, y - py) for px, py in profile.points()]
+    index = min(range(len(distances)), key=distances.__getitem__)
+    return index, distances[index]
+
+
+def edge_loops(profile, tolerance=1e-6):
+    """
+    Orders the lines and arcs of a profile into closed loops.
+    :param profile: kernel.SketchProfile
+    :param tolerance: Largest distance between an arc end and the point it
+        connects to.
+    :return: List of loops, each a list of edges (start, end, arc). start and
+        end are (x, y) tuples, and arc is None for a line, or (center,
+        sweep_angle) with the sweep going from start to end.
+    """
+    profile, _ = normalize_profile(profile, tolerance)
+
+    # Edges as (other end, arc), stored in both directions
+    edges = {}
+
+    def connect(p0, p1, arc):
+        edges.setdefault(p0, []).append((p1, arc))
+        if arc is not None:
+            center, sweep_angle = arc
+            arc = (center, -sweep_angle)
+        edges.setdefault(p1, []).append((p0, arc))
+
+    for p0, p1 in profile.point_pairs():
+        connect(p0, p1, None)
+    for center, start, sweep_angle in profile.arcs():
+        end_point = arc_points(profile.point(start), profile.point(center),
+                               sweep_angle)[-1]
+        end, distance = _closest_point(profile, *end_point)
+        if distance > tolerance:
+            # The arc does not end in a point of the profile, so it does not
+            # close a loop.
+            continue
+        connect(start, end, (profile.point(center), sweep_angle))
+
+    loops = []
+    used = set()
+    for first in list(edges):
+        for other, arc in edges[first]:
+            if (first, other) in used:
+                continue
+            loop = [(first, other, arc)]
+            used.add((first, other))
+            used.add((other, first))
+            current = other
+            while current != first:
+                candidates = [(next_point, next_arc)
+                              for next_point, next_arc in edges[current]
+                              if (current, next_point) not in used]
+                if not candidates:
+                    break
+                next_point, next_arc = candidates[0]
+                used.add((current, next_point))
+                used.add((next_point, current))
+                loop.append((current, next_point, next_arc))
+                current = next_point
+            if current == first:
+                loops.append([(profile.point(start), profile.point(end), arc)
+                              for start, end, arc in loop])
+    return loops
+
+
+def profile_loops(profile, tolerance=1e-6):
+    """
+    The closed loops of a profile as polygons, with the arcs split into
+    straight pieces.
+    :param profile: kernel.SketchProfile
+    :param tolerance: See edge_loops().
+    :return: List of loops, each a list of (x, y) tuples without the closing
+        point.
+    """
+    loops = []
+    for edges in edge_loops(profile, tolerance):
+        loop = []
+        for start, end, arc in edges:
+            loop.append(start)
+            if arc is not None:
+                center, sweep_angle = arc
+                loop.extend(arc_points(start, center, sweep_angle)[:-1])
+        if len(loop) >= 3:
+            loops.append(loop)
+    return loops
+
+
+def signed_area(loop):
+    area = 0.0
+    for i, (x0, y0) in enumerate(loop):
+        x1, y1 = loop[i - 1]
+        area += x1 * y0 - x0 * y1
+    return area / 2
+
+
+def _point_in_triangle(p, a, b, c):
+    def side(p0, p1, p2):
+        return (p1[0] - p0[0]) * (p2[1] - p0[1]) \
+               - (p1[1] - p0[1]) * (p2[0] - p0[0])
+    return side(a, b, p) >= 0 and side(b, c, p) >= 0 and side(c, a, p) >= 0
+
+
+def triangulate(loop):
+    """
+    Ear clipping triangulation of a simple polygon.
+    :param loop: (x, y) tuples in counter-clockwise order.
+    :return: List of index triples, counter-clockwise.
+    """
+    remaining = list(range(len(loop)))
+    triangles = []
+    guard = 0
+    while len(remaining) > 3 and guard < len(remaining):
+        n = len(remaining)
+        for i in range(n):
+            i0, i1, i2 = remaining[i - 1], remaining[i], remaining[(i + 1) % n]
+            a, b, c = loop[i0], loop[i1], loop[i2]
+            cross = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+            if cross < 0:
+                continue  # Reflex corner
+            if cross == 0:
+                # Collinear corner, it adds nothing to the area.
+                remaining.pop(i)
+                guard = 0
+                break
+            if any(_point_in_triangle(loop[j], a, b, c) for j in remaining
+                   if j not in (i0, i1, i2)):
+                continue
+            triangles.append((i0, i1, i2))
+            remaining.pop(i)
+            guard = 0
+            break
+        else:
+            # No ear found, which only happens for self-intersecting loops.
+            guard += 1
+            remaining.append(remaining.pop(0))
+    if len(remaining) == 3:
+        triangles.append(tuple(remaining))
+    return triangles
+
+
+def extrude_profile(profile, start, end):
+    """
+    Meshes the closed loops of a profile extruded from start to end along
+    the sketch normal.
+    :param profile: kernel.SketchProfile
+    :return: Mesh in component coordinates.
+    """
+    mesh = Mesh()
+    for loop in profile_loops(profile):
+        if signed_area(loop) < 0:
+            loop = loop[::-1]
+        triangles = triangulate(loop)
+
+        mesh.add_face([(x, end, -y) for x, y in loop], (0, 1, 0), triangles)
+        mesh.add_face([(x, start, -y) for x, y in loop], (0, -1, 0),
+                      [(a, c, b) for a, b, c in triangles])
+
+        for i, (x1, y1) in enumerate(loop):
+            x0, y0 = loop[i - 1]
+            length = math.hypot(x1 - x0, y1 - y0)
+            if length == 0:
+                continue
+            # Outward normal of a counter-clockwise loop
+            nx, ny = (y1 - y0) / length, -(x1 - x0) / length
+            mesh.add_face([(x0, start, -y0), (x1, start, -y1),
+                           (x1, end, -y1), (x0, end, -y0)],
+                          (nx, 0, -ny), [(0, 1, 2), (0, 2, 3)])
+    return mesh
+
+
+def joint_frame(offsets):
+    """
+    The transform from component coordinates to the frame of the joint
+    origin the snap is placed at. The snap creates its own joint origin with
+    its x axis along the component y axis, its z axis along the component x
+    axis and the given offsets, and the joint is rotated 180 degrees.
+    :param offsets: (x_offset, y_offset, z_offset) of the joint origin.
+    :return: 16 numbers, a row-major 4x4 matrix.
+    """
+    x_offset, y_offset, z_offset = offsets
+    return [0, -1, 0, x_offset,
+            0, 0, -1, y_offset,
+            1, 0, 0, -z_offset,
+            0, 0, 0, 1]
@@ -0,0 +1,141 @@
+"""
+Removes redundant entities from a SketchProfile before it is drawn.
+
+The profiles in kernel.py are written for readability, so they contain
+coincident points (e.g. the mirrored legs of the pin share their end points),
+points that no line uses, zero-length lines and zero-radius arcs (the
+cantilever with r_bot = 0). Each of these costs at least one call into the
+Fusion API, and the sketch solver has to sort them out afterwards.
+"""
+
+import math
+from array import array
+
+from .kernel import SketchProfile
+
+# Fusion works in centimeters internally. Points closer than this are merged.
+TOLERANCE = 1e-6
+# Arcs with a smaller sweep angle (in radians) than this are dropped.
+ANGLE_TOLERANCE = 1e-9
+
+
+class NormalizationReport:
+    """
+    What normalize_profile removed. Every removed point, line or arc is one
+    API call less when the profile is drawn.
+    """
+    def __init__(self, merged_points=0, unused_points=0, dropped_segments=0,
+                 dropped_arcs=0):
+        self.merged_points = merged_points
+        self.unused_points = unused_points
+        self.dropped_segments = dropped_segments
+        self.dropped_arcs = dropped_arcs
+
+    @property
+    def saved_calls(self):
+        return (self.merged_points + self.unused_points
+                + self.dropped_segments + self.dropped_arcs)
+
+    def __repr__(self):
+        return (f"{type(self).__name__}("
+                f"merged_points={self.merged_points}, "
+                f"unused_points={self.unused_points}, "
+                f"dropped_segments={self.dropped_segments}, "
+                f"dropped_arcs={self.dropped_arcs})")
+
+
+def merge_points(profile, tolerance=TOLERANCE):
+    """
+    Finds the points that lie within tolerance of an earlier point.
+    :param profile: kernel.SketchProfile
+    :param tolerance: Largest distance between two merged points.
+    :return: List with the index of the point each point is merged into.
+        Points that are kept map to themselves.
+    """
+    # Points are bucketed in a grid with cell size tolerance, so only the
+    # neighbouring cells have to be searched.
+    grid = {}
+    representatives = []
+    for index, (x, y) in enumerate(profile.points()):
+        cell_x = round(x / tolerance)
+        cell_y = round(y / tolerance)
+        found = index
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in grid.get((cell_x + dx, cell_y + dy), ()):
+                    other_x, other_y = profile.point(other)
+                    if math.hypot(x - other_x, y - other_y) <= tolerance:
+                        found = other
+                        break
+                if found != index:
+                    break
+            if found != index:
+                break
+        if found == index:
+            grid.setdefault((cell_x, cell_y), []).append(index)
+        representatives.append(found)
+    return representatives
+
+
+def normalize_profile(profile, tolerance=TOLERANCE,
+                      angle_tolerance=ANGLE_TOLERANCE):
+    """
+    Merges coincident points, drops zero-length and duplicate lines,
+    zero-radius and zero-sweep arcs, and points that are no longer used by
+    any line or arc. The kept entities stay in their original order.
+    :param profile: kernel.SketchProfile
+    :param tolerance: Distance below which points are considered coincident.
+    :param angle_tolerance: Sweep angle below which arcs are dropped.
+    :return: (SketchProfile, NormalizationReport)
+    """
+    representatives = merge_points(profile, tolerance)
+    report = NormalizationReport()
+    report.merged_points = sum(1 for index, kept in enumerate(representatives)
+                               if index != kept)
+
+    segments = []
+    seen = set()
+    for p0, p1 in profile.point_pairs():
+        p0 = representatives[p0]
+        p1 = representatives[p1]
+        key = (min(p0, p1), max(p0, p1))
+        if p0 == p1 or key in seen:
+            report.dropped_segments += 1
+            continue
+        seen.add(key)
+        segments.append((p0, p1))
+
+    arcs = []
+    for center, start, sweep_angle in profile.arcs():
+        center = representatives[center]
+        start = representatives[start]
+        if center == start or abs(sweep_angle) < angle_tolerance:
+            report.dropped_arcs += 1
+            continue
+        arcs.append((center, start, sweep_angle))
+
+    used = set()
+    for p0, p1 in segments:
+        used.add(p0)
+        used.add(p1)
+    for center, start, _ in arcs:
+        used.add(center)
+        used.add(start)
+
+    new_indexes = {}
+    coordinates = array("d")
+    for index, kept in enumerate(representatives):
+        if index != kept:
+            continue
+        if index not in used:
+            report.unused_points += 1
+            continue
+        new_indexes[index] = len(new_indexes)
+        coordinates.extend(profile.point(index))
+
+    normalized = SketchProfile(
+        coordinates,
+        array("i", [new_indexes[p] for pair in segments for p in pair]),
+        array("i", [new_indexes[p] for arc in arcs for p in arc[:2]]),
+        array("d", [arc[2] for arc in arcs]))
+    return normalized, report
@@ -0,0 +1,184 @@
+"""
+Snaps driven by Fusion user parameters.
+
+With the "user_parameters" setting on, the strain, thickness, extrusion
+distance and gaps of a new snap are taken from user parameters named after
+the snap type, e.g. pin_width_gap, which are made with the dialog's values
+the first time. The extrudes of the snap get expressions of those
+parameters, equivalent to kernel.join_extent() and friends, so Fusion
+recomputes them by itself.
+
+The profile formulas are not written as sketch dimensions. Instead,
+events.ParameterChangeHandler calls refresh() when the Change Parameters
+dialog closes, which moves the sketch points of every snap whose
+parameters changed, with edit.py. Changing width_gap for all the pins in a
+design is then one parameter edit.
+"""
+
+import json
+import logging
+
+import adsk.core
+import adsk.fusion
+
+from . import configure
+from . import edit
+from . import kernel
+from . import registry
+from .geometry import Cantilever, Pin
+from .timing import span
+
+# Parameters that are taken from user parameters, with their units.
+BOUND_PARAMETERS = {
+    "strain": "",
+    "thickness": "mm",
+    "extrusion_distance": "mm",
+    "width_gap": "mm",
+    "length_gap": "mm",
+    "extrusion_gap": "mm",
+    "extra_length": "mm",
+}
+PREFIXES = {Cantilever.component_name: "cantilever",
+            Pin.component_name: "pin"}
+BINDINGS_NAME = "user_parameters"
+
+
+def enabled(design):
+    """True if new snaps in design are to be driven by user parameters."""
+    return configure.get_setting("user_parameters") \
+        and design.designType == adsk.fusion.DesignTypes.ParametricDesignType
+
+
+def user_parameter_name(snap_type, name):
+    return f"{PREFIXES[snap_type]}_{name}"
+
+
+def apply_user_parameters(design, snap_type, parameters, create=True):
+    """
+    Makes the user parameters that don't exist yet, with the values in
+    parameters, and takes the values of those that do.
+    :param create: False to only take the values, e.g. in preview.
+    :return: (parameters with the user parameter values, bindings), where
+        bindings maps parameter names to user parameter names.
+    """
+    parameters = dict(parameters)
+    bindings = {}
+    user_parameters = design.userParameters
+    for name, units in BOUND_PARAMETERS.items():
+        if name not in parameters:
+            continue
+        user_name = user_parameter_name(snap_type, name)
+        user_parameter = user_parameters.itemByName(user_name)
+        if user_parameter is None and not create:
+            continue
+        if user_parameter is None:
+            user_parameters.add(
+                user_name, adsk.core.ValueInput.createByReal(
+                    parameters[name]),
+                units, f"Snap Generator: {name} of every driven "
+                       f"{snap_type.lower()}")
+        else:
+            parameters[name] = user_parameter.value
+        bindings[name] = user_name
+    return parameters, bindings
+
+
+def _term(name, parameters, bindings):
+    if name in bindings:
+        return bindings[name]
+    # The extent parameters are all lengths, in cm like every value
+    return f"({parameters[name]} cm)"
+
+
+def extent_expressions(snap_class, stage, parameters, bindings):
+    """
+    The extent of a stage's extrude as expressions, same as
+    kernel.join_extent(), cut_extent() and addition_extent().
+    :return: (start offset expression or None, distance expression)
+    """
+    distance = _term("extrusion_distance", parameters, bindings)
+    gap = _term("extrusion_gap", parameters, bindings)
+    if stage == "join":
+        if snap_class.gap_in_cut_body:
+            return None, distance
+        return None, f"{distance} - 2 * {gap}"
+    if stage == "cut":
+        if snap_class.gap_in_cut_body:
+            return f"-{gap}", f"{distance} + 2 * {gap}"
+        return f"-{gap}", distance
+    wall = _term("wall_thickness", parameters, bindings)
+    return f"-{wall}", f"{distance} + 2 * {wall}"
+
+
+def _set_expressions(component, snap_type, parameters, bindings):
+    snap_class = edit.SNAP_CLASSES[snap_type]
+    for stage, extrudes in edit.stage_extrudes(component).items():
+        start, distance = extent_expressions(snap_class, stage, parameters,
+                                             bindings)
+        for extrude in extrudes:
+            extent = adsk.fusion.DistanceExtentDefinition.cast(
+                extrude.extentOne)
+            extent.distance.expression = distance
+            offset = adsk.fusion.OffsetStartDefinition.cast(
+                extrude.startExtent)
+            if offset and start:
+                offset.offset.expression = start
+
+
+def drive(component, snap_type, parameters, bindings):
+    """
+    Drives the extrudes of a new snap component by the user parameters.
+    :param bindings: From apply_user_parameters().
+    """
+    with span("parametric"):
+        component.attributes.add(registry.ATTRIBUTE_GROUP, BINDINGS_NAME,
+                                 json.dumps(bindings))
+        _set_expressions(component, snap_type, parameters, bindings)
+
+
+def bindings_of(component):
+    """:return: The bindings of a driven component, or None."""
+    attribute = component.attributes.itemByName(registry.ATTRIBUTE_GROUP,
+                                                BINDINGS_NAME)
+    return json.loads(attribute.value) if attribute else None
+
+
+def edit_snap(component, parameters):
+    """
+    edit.edit_snap(), for driven and other snaps. The extrudes of a driven
+    snap get new expressions instead of new values.
+    """
+    bindings = bindings_of(component)
+    if bindings is None:
+        return edit.edit_snap(component, parameters)
+    snap_type, _ = registry.stored_parameters(component)
+    stages = edit.edit_snap(component, parameters, set_extents=False)
+    _set_expressions(component, snap_type, parameters, bindings)
+    return stages
+
+
+def refresh(design):
+    """
+    Updates the sketches of the driven snaps whose user parameters changed.
+    :return: The number of snaps updated.
+    """
+    updated = 0
+    user_parameters = design.userParameters
+    for attribute in design.findAttributes(registry.ATTRIBUTE_GROUP,
+                                           BINDINGS_NAME):
+        component = adsk.fusion.Component.cast(attribute.parent)
+        if not component or not component.isValid:
+            continue
+        snap_type, parameters = registry.stored_parameters(component)
+        current = dict(parameters)
+        for name, user_name in json.loads(attribute.value).items():
+            user_parameter = user_parameters.itemByName(user_name)
+            if user_parameter:
+                current[name] = user_parameter.value
+        if not kernel.changed_parameters(parameters, current):
+            continue
+        with span("parametric", "refresh"):
+            edit.edit_snap(component, current, set_extents=False)
+        updated += 1
+    logging.debug(f"{updated} snaps updated from user parameters.")
+    return updated
@@ -0,0 +1,102 @@
+"""
+Registry of the snap components already in the design.
+
+Every component the geometry classes build on their own, without joining
+into or cutting other bodies, is tagged with an attribute holding the snap
+type and a hash of its parameters. When an identical snap is made again, the
+geometry classes add a new occurrence of the tagged component instead of
+building the sketches and bodies once more. The attributes are saved with
+the design, so the registry survives closing and reopening it.
+
+Every snap component built with features also stores its parameters, and
+its sketches are tagged with the stage they draw, so that edit.py can
+change the snap in place.
+"""
+
+import json
+
+import adsk.core
+import adsk.fusion
+
+from .cache import parameter_hash
+
+ATTRIBUTE_GROUP = "snap_generator"
+ATTRIBUTE_NAME = "snap_key"
+PARAMETERS_NAME = "parameters"
+STAGE_NAME = "stage"
+
+
+def snap_key(snap_type, parameters):
+    """
+    :param snap_type: The component_name of the geometry class.
+    :param parameters: The parameters given to the geometry class.
+    :return: The string stored in the attribute.
+    """
+    return f"{snap_type}:{parameter_hash(parameters)}"
+
+
+def find_component(design, key):
+    """
+    :param design: The adsk.fusion.Design to search.
+    :param key: Key from snap_key().
+    :return: The component tagged with key, or None.
+    """
+    for attribute in design.findAttributes(ATTRIBUTE_GROUP, ATTRIBUTE_NAME):
+        if attribute.value != key:
+            continue
+        component = adsk.fusion.Component.cast(attribute.parent)
+        if component and component.isValid:
+            return component
+    return None
+
+
+def register(component, key):
+    """Tags component so that find_component() finds it by key."""
+    component.attributes.add(ATTRIBUTE_GROUP, ATTRIBUTE_NAME, key)
+
+
+def update_key(component, key):
+    """Changes the key of a registered component, e.g. after an edit."""
+    attribute = component.attributes.itemByName(ATTRIBUTE_GROUP,
+                                                ATTRIBUTE_NAME)
+    if attribute:
+        attribute.value = key
+
+
+def store_parameters(component, snap_type, parameters):
+    """
+    :param component: The snap component.
+    :param snap_type: The component_name of the geometry class.
+    :param parameters: The parameters the component was built with.
+    """
+    value = json.dumps({"snap_type": snap_type, "parameters": parameters})
+    attribute = component.attributes.itemByName(ATTRIBUTE_GROUP,
+                                                PARAMETERS_NAME)
+    if attribute:
+        attribute.value = value
+    else:
+        component.attributes.add(ATTRIBUTE_GROUP, PARAMETERS_NAME, value)
+
+
+def stored_parameters(component):
+    """
+    :return: (snap_type, parameters) from store_parameters(), or None for
+        components that are not snaps.
+    """
+    attribute = component.attributes.itemByName(ATTRIBUTE_GROUP,
+                                                PARAMETERS_NAME)
+    if not attribute:
+        return None
+    stored = json.loads(attribute.value)
+    return stored["snap_type"], stored["parameters"]
+
+
+def tag_stage(sketch, stage):
+    """Tags a sketch with the stage it draws, e.g. "join" or "cut"."""
+    sketch.attributes.add(ATTRIBUTE_GROUP, STAGE_NAME, stage)
+
+
+def stage_of(sketch):
+    """:return: The stage sketch was tagged with, or None."""
+    attribute = sketch.attributes.itemByName(ATTRIBUTE_GROUP, STAGE_NAME)
+    return attribute.value if attribute else None
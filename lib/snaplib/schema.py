@@ -0,0 +1,111 @@
+"""
+Validation of profile data (Cantilever.json, Pin.json or the library).
+
+A ProfileSchema is compiled once per command from its GEOMETRY_PARAMETERS
+and GAP_PARAMETERS, as sets of the parameter ids. validate() goes through
+the profile data once, compares the keys of each profile with set
+operations, and returns every error with the JSON path where it is, instead
+of stopping at the first one. Top level keys other than REQUIRED_KEYS are
+ignored, older files have a few. default_gap_profile may be None, which is
+what ProfileModifier leaves when the default gap profile is deleted.
+
+No adsk imports, so the schema can be used outside Fusion.
+"""
+
+from collections import namedtuple
+
+REQUIRED_KEYS = ("default_profile", "default_gap_profile",
+                 "profiles", "gap_profiles")
+# Parameter values are plain JSON numbers. bool is not one of them.
+NUMBER_TYPES = frozenset((int, float))
+
+
+class SchemaError(namedtuple("SchemaError", ["path", "message"])):
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.path}: {self.message}"
+
+
+def json_path(*keys):
+    """JSON path of nested keys, e.g. $.profiles['PLA 0.2'].thickness."""
+    path = "$"
+    for key in keys:
+        if isinstance(key, str) and key.isidentifier():
+            path += f".{key}"
+        else:
+            path += f"[{key!r}]"
+    return path
+
+
+class ProfileSchema:
+    """
+    The parameter ids a command's profiles and gap profiles must have.
+    """
+    def __init__(self, geometry_parameters, gap_parameters, extra_ids=()):
+        """
+        :param geometry_parameters: GEOMETRY_PARAMETERS of a command, dicts
+            with an "id".
+        :param gap_parameters: GAP_PARAMETERS of the command.
+        :param extra_ids: Ids of geometry parameters that are in the profile
+            file, but not in the command's dialog.
+        """
+        self.keys = {
+            "profiles": frozenset(parameter["id"]
+                                  for parameter in geometry_parameters)
+            | frozenset(extra_ids),
+            "gap_profiles": frozenset(parameter["id"]
+                                      for parameter in gap_parameters),
+        }
+
+    def _validate_profiles(self, kind, profiles, errors):
+        if not isinstance(profiles, dict):
+            errors.append(SchemaError(json_path(kind),
+                                      "should be an object of profiles"))
+            return
+        expected = self.keys[kind]
+        for name, profile in profiles.items():
+            if not isinstance(profile, dict):
+                errors.append(SchemaError(json_path(kind, name),
+                                          "should be an object"))
+                continue
+            keys = profile.keys()
+            if keys != expected:
+                for key in sorted(expected - keys):
+                    errors.append(SchemaError(json_path(kind, name, key),
+                                              "is missing"))
+                for key in sorted(keys - expected):
+                    errors.append(SchemaError(json_path(kind, name, key),
+                                              "is not a parameter"))
+            for key, value in profile.items():
+                if type(value) not in NUMBER_TYPES:
+                    errors.append(SchemaError(
+                        json_path(kind, name, key),
+                        f"should be a number, not {type(value).__name__}"))
+
+    def validate(self, profile_data):
+        """
+        :param profile_data: Parsed profile data.
+        :return: List of SchemaError, empty if the data is valid.
+        """
+        if not isinstance(profile_data, dict):
+            return [SchemaError("$", "should be an object")]
+        errors = [SchemaError(json_path(key), "is missing")
+                  for key in REQUIRED_KEYS if key not in profile_data]
+        for kind in ("profiles", "gap_profiles"):
+            if kind in profile_data:
+                self._validate_profiles(kind, profile_data[kind], errors)
+        for default_key, kind in (("default_profile", "profiles"),
+                                  ("default_gap_profile", "gap_profiles")):
+            if default_key not in profile_data \
+                    or not isinstance(profile_data.get(kind), dict):
+                continue
+            default = profile_data[default_key]
+            if default is None and default_key == "default_gap_profile":
+                # Left after the default gap profile was deleted
+                continue
+            if not isinstance(default, str) \
+                    or default not in profile_data[kind]:
+                errors.append(SchemaError(json_path(default_key),
+                                          f"{default!r} is not in {kind}"))
+        return errors
@@ -0,0 +1,206 @@
+"""
+In-memory copies of the JSON configuration files.
+
+Every dialog used to open and parse its profile file, and get_setting() read
+settings.json for each setting. ProfileStore keeps each file's data after the
+first load and serves it from memory as long as the file's mtime and size
+are unchanged, so a file edited by hand or reset from default_config is read
+again. There is one shared instance, profile_store, used by all commands.
+
+The data is shared: the commands change the profile data in place and mark
+it dirty with mark_dirty(). It is written at most once per FLUSH_INTERVAL,
+and when the dialog closes (flush()). Files are written to a temporary file
+that then replaces the old one, so a crash can't leave half a file, and the
+previous version is kept next to it with a .bak suffix. get() falls back on
+the .bak file when the file is missing or can't be parsed.
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+# Seconds between two writes of a file that keeps being marked dirty.
+FLUSH_INTERVAL = 5.0
+# Separators for files without indentation.
+COMPACT_SEPARATORS = (",", ":")
+
+
+def backup_path(path):
+    return path.with_name(path.name + ".bak")
+
+
+def _dumps(data, indent):
+    if indent is None:
+        return json.dumps(data, separators=COMPACT_SEPARATORS)
+    return json.dumps(data, indent=indent)
+
+
+def write_atomic(path, text):
+    """
+    Writes text to path through a temporary file, keeping the previous
+    file as backup_path(path).
+    """
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    if path.exists():
+        shutil.copyfile(path, backup_path(path))
+    os.replace(temporary, path)
+
+
+class ProfileStore:
+    """
+    JSON files by path, with the stat they were read or written with.
+    """
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.flush_interval = flush_interval
+        # Path to (mtime_ns, size, text, data)
+        self._entries = {}
+        # Path to (data, indent) of the files marked dirty
+        self._pending = {}
+        # Path to time.monotonic() of the last write
+        self._written = {}
+        self.loads = 0
+        self.hits = 0
+        self.writes = 0
+        self.skipped_writes = 0
+        self.dirty_marks = 0
+        self.recoveries = 0
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path):
+        """
+        The data of a JSON file, loaded when the file changed since the last
+        get() or put().
+        :param path: Path of the file.
+        :return: The parsed data. Shared, so changes should be saved with
+            mark_dirty() or put().
+        """
+        path = Path(path)
+        if path in self._pending:
+            # Newer than the file
+            self.hits += 1
+            return self._pending[path][0]
+        try:
+            signature = self._signature(path)
+            entry = self._entries.get(path)
+            if entry is not None and entry[:2] == signature:
+                self.hits += 1
+                return entry[3]
+            with open(path, "r") as f:
+                text = f.read()
+            data = json.loads(text)
+        except (FileNotFoundError, json.JSONDecodeError):
+            restored = self._restore(path)
+            if restored is None:
+                raise
+            text, data = restored
+        self._entries[path] = self._signature(path) + (text, data)
+        self.loads += 1
+        return data
+
+    def _restore(self, path):
+        """
+        Copies the backup of a missing or damaged file over it, if the
+        backup parses.
+        :return: (text, data) of the backup, or None if it is missing or
+            damaged too.
+        """
+        backup = backup_path(path)
+        if not backup.is_file():
+            return None
+        try:
+            with open(backup, "r") as f:
+                text = f.read()
+            data = json.loads(text)
+        except (OSError, json.JSONDecodeError):
+            self.logger.error(f"{path.name} is missing or damaged, and so is "
+                              f"{backup.name}.")
+            return None
+        self.logger.warning(f"{path.name} is missing or damaged, "
+                            f"restoring {backup.name}.")
+        shutil.copyfile(backup, path)
+        self.recoveries += 1
+        return text, data
+
+    def put(self, path, data, indent=None):
+        """
+        Saves data to a JSON file now, unless the file already holds exactly
+        that data.
+        :param indent: None for compact separators.
+        """
+        path = Path(path)
+        self._pending.pop(path, None)
+        text = _dumps(data, indent)
+        entry = self._entries.get(path)
+        if entry is not None and entry[2] == text and path.exists() \
+                and entry[:2] == self._signature(path):
+            self._entries[path] = entry[:3] + (data,)
+            self.skipped_writes += 1
+            return
+        write_atomic(path, text)
+        self._entries[path] = self._signature(path) + (text, data)
+        self._written[path] = time.monotonic()
+        self.writes += 1
+
+    def mark_dirty(self, path, data, indent=None):
+        """
+        Saves data later: at the next flush(), or now if the file was not
+        written in the last flush_interval seconds.
+        """
+        path = Path(path)
+        self._pending[path] = (data, indent)
+        self.dirty_marks += 1
+        last_write = self._written.get(path)
+        if last_write is None \
+                or time.monotonic() - last_write >= self.flush_interval:
+            self.flush(path)
+
+    def flush(self, path=None):
+        """Saves the files marked dirty, or only path."""
+        if path is None:
+            paths = list(self._pending)
+        else:
+            paths = [Path(path)] if Path(path) in self._pending else []
+        for dirty_path in paths:
+            data, indent = self._pending.pop(dirty_path)
+            self.put(dirty_path, data, indent)
+
+    def invalidate(self, path=None):
+        """
+        Forgets one file, or all files when path is None. Changes marked
+        dirty are kept.
+        """
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(Path(path), None)
+
+    def stats(self):
+        return {"loads": self.loads,
+                "hits": self.hits,
+                "writes": self.writes,
+                "skipped_writes": self.skipped_writes,
+                "dirty_marks": self.dirty_marks,
+                "pending": len(self._pending),
+                "recoveries": self.recoveries,
+                "files": len(self._entries)}
+
+    def log_stats(self):
+        self.logger.debug(f"Profile store: {self.stats()}")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+profile_store = ProfileStore()
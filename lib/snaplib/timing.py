@@ -0,0 +1,135 @@
+"""
+Timing of the build stages, written as line-delimited JSON to LOGS_PATH.
+
+A command wraps its build in trace_build(), and the geometry classes wrap
+each stage in span() or decorate it with timed(). Spans are collected in
+memory and written when the build finishes, one line per span plus one line
+for the whole build. Outside of trace_build(), both do nothing.
+"""
+
+import functools
+import json
+import logging
+import logging.handlers
+import time
+import uuid
+from contextlib import contextmanager
+
+from .cache import parameter_hash
+
+LOG_FILE_NAME = "build_timing.jsonl"
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 3
+
+logger = logging.getLogger("snap_generator.timing")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+
+_current = None
+
+
+def set_log_directory(path):
+    """
+    Sends the timing log to a rotating file in path. Called by
+    configure.initialize() with LOGS_PATH.
+    """
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    handler = logging.handlers.RotatingFileHandler(
+        path / LOG_FILE_NAME, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+        encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+
+
+class BuildTrace:
+    def __init__(self, command, preview, parameters=None):
+        self.build_id = uuid.uuid4().hex[:12]
+        self.command = command
+        self.preview = bool(preview)
+        self.parameter_hash = None
+        if parameters is not None:
+            self.parameter_hash = parameter_hash(parameters)
+        self.start = time.perf_counter()
+        self.spans = []
+
+    @contextmanager
+    def span(self, stage, detail=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.spans.append((stage, detail, start, end))
+
+    def records(self, end):
+        common = {"build": self.build_id,
+                  "command": self.command,
+                  "preview": self.preview,
+                  "parameters": self.parameter_hash}
+        for stage, detail, start, stop in self.spans:
+            record = dict(common, stage=stage,
+                          start_ms=round((start - self.start) * 1000, 3),
+                          duration_ms=round((stop - start) * 1000, 3))
+            if detail is not None:
+                record["detail"] = detail
+            yield record
+        yield dict(common, stage="build", time=time.time(), start_ms=0,
+                   duration_ms=round((end - self.start) * 1000, 3))
+
+
+@contextmanager
+def trace_build(command, preview, parameters=None):
+    """
+    Times everything inside the with block as one build.
+    :param command: Name of the command, e.g. "Cantilever".
+    :param preview: True if the build is a preview.
+    :param parameters: The parameters given to the geometry class. Can be
+        left out, since the geometry classes call set_parameters().
+    """
+    global _current
+    trace = BuildTrace(command, preview, parameters)
+    previous, _current = _current, trace
+    try:
+        yield trace
+    finally:
+        _current = previous
+        end = time.perf_counter()
+        if logger.handlers:
+            for record in trace.records(end):
+                logger.info(json.dumps(record, separators=(",", ":")))
+
+
+def set_parameters(parameters):
+    """Records the hash of the parameters of the current build, if any."""
+    if _current is not None:
+        _current.parameter_hash = parameter_hash(parameters)
+
+
+@contextmanager
+def span(stage, detail=None):
+    """
+    Times one stage of the current build.
+    :param stage: component, joint_origin, sketch, extrude, join, cut or
+        remove.
+    :param detail: Optional extra label, e.g. which profile a sketch is.
+    """
+    if _current is None:
+        yield
+        return
+    with _current.span(stage, detail):
+        yield
+
+
+def timed(stage, detail=None):
+    """Decorator version of span(), for methods that make up one stage."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current is None:
+                return function(*args, **kwargs)
+            with _current.span(stage, detail):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
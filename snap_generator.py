@@ -3,12 +3,11 @@ import traceback
 from . import config
 from .apper import apper
 from .lib.snaplib import configure
+from .lib.snaplib import events
+from .lib.snaplib.store import profile_store
 
-from .commands.SimpleCantileverCommand import SimpleCantileverCommand
-from .commands.CantileverCommand import CantileverCommand
-from .commands.SimplePinCommand import SimplePinCommand
-from .commands.PinCommand import PinCommand
-from .commands.SettingsCommand import SettingsCommand
+# The command modules are imported when a command is first opened
+from .commands.LazyCommand import lazy
 
 app = adsk.core.Application.cast(adsk.core.Application.get())
 ui = app.userInterface
@@ -23,7 +22,7 @@ try:
 
     my_addin.add_command(
         'Simple Cantilever',
-        SimpleCantileverCommand,
+        lazy("SimpleCantileverCommand"),
         {
             'cmd_description': 'Create a cantilever snap with few options.',
             'cmd_id': 'simple_cantilever',
@@ -42,7 +41,7 @@ try:
 
     my_addin.add_command(
         'Cantilever',
-        CantileverCommand,
+        lazy("CantileverCommand"),
         {
             'cmd_description': 'Create a cantilever snap shape.'
                                'It may join to a selected body and perform a cut to create a slot in another.'
@@ -64,7 +63,7 @@ try:
 
     my_addin.add_command(
         'Simple Pin',
-        SimplePinCommand,
+        lazy("SimplePinCommand"),
         {
             'cmd_description': 'Create a snap pin using a single parameter.',
             'cmd_id': 'simple_pin',
@@ -83,7 +82,7 @@ try:
 
     my_addin.add_command(
         'Pin',
-        PinCommand,
+        lazy("PinCommand"),
         {
             'cmd_description': 'Create a cantilever snap pin.'
                                ' parameter to get a "standardized" shape that is appropriate for '
@@ -105,9 +104,29 @@ try:
         }
     )
 
+    my_addin.add_command(
+        'Edit Snap',
+        lazy("EditSnapCommand"),
+        {
+            'cmd_description': 'Change the parameters of a snap made earlier.'
+                               ' Only the sketches and features that the '
+                               'changed values affect are updated.',
+            'cmd_id': 'edit_snap',
+            'workspace': 'FusionSolidEnvironment',
+            'toolbar_panel_id': 'SolidCreatePanel',
+            "drop_down_cmd_id": "snap_drop_down",
+            "drop_down_name": "Snap Generator",
+            'toolbar_tab_id': 'SolidTab',
+            'cmd_resources': 'CantileverCommand',
+            'add_to_drop_down': True,
+            'command_visible': True,
+            'command_promoted': False,
+        }
+    )
+
     my_addin.add_command(
         'Settings',
-        SettingsCommand,
+        lazy("SettingsCommand"),
         {
             'cmd_description': 'Settings',
             'cmd_id': 'settings',
@@ -131,7 +150,12 @@ except:
 
 def run(context):
     my_addin.run_app()
+    events.start()
 
 
 def stop(context):
+    events.stop()
+    profile_store.flush()
+    configure.close_library()
+    configure.close_size_catalogs()
     my_addin.stop_app()
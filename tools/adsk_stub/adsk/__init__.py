@@ -0,0 +1,29 @@
+"""
+A recording stand-in for the Fusion 360 API.
+
+Put tools/adsk_stub first on sys.path to import the add-in outside Fusion.
+Every API call is recorded in adsk.recorder, together with a synthetic
+latency, so the number of calls a build makes can be measured and compared.
+Nothing is modelled geometrically: every object returned by the API is a
+Proxy, whose attributes and return values are Proxies again.
+"""
+
+from ._recorder import Proxy, Recorder, recorder
+from . import core, fusion, cam
+
+
+def fake(name):
+    """An API object to pass into the add-in, e.g. a selected body."""
+    return Proxy(name, "fake")
+
+
+def autoTerminate(value):
+    recorder.record("adsk.autoTerminate", (value,))
+
+
+def terminate():
+    recorder.record("adsk.terminate")
+
+
+def doEvents():
+    recorder.record("adsk.doEvents")
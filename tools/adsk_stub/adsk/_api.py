@@ -0,0 +1,49 @@
+"""
+Stand-in API classes, created on first access from the module __getattr__ of
+adsk.core, adsk.fusion and adsk.cam.
+"""
+
+from ._recorder import Proxy, recorder
+
+application = Proxy("Application", "adsk.core")
+
+
+class _ApiClassType(type):
+    """Makes static members such as Point3D.create or FeatureOperations.X
+    available on the stand-in classes."""
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name == "get" and cls.__name__ == "Application":
+            return _static(cls.__name__, name, lambda *args: application)
+        if name == "cast":
+            return _static(cls.__name__, name, lambda obj: obj)
+        # Kept, so that enum members such as DesignTypes.X compare equal
+        member = Proxy(name, cls.__name__)
+        setattr(cls, name, member)
+        return member
+
+
+def _static(class_name, name, function):
+    def member(*args, **kwargs):
+        recorder.record(f"{class_name}.{name}", args, kwargs)
+        return function(*args, **kwargs)
+    return member
+
+
+class ApiObject(metaclass=_ApiClassType):
+    """Base of every stand-in class. Event handlers subclass these."""
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def module_getattr(module_globals):
+    """Returns a module __getattr__ that creates stand-in classes on demand."""
+    def __getattr__(name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        api_class = _ApiClassType(name, (ApiObject,),
+                                  {"__module__": module_globals["__name__"]})
+        module_globals[name] = api_class
+        return api_class
+    return __getattr__
@@ -0,0 +1,171 @@
+"""
+Call recording and the generic stand-in object for the adsk stub.
+"""
+
+import time
+from collections import Counter
+
+# Rough per-call cost of the Fusion API, in seconds. Only used to add up a
+# synthetic "Fusion time" for a build; the stub itself does not sleep unless
+# Recorder.sleep is set.
+LATENCIES = {
+    "occurrences.addNewComponent": 0.030,
+    "occurrences.addExistingComponent": 0.010,
+    "jointOrigins.add": 0.010,
+    "joints.add": 0.020,
+    "sketches.add": 0.010,
+    "sketchPoints.add": 0.0005,
+    "sketchLines.addByTwoPoints": 0.001,
+    "sketchArcs.addByCenterStartSweep": 0.001,
+    "extrudeFeatures.add": 0.050,
+    "combineFeatures.add": 0.080,
+    "removeFeatures.add": 0.020,
+    "mirrorFeatures.add": 0.040,
+    "timelineGroups.add": 0.005,
+    "baseFeatures.add": 0.010,
+    "bRepBodies.add": 0.015,
+    "create().createBody": 0.002,
+    "get().booleanOperation": 0.004,
+}
+DEFAULT_LATENCY = 0.00005
+
+# Calls that add an item to the timeline, and so move the marker.
+TIMELINE_CALLS = {
+    "occurrences.addNewComponent",
+    "occurrences.addExistingComponent",
+    "jointOrigins.add",
+    "joints.add",
+    "sketches.add",
+    "extrudeFeatures.add",
+    "combineFeatures.add",
+    "removeFeatures.add",
+    "mirrorFeatures.add",
+    "baseFeatures.add",
+}
+
+
+class Call:
+    __slots__ = ("name", "args", "kwargs", "latency")
+
+    def __init__(self, name, args, kwargs, latency):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.latency = latency
+
+    def __repr__(self):
+        return f"Call({self.name!r}, args={self.args!r})"
+
+
+class Recorder:
+    """
+    Collects every call made into the stub. Calls are named after the object
+    and method, e.g. "sketchPoints.add" or "Point3D.create". Property
+    assignments are recorded as well, with a trailing "=".
+    """
+    def __init__(self, latencies=None, default_latency=DEFAULT_LATENCY):
+        self.latencies = dict(LATENCIES if latencies is None else latencies)
+        self.default_latency = default_latency
+        self.sleep = False
+        self.calls = []
+        self.timeline_position = 0
+        # Attributes added with attributes.add(), see Proxy.__call__
+        self.attributes = []
+
+    def record(self, name, args=(), kwargs=None):
+        latency = self.latencies.get(name, self.default_latency)
+        self.calls.append(Call(name, args, kwargs or {}, latency))
+        if name in TIMELINE_CALLS:
+            self.timeline_position += 1
+        if self.sleep:
+            time.sleep(latency)
+
+    def reset(self):
+        self.calls = []
+        self.timeline_position = 0
+        self.attributes = []
+
+    def counts(self):
+        return Counter(call.name for call in self.calls)
+
+    def calls_to(self, name):
+        return [call for call in self.calls if call.name == name]
+
+    @property
+    def synthetic_time(self):
+        """Sum of the latencies of all recorded calls, in seconds."""
+        return sum(call.latency for call in self.calls)
+
+
+recorder = Recorder()
+
+
+class Attribute:
+    """What attributes.add() returns and design.findAttributes() finds."""
+    def __init__(self, parent, groupName, name, value):
+        self.parent = parent
+        self.groupName = groupName
+        self.name = name
+        self.value = value
+
+
+class Proxy:
+    """
+    Stands in for any object returned by the API. Every attribute is another
+    Proxy (the same one each time it is read), calling a Proxy records the
+    call, and values that were assigned are returned as assigned. The
+    attributes API is modelled, so that attributes added to an object can be
+    found again.
+    """
+    # Attributes that the add-in uses as numbers.
+    NUMBERS = {"markerPosition", "count", "selectionCount"}
+
+    def __init__(self, name, owner=None, parent=None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_owner", owner)
+        object.__setattr__(self, "_parent", parent)
+        object.__setattr__(self, "_attributes", {})
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        attributes = self._attributes
+        if name not in attributes:
+            if name == "markerPosition":
+                return recorder.timeline_position
+            if name in self.NUMBERS:
+                return 1
+            attributes[name] = Proxy(name, self._name, self)
+        return attributes[name]
+
+    def __setattr__(self, name, value):
+        recorder.record(f"{self._name}.{name}=", (value,))
+        self._attributes[name] = value
+
+    def __call__(self, *args, **kwargs):
+        name = f"{self._owner}.{self._name}"
+        recorder.record(name, args, kwargs)
+        if name == "attributes.add":
+            # self._parent is the attributes collection of the object
+            attribute = Attribute(self._parent._parent, *args)
+            recorder.attributes.append(attribute)
+            return attribute
+        if self._name == "findAttributes":
+            group, attribute_name = args
+            return [attribute for attribute in recorder.attributes
+                    if attribute.groupName == group
+                    and attribute.name == attribute_name]
+        return Proxy(f"{self._name}()", self._owner)
+
+    def __getitem__(self, index):
+        recorder.record(f"{self._name}[]", (index,))
+        return Proxy(f"{self._name}[]", self._name)
+
+    def __iter__(self):
+        return iter(())
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f"<adsk stub {self._owner}.{self._name}>"
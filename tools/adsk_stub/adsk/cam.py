@@ -0,0 +1,5 @@
+"""Stand-in for adsk.cam. Every class is created on first access."""
+
+from ._api import module_getattr
+
+__getattr__ = module_getattr(globals())
@@ -0,0 +1,176 @@
+"""
+Checks the NumPy batch profiles against the kernel and times a large sweep.
+
+Also checks that the batch size parameters are bit for bit the same as the
+kernel's over a dense grid of sizes, the sizes next to every break in the
+formulas, and sizes typed in mm. Run from the repository root, outside of
+Fusion:
+
+    python tools/benchmark_batch.py --rows 100000
+    python tools/benchmark_batch.py --size-step 0.00001
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lib"))
+
+from snaplib import batch, kernel  # noqa: E402
+
+CANTILEVER = {
+    "top_radius": (0, 0.2),
+    "strain": (0.01, 0.04),
+    "extrusion_distance": (0.3, 2),
+    "thickness": (0.1, 0.5),
+    "length": (0.5, 3),
+    "nose_angle": (40, 80),
+    "length_gap": (0, 0.05),
+    "width_gap": (0, 0.05),
+    "extrusion_gap": (0, 0.05),
+    "extra_length": (0, 0.1),
+}
+
+PIN = {
+    "strain": (0.01, 0.03),
+    "pin_prestrain": (0, 0.02),
+    "extrusion_distance": (0.3, 2),
+    "thickness": (0.2, 0.5),
+    "wall_thickness": (0.1, 0.5),
+    "length": (0.8, 2),
+    "width": (1, 1.2),
+    "ledge": (0.05, 0.15),
+    "middle_padding": (0.2, 0.5),
+    "nose_angle": (40, 80),
+    "length_gap": (0, 0.05),
+    "width_gap": (0, 0.05),
+    "extrusion_gap": (0, 0.05),
+    "extra_length": (0, 0.1),
+    "gap_buffer": (0.03, 0.08),
+}
+
+PROFILES = [
+    ("cantilever join", CANTILEVER, kernel.cantilever_join_profile,
+     batch.cantilever_join_profiles),
+    ("cantilever cut", CANTILEVER, kernel.cantilever_cut_profile,
+     batch.cantilever_cut_profiles),
+    ("pin join", PIN, kernel.pin_join_profile, batch.pin_join_profiles),
+    ("pin addition", PIN, kernel.pin_addition_profile,
+     batch.pin_addition_profiles),
+    ("pin cut", PIN, kernel.pin_cut_profile, batch.pin_cut_profiles),
+]
+
+SIZE_FUNCTIONS = [
+    ("pin sizes", kernel.pin_size_parameters, batch.pin_size_columns),
+    ("cantilever sizes", kernel.cantilever_size_parameters,
+     batch.cantilever_size_columns),
+]
+# Where the size formulas change branch, in cm.
+SIZE_BREAKS = (0, 0.3, 1, 1.5)
+
+
+def random_parameters(ranges, rng):
+    return {key: rng.uniform(low, high) for key, (low, high) in ranges.items()}
+
+
+def check(kernel_function, batch_function, ranges, rows, rng):
+    """Returns the largest coordinate deviation from the kernel."""
+    parameter_dicts = [random_parameters(ranges, rng) for _ in range(rows)]
+    result = batch_function(batch.columns_from_parameters(parameter_dicts))
+    reference = [kernel_function(p) for p in parameter_dicts]
+
+    expected = np.array([r.coordinates for r in reference]).reshape(rows, -1, 2)
+    pairs = [tuple(pair) for pair in result["point_pair_indexes"].tolist()]
+    if pairs != list(reference[0].point_pairs()):
+        raise AssertionError("Segment topology differs from the kernel.")
+    sweeps = np.array([r.arc_sweeps for r in reference])
+    if not np.allclose(sweeps.reshape(rows, -1),
+                       result["arc_lines"]["sweep_angles"]):
+        raise AssertionError("Arc sweep angles differ from the kernel.")
+    return float(np.abs(expected - result["points_coordinates"]).max())
+
+
+def check_sizes(kernel_function, batch_function, sizes):
+    """
+    Returns the number of sizes where a batch column is not exactly the
+    kernel value.
+    """
+    result = batch_function(sizes)
+    reference = [kernel_function(size) for size in sizes.tolist()]
+    if list(result) != list(reference[0]):
+        raise AssertionError("Parameter names differ from the kernel.")
+    mismatches = np.zeros(len(sizes), dtype=bool)
+    for name, column in result.items():
+        expected = np.array([values[name] for values in reference])
+        mismatches |= ~((column == expected)
+                        | (np.isnan(column) & np.isnan(expected)))
+    return int(mismatches.sum())
+
+
+def check_grid(step):
+    """The sizes the size functions are checked on."""
+    sizes = [np.arange(-0.5, 12, step)]
+    for size in SIZE_BREAKS:
+        sizes.append(np.array([np.nextafter(size, -np.inf), size,
+                               np.nextafter(size, np.inf)]))
+        sizes.append(size + np.arange(-1000, 1001) * step / 1000)
+    # Typed in mm, with up to two decimals
+    sizes.append(np.array([float(f"{hundredth / 100}") / 10
+                           for hundredth in range(1, 12001)]))
+    sizes.append(np.array([np.nan, -np.inf, np.inf]))
+    return np.concatenate(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="Number of parameter sets in the timed sweep.")
+    parser.add_argument("--check-rows", type=int, default=1000,
+                        help="Number of parameter sets compared to the kernel.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size-step", type=float, default=0.0001,
+                        help="Step in cm of the sizes checked against the "
+                             "kernel.")
+    args = parser.parse_args()
+
+    sizes = check_grid(args.size_step)
+    failed = False
+    for name, kernel_function, batch_function in SIZE_FUNCTIONS:
+        mismatches = check_sizes(kernel_function, batch_function, sizes)
+        failed = failed or mismatches > 0
+
+        columns = np.random.default_rng(0).uniform(0.1, 10, args.rows)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            batch_function(columns)
+        elapsed = (time.perf_counter() - start) / args.repeat
+
+        print(f"{name:16} sizes={len(sizes):<11} "
+              f"mismatches={mismatches:<10} {elapsed * 1000:8.2f} ms")
+
+    rng = random.Random(0)
+    for name, ranges, kernel_function, batch_function in PROFILES:
+        deviation = check(kernel_function, batch_function, ranges,
+                          args.check_rows, rng)
+
+        np_rng = np.random.default_rng(0)
+        columns = {key: np_rng.uniform(low, high, args.rows)
+                   for key, (low, high) in ranges.items()}
+        batch_function(columns)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            points = batch_function(columns)["points_coordinates"]
+        elapsed = (time.perf_counter() - start) / args.repeat
+
+        print(f"{name:16} shape={str(points.shape):18} "
+              f"max deviation={deviation:.2e}  {elapsed * 1000:8.2f} ms")
+    if failed:
+        sys.exit("The batch size parameters differ from the kernel.")
+
+
+if __name__ == "__main__":
+    main()
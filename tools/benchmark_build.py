@@ -0,0 +1,208 @@
+"""
+Runs the build() function of each command against the recording adsk stub.
+
+Counts the Fusion API calls each build makes and times the Python side of
+it, without Fusion. Run from the repository root, with the apper submodule
+checked out (git submodule update --init):
+
+    python tools/benchmark_build.py
+    python tools/benchmark_build.py --save calls.json
+    python tools/benchmark_build.py --compare calls.json
+    python tools/benchmark_build.py --origins 40
+    python tools/benchmark_build.py --direct
+
+--compare exits with status 1 when a build makes more API calls than in the
+saved file.
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import time
+import types
+from pathlib import Path
+
+TOOLS_PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(TOOLS_PATH / "adsk_stub"))
+
+import adsk  # noqa: E402
+
+PACKAGE = "snap_generator"
+COMMANDS = ["SimpleCantileverCommand", "CantileverCommand",
+            "SimplePinCommand", "PinCommand"]
+# Columns of the printed table.
+SUMMARY_CALLS = {"points": "sketchPoints.add",
+                 "lines": "sketchLines.addByTwoPoints",
+                 "extrudes": "extrudeFeatures.add",
+                 "combines": "combineFeatures.add",
+                 "removes": "removeFeatures.add",
+                 "bodies": "bRepBodies.add"}
+ERROR_CALL = "userInterface.messageBox"
+
+
+class ValueInput:
+    def __init__(self, value):
+        self.value = value
+
+
+class DropDownInput:
+    def __init__(self, name):
+        self.selectedItem = types.SimpleNamespace(name=name)
+
+
+class SelectionInput:
+    def __init__(self, entities=()):
+        self.entities = list(entities)
+        self.selectionCount = len(self.entities)
+
+    def selection(self, index):
+        return types.SimpleNamespace(entity=self.entities[index])
+
+
+class CommandInputs:
+    def __init__(self, items):
+        self.items = items
+
+    def itemById(self, input_id):
+        return self.items[input_id]
+
+
+def command_args(command_name, addin_path, selections, origins=1):
+    """
+    The args a build() function receives, with the values of the default
+    profiles in default_config.
+    :param selections: If True, joint origins and bodies are selected.
+    :param origins: Number of selected joint origins.
+    """
+    default_config = addin_path / "default_config"
+    snap_type = "Pin" if "Pin" in command_name else "Cantilever"
+    with open(default_config / f"{snap_type}.json", "r") as f:
+        data = json.load(f)
+    values = dict(data["profiles"][data["default_profile"]])
+    values.update(data["gap_profiles"][data["default_gap_profile"]])
+    values["size"] = 1
+
+    items = {name: ValueInput(value) for name, value in values.items()}
+    items["x_location"] = DropDownInput("middle")
+    items["y_location"] = DropDownInput("top")
+
+    def select(*names):
+        return SelectionInput(adsk.fake(name) for name in names
+                              if selections)
+
+    items["selected_origin"] = select(*["JointOrigin"] * origins)
+    items["join_body"] = select("BRepBody")
+    items["cut_bodies"] = select("BRepBody", "BRepBody")
+    items["target1"] = select("BRepBody")
+    items["target2"] = select("BRepBody")
+
+    command = types.SimpleNamespace(commandInputs=CommandInputs(items))
+    return types.SimpleNamespace(command=command)
+
+
+def import_addin(addin_path):
+    """Imports the add-in folder as a package, the way Fusion does."""
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(addin_path)]
+    sys.modules[PACKAGE] = package
+    if not (addin_path / "apper" / "apper").is_dir():
+        sys.exit("The apper submodule is missing. "
+                 "Run: git submodule update --init")
+    # Same as snap_generator.py, which is not imported since it starts apper
+    configure = importlib.import_module(f"{PACKAGE}.lib.snaplib.configure")
+    configure.set_config(importlib.import_module(f"{PACKAGE}.config"))
+    return {name: importlib.import_module(f"{PACKAGE}.commands.{name}")
+            for name in COMMANDS}
+
+
+def run_build(module, args, preview, repeat):
+    """
+    :return: (Counter of the calls of one build, python seconds per build,
+        synthetic API seconds per build)
+    """
+    python_time = 0
+    for _ in range(repeat):
+        adsk.recorder.reset()
+        start = time.perf_counter()
+        module.build(args, preview=preview)
+        python_time += time.perf_counter() - start
+
+    errors = adsk.recorder.calls_to(ERROR_CALL)
+    if errors:
+        raise RuntimeError(f"{module.__name__}.build() failed:\n"
+                           f"{errors[0].args[0]}")
+    return (adsk.recorder.counts(), python_time / repeat,
+            adsk.recorder.synthetic_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--addin", type=Path,
+                        default=TOOLS_PATH.parent,
+                        help="Path to the add-in folder.")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--origins", type=int, default=1,
+                        help="Number of joint origins selected in the "
+                             "'selected' builds.")
+    parser.add_argument("--direct", action="store_true",
+                        help="Build in a direct modeling design.")
+    parser.add_argument("--save", type=Path,
+                        help="Write the call counts to this JSON file.")
+    parser.add_argument("--compare", type=Path,
+                        help="Compare the call counts to this JSON file.")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Print the count of every recorded call.")
+    args = parser.parse_args()
+
+    modules = import_addin(args.addin.resolve())
+    if args.direct:
+        design = adsk.core.Application.get().activeProduct
+        design.designType = adsk.fusion.DesignTypes.DirectDesignType
+
+    results = {}
+    print(f"{'build':42} {'calls':>6} "
+          + " ".join(f"{label:>8}" for label in SUMMARY_CALLS)
+          + f" {'python':>9} {'api':>9}")
+    for name, module in modules.items():
+        for selections in (False, True):
+            # Fusion always runs a preview before the execute.
+            for preview in (True, False):
+                build_args = command_args(name, args.addin, selections,
+                                          args.origins)
+                counts, python_time, api_time = run_build(
+                    module, build_args, preview, args.repeat)
+
+                key = (f"{name} {'selected' if selections else 'bare'}"
+                       f"{' preview' if preview else ''}")
+                results[key] = dict(counts)
+                print(f"{key:42} {sum(counts.values()):6} "
+                      + " ".join(f"{counts[call]:8}"
+                               for call in SUMMARY_CALLS.values())
+                      + f" {python_time * 1000:7.2f}ms"
+                      + f" {api_time * 1000:7.1f}ms")
+                if args.verbose:
+                    for call, count in sorted(counts.items()):
+                        print(f"    {call:48} {count}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = []
+        for key, counts in results.items():
+            before = sum(baseline.get(key, {}).values())
+            after = sum(counts.values())
+            if key in baseline and after > before:
+                regressions.append(f"{key}: {before} -> {after} calls")
+        if regressions:
+            print("\nMore API calls than in the baseline:")
+            print("\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
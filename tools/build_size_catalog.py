@@ -0,0 +1,98 @@
+"""
+Writes and validates the size catalogs of the pin and the cantilever.
+
+Run from the repository root, outside of Fusion:
+
+    python tools/build_size_catalog.py
+    python tools/build_size_catalog.py --approved my_sizes.json
+
+By default the catalogs are written to config/SizeCatalog, which is where
+the add-in looks, with the approved sizes in
+default_config/approved_sizes.json. Every approved size must be on the grid
+and give the same parameters as the formulas, and sampled sizes between the
+grid points must match the formulas before rounding. Nothing is written if
+a catalog is not valid. Also times lookups against the formulas.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "lib"))
+
+from snaplib import catalog, kernel  # noqa: E402
+
+FORMULAS = {"Pin": kernel.pin_size_parameters,
+            "Cantilever": kernel.cantilever_size_parameters}
+
+
+def time_lookups(size_catalog, sizes):
+    """:return: (catalog, formula) microseconds per size."""
+    formula = FORMULAS[size_catalog.snap_type]
+    start = time.perf_counter()
+    for size in sizes:
+        size_catalog.size_parameters(size)
+    catalog_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for size in sizes:
+        formula(size)
+    formula_time = time.perf_counter() - start
+    return catalog_time / len(sizes) * 1e6, formula_time / len(sizes) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", type=Path,
+                        default=ROOT / "config" / "SizeCatalog",
+                        help="folder the catalogs are written to")
+    parser.add_argument("--approved", type=Path,
+                        default=ROOT / "default_config"
+                        / "approved_sizes.json",
+                        help="JSON file with the approved sizes in cm, "
+                             "by snap type")
+    parser.add_argument("--samples", type=int, default=20000,
+                        help="sizes between grid points compared to the "
+                             "formulas")
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    with open(args.approved, "r") as f:
+        approved = json.load(f)
+    args.output.mkdir(parents=True, exist_ok=True)
+    failed = False
+    for snap_type in catalog.FORMULAS:
+        size_catalog = catalog.build_catalog(snap_type,
+                                             approved.get(snap_type, []))
+        errors = catalog.validate_catalog(size_catalog, args.samples)
+        if errors:
+            failed = True
+            print(f"{snap_type}: {len(errors)} errors")
+            print("\n".join(f"    {error}" for error in errors[:20]))
+            continue
+        path = args.output / f"{snap_type}{catalog.CATALOG_SUFFIX}"
+        catalog.write_catalog(size_catalog, path)
+        size_catalog = catalog.read_catalog(path)
+        print(f"{snap_type}: {size_catalog.rows} sizes, "
+              f"{len(size_catalog.approved)} approved, "
+              f"{path.stat().st_size / 1024:.0f} KiB -> {path}")
+        # Sizes typed in mm, and any sizes
+        grid = [catalog.grid_size(size_catalog.start, size_catalog.step,
+                                  random.randrange(size_catalog.rows))
+                for _ in range(args.lookups)]
+        other = [random.uniform(catalog.MIN_SIZE, catalog.MAX_SIZE)
+                 for _ in range(args.lookups)]
+        for label, sizes in (("grid sizes", grid), ("other sizes", other)):
+            catalog_us, formula_us = time_lookups(size_catalog, sizes)
+            print(f"    {label}: catalog {catalog_us:.2f} us, formula "
+                  f"{formula_us:.2f} us per size")
+        size_catalog.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
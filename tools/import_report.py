@@ -0,0 +1,96 @@
+"""
+Reports which modules the add-in imports at start, and which only when a
+command is first opened.
+
+Imports snap_generator.py against the adsk stub under python -X importtime,
+then imports every command module the way LazyCommand.load() does. Run from
+the repository root, with the apper submodule checked out:
+
+    python tools/import_report.py
+    python tools/import_report.py --top 30
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+TOOLS_PATH = Path(__file__).resolve().parent
+PACKAGE = "snap_generator"
+COMMANDS = ["SimpleCantileverCommand", "CantileverCommand",
+            "SimplePinCommand", "PinCommand", "EditSnapCommand",
+            "SettingsCommand"]
+# Written to stderr between the two phases.
+MARKER = "--- first on_create ---"
+
+# Runs in the child interpreter.
+CHILD = f"""
+import importlib, sys, types
+sys.path.insert(0, {str(TOOLS_PATH / "adsk_stub")!r})
+package = types.ModuleType({PACKAGE!r})
+package.__path__ = [sys.argv[1]]
+sys.modules[{PACKAGE!r}] = package
+importlib.import_module({PACKAGE!r} + "." + {PACKAGE!r})
+print({MARKER!r}, file=sys.stderr, flush=True)
+for name in {COMMANDS!r}:
+    importlib.import_module({PACKAGE!r} + ".commands." + name)
+"""
+
+
+def parse_importtime(lines):
+    """
+    :return: List of (module, self microseconds, cumulative microseconds,
+        depth) from python -X importtime output.
+    """
+    modules = []
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us),
+                        depth))
+    return modules
+
+
+def run_child(addin_path):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, str(addin_path)],
+        capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(result.stderr)
+    start, _, first_use = result.stderr.partition(MARKER)
+    return (parse_importtime(start.splitlines()),
+            parse_importtime(first_use.splitlines()))
+
+
+def print_phase(title, modules, top):
+    total = sum(self_us for _, self_us, _, _ in modules)
+    addin = [module for module in modules
+             if module[0].startswith(PACKAGE + ".")]
+    print(f"{title}: {len(modules)} modules, {total / 1000:.1f} ms, "
+          f"{len(addin)} from the add-in")
+    for name, self_us, cumulative_us, _ in sorted(
+            addin, key=lambda module: -module[2])[:top]:
+        print(f"    {name:52} {self_us / 1000:7.2f} ms "
+              f"{cumulative_us / 1000:8.2f} ms cumulative")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--addin", type=Path, default=TOOLS_PATH.parent,
+                        help="Path to the add-in folder.")
+    parser.add_argument("--top", type=int, default=15,
+                        help="Number of add-in modules listed per phase.")
+    args = parser.parse_args()
+    if not (args.addin / "apper" / "apper").is_dir():
+        sys.exit("The apper submodule is missing. "
+                 "Run: git submodule update --init")
+
+    start, first_use = run_child(args.addin.resolve())
+    print_phase("Start", start, args.top)
+    print_phase("First command", first_use, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Imports profile JSON files into the SQLite profile library.
+
+Run from the repository root, outside of Fusion:
+
+    python tools/migrate_profiles.py --material PETG --printer MK3S
+
+By default the files in config/ProfileData are imported into
+config/ProfileData/profiles.sqlite3, which is where the add-in looks when the
+"profile_library" setting is on. Profiles that are already in the library
+are replaced by those with the same name in the files, the others are kept
+unless --replace is given.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "lib"))
+
+from snaplib import library  # noqa: E402
+
+SNAP_TYPES = ("Cantilever", "Pin")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--config", type=Path,
+                        default=ROOT / "config" / "ProfileData",
+                        help="folder with Cantilever.json and Pin.json")
+    parser.add_argument("--db", type=Path,
+                        help="library file, default profiles.sqlite3 in the "
+                             "config folder")
+    parser.add_argument("--tag")
+    parser.add_argument("--material")
+    parser.add_argument("--printer")
+    parser.add_argument("--replace", action="store_true",
+                        help="delete the profiles that are not in the files")
+    args = parser.parse_args()
+
+    db = args.db or args.config / library.LIBRARY_NAME
+    profile_library = library.ProfileLibrary(db)
+    try:
+        for snap_type in SNAP_TYPES:
+            path = args.config / f"{snap_type}.json"
+            if not path.is_file():
+                print(f"{path} not found, skipped.")
+                continue
+            changes = profile_library.import_json(
+                snap_type, path, replace=args.replace, tag=args.tag,
+                material=args.material, printer=args.printer)
+            profiles = profile_library.count(snap_type)
+            gap_profiles = profile_library.count(snap_type,
+                                                 kind="gap_profiles")
+            print(f"{snap_type}: {changes} changes, {profiles} profiles and "
+                  f"{gap_profiles} gap profiles in {db.name}.")
+    finally:
+        profile_library.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Profiles the start of the add-in: module imports and startup calls.
+
+Loads snap_generator.py against the adsk stub the way Fusion does, under
+python -X importtime, and times the calls that make up the start with
+wall-clock spans: each my_addin.add_command(), the manifest glob and
+os.makedirs() in configure, and run(context) and stop(context). Writes
+everything to a JSON report. Run from the repository root, with the apper
+submodule checked out:
+
+    python tools/profile_startup.py --output startup.json
+    python tools/profile_startup.py --compare startup.json
+
+Times are the median of --repeat runs in fresh interpreters. --compare exits
+with status 1 when an add-in module or a span got slower than in the saved
+report by more than --threshold and --min-ms.
+"""
+
+import argparse
+import functools
+import importlib
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+
+TOOLS_PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(TOOLS_PATH))
+
+from import_report import PACKAGE, parse_importtime  # noqa: E402
+
+# Written to stderr by the child before the add-in is loaded, so that the
+# imports of this script are left out.
+START_MARKER = "--- add-in start ---"
+# Spans recorded by the child, as [label, seconds].
+spans = []
+
+
+def timed(label, function):
+    """function, recording a span for each call."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            spans.append([label(*args, **kwargs) if callable(label)
+                          else label, time.perf_counter() - start])
+    return wrapper
+
+
+def child(addin_path):
+    """Starts and stops the add-in, and prints the spans as JSON."""
+    sys.path.insert(0, str(TOOLS_PATH / "adsk_stub"))
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(addin_path)]
+    sys.modules[PACKAGE] = package
+    print(START_MARKER, file=sys.stderr, flush=True)
+
+    os.makedirs = timed(lambda path, *args, **kwargs:
+                        f"os.makedirs {Path(path).name}", os.makedirs)
+    pathlib.Path.glob = timed(lambda path, pattern, *args, **kwargs:
+                              f"glob {pattern}", pathlib.Path.glob)
+    apper = importlib.import_module(f"{PACKAGE}.apper.apper")
+    apper.FusionApp.add_command = timed(
+        lambda app, name, *args: f"add_command {name}",
+        apper.FusionApp.add_command)
+
+    entry = timed("import snap_generator", importlib.import_module)(
+        f"{PACKAGE}.{PACKAGE}")
+    timed("run(context)", entry.run)(None)
+    timed("stop(context)", entry.stop)(None)
+    print(json.dumps(spans))
+
+
+def run_once(addin_path):
+    """:return: (modules from parse_importtime(), spans in ms)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", __file__, "--child",
+         "--addin", str(addin_path)], capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(result.stderr)
+    _, _, addin_imports = result.stderr.partition(START_MARKER)
+    modules = parse_importtime(addin_imports.splitlines())
+    run_spans = {}
+    for label, seconds in json.loads(result.stdout.splitlines()[-1]):
+        run_spans[label] = run_spans.get(label, 0) + seconds * 1000
+    return modules, run_spans
+
+
+def profile(addin_path, repeat):
+    """
+    :return: Report dictionary with the median times of repeat runs.
+    """
+    module_times = {}
+    span_times = {}
+    totals = []
+    for _ in range(repeat):
+        modules, run_spans = run_once(addin_path)
+        totals.append(sum(self_us for _, self_us, _, _ in modules) / 1000)
+        for name, self_us, cumulative_us, _ in modules:
+            if name.startswith(PACKAGE + ".") or name == PACKAGE:
+                module_times.setdefault(name, []).append(
+                    (self_us / 1000, cumulative_us / 1000))
+        for label, ms in run_spans.items():
+            span_times.setdefault(label, []).append(ms)
+    return {
+        "repeat": repeat,
+        "import_ms": statistics.median(totals),
+        "modules": {name: {"self_ms": statistics.median(t[0] for t in times),
+                           "cumulative_ms": statistics.median(
+                               t[1] for t in times)}
+                    for name, times in module_times.items()},
+        "spans": {label: statistics.median(times)
+                  for label, times in span_times.items()},
+    }
+
+
+def print_report(report, top):
+    print(f"All imports: {report['import_ms']:.1f} ms "
+          f"(median of {report['repeat']})")
+    print("Add-in modules:")
+    modules = sorted(report["modules"].items(),
+                     key=lambda item: -item[1]["cumulative_ms"])
+    for name, times in modules[:top]:
+        print(f"    {name:52} {times['self_ms']:7.2f} ms "
+              f"{times['cumulative_ms']:8.2f} ms cumulative")
+    print("Spans:")
+    for label, ms in report["spans"].items():
+        print(f"    {label:52} {ms:7.2f} ms")
+
+
+def regressions(baseline, report, threshold, min_ms):
+    """:return: Lines for the times that grew past threshold and min_ms."""
+    lines = []
+    pairs = [(f"import {name}", baseline["modules"].get(name, {}).get(
+        "cumulative_ms"), times["cumulative_ms"])
+        for name, times in report["modules"].items()]
+    pairs += [(label, baseline["spans"].get(label), ms)
+              for label, ms in report["spans"].items()]
+    for label, before, after in pairs:
+        if before is None:
+            before = 0
+        if after - before > min_ms and after > before * (1 + threshold):
+            lines.append(f"{label}: {before:.2f} -> {after:.2f} ms")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--addin", type=Path, default=TOOLS_PATH.parent,
+                        help="Path to the add-in folder.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20,
+                        help="Number of add-in modules printed.")
+    parser.add_argument("--output", type=Path,
+                        help="Write the report to this JSON file.")
+    parser.add_argument("--compare", type=Path,
+                        help="Compare to a report saved with --output.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative growth, 0.25 is 25%%.")
+    parser.add_argument("--min-ms", type=float, default=2.0,
+                        help="Growth below this is never a regression.")
+    parser.add_argument("--child", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    addin_path = args.addin.resolve()
+    if not (addin_path / "apper" / "apper").is_dir():
+        sys.exit("The apper submodule is missing. "
+                 "Run: git submodule update --init")
+    if args.child:
+        child(addin_path)
+        return
+
+    report = profile(addin_path, args.repeat)
+    print_report(report, args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        lines = regressions(baseline, report, args.threshold, args.min_ms)
+        if lines:
+            print("\nSlower than in the baseline:")
+            print("\n".join(lines))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()